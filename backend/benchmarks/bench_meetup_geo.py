@@ -0,0 +1,134 @@
+"""
+Benchmark: "meetups near me" radius and bounding-box searches.
+
+Fills the configured database with synthetic geocoded meetups (reused on
+later runs): most are scattered around the gazetteer's cities, the rest
+anywhere, so dense cities share latitude bands with empty ocean as real data
+does. It then times ``?near=`` searches at several radii and ``?bbox=``
+searches around random cities through ``MeetupViewSet.list`` (first page,
+including the ETag and count queries), and prints the plan of one search to
+show the ``(lat_band, longitude)`` index being used.
+
+Point it at a scratch database, since rows are added to the meetups table:
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_meetup_geo.py
+    python benchmarks/bench_meetup_geo.py --meetups 200000   # quick SQLite run
+    python benchmarks/bench_meetup_geo.py --drop
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from meetups.geocoding import GazetteerGeocoder  # noqa: E402
+from meetups.models import Meetup  # noqa: E402
+from meetups.views import MeetupViewSet  # noqa: E402
+from movies.models import Movie  # noqa: E402
+
+TITLE = 'bench-geo'
+RADII_KM = (5, 25, 100)
+
+
+def synthetic_point(rng, cities):
+    if rng.random() < 0.8:
+        latitude, longitude = rng.choice(cities)
+        # Roughly a metro area around the city centre
+        latitude = min(max(rng.gauss(latitude, 0.15), -90), 90)
+        longitude = (rng.gauss(longitude, 0.2) + 180) % 360 - 180
+        return latitude, longitude
+    return rng.uniform(-60, 70), rng.uniform(-180, 180)
+
+
+def populate(target, batch_size, rng, cities):
+    organizer, _ = User.objects.get_or_create(username=TITLE)
+    movie, _ = Movie.objects.get_or_create(
+        title=TITLE, defaults={'description': 'Plot', 'release_date': date(2000, 1, 1)},
+    )
+    existing = Meetup.objects.filter(title=TITLE).count()
+    when = timezone.now() + timedelta(days=30)
+    while existing < target:
+        batch = []
+        for _ in range(min(batch_size, target - existing)):
+            meetup = Meetup(
+                title=TITLE, description='', movie=movie, organizer=organizer,
+                location='Synthetic', meetup_datetime=when,
+            )
+            # bulk_create skips the pre_save receiver, so set the band here
+            meetup.set_coordinates(synthetic_point(rng, cities))
+            batch.append(meetup)
+        Meetup.objects.bulk_create(batch)
+        existing += len(batch)
+        print(f'\rmeetups {existing}/{target}', end='', flush=True)
+    print()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE meetups_meetup')
+
+
+def timed(view, factory, params):
+    timings = []
+    sizes = []
+    for query in params:
+        started = time.perf_counter()
+        response = view(factory.get('/api/meetups/', query))
+        response.render()
+        timings.append((time.perf_counter() - started) * 1000)
+        sizes.append(response.data['count'])
+    timings.sort()
+    return (statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)],
+            statistics.median(sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meetups', type=int, default=1_000_000)
+    parser.add_argument('--searches', type=int, default=200, help='searches timed per radius / box size')
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='delete the synthetic rows and exit')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    if args.drop:
+        deleted, _ = Movie.objects.filter(title=TITLE).delete()
+        User.objects.filter(username=TITLE).delete()
+        print(f'deleted {deleted} rows')
+        return
+
+    rng = random.Random(args.seed)
+    cities = list(set(GazetteerGeocoder().places.values()))
+    populate(args.meetups, args.batch_size, rng, cities)
+    print(f'{connection.vendor}, {Meetup.objects.count()} meetups')
+
+    view = MeetupViewSet.as_view({'get': 'list'})
+    factory = APIRequestFactory()
+    centres = [rng.choice(cities) for _ in range(args.searches)]
+    for radius in RADII_KM:
+        params = [{'near': f'{lat},{lng}', 'radius': radius} for lat, lng in centres]
+        p50, p95, found = timed(view, factory, params)
+        print(f'near, {radius:>3} km: p50 {p50:7.2f} ms, p95 {p95:7.2f} ms, median {found:.0f} matches')
+    for size in (0.5, 2.0):
+        params = [{'bbox': f'{lat - size / 2},{lng - size / 2},{lat + size / 2},{lng + size / 2}'} for lat, lng in centres]
+        p50, p95, found = timed(view, factory, params)
+        print(f'bbox, {size:>3}°:   p50 {p50:7.2f} ms, p95 {p95:7.2f} ms, median {found:.0f} matches')
+
+    latitude, longitude = centres[0]
+    print('\nplan of one 25 km search:')
+    print(Meetup.objects.near(latitude, longitude, 25).explain())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: hundreds of parallel joins against one meetup.
+
+Creates a fresh meetup and a pool of synthetic users, then fires one join per
+user from ``--concurrency`` threads at once (each thread has its own database
+connection) and reports throughput, latency, status codes and whether the
+meetup ended up oversold. ``--strategy legacy`` replays the old
+check-then-insert join (``is_full``, ``exists()``, ``create()``) for
+comparison; ``atomic`` goes through ``MeetupViewSet.join``, which reserves
+the seat with one conditional UPDATE and waitlists (202) everyone who
+doesn't get one.
+
+Needs a database that allows concurrent writers, so point it at PostgreSQL:
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_meetup_join.py
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_meetup_join.py --strategy legacy
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_meetup_join.py --drop
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+from meetups.models import Meetup, MeetupParticipant  # noqa: E402
+from meetups.views import MeetupViewSet  # noqa: E402
+from movies.models import Movie  # noqa: E402
+
+USER_PREFIX = 'bench-join-'
+TITLE = 'bench-join'
+
+
+def setup(users, capacity):
+    organizer, _ = User.objects.get_or_create(username=f'{USER_PREFIX}organizer')
+    guests = User.objects.filter(username__startswith=USER_PREFIX).exclude(pk=organizer.pk)
+    User.objects.bulk_create([User(username=f'{USER_PREFIX}{i}') for i in range(guests.count(), users)])
+    movie, _ = Movie.objects.get_or_create(
+        title=TITLE, defaults={'description': 'Plot', 'release_date': date(2000, 1, 1)},
+    )
+    meetup = Meetup.objects.create(
+        title=TITLE, description='', movie=movie, organizer=organizer, location='Bench',
+        meetup_datetime=timezone.now() + timedelta(days=1), max_participants=capacity,
+    )
+    return meetup, list(guests[:users])
+
+
+def legacy_join(meetup_id, user):
+    """The join as it was before: unlocked read, check and insert"""
+    meetup = Meetup.objects.get(pk=meetup_id)
+    full = MeetupParticipant.objects.filter(meetup=meetup, status='accepted').count() + 1 >= meetup.max_participants
+    if full:
+        return 400
+    if MeetupParticipant.objects.filter(meetup=meetup, user=user).exists():
+        return 400
+    try:
+        MeetupParticipant.objects.create(meetup=meetup, user=user)
+    except Exception:
+        return 500  # the unique_together race surfaced as a server error
+    Meetup.adjust_accepted_count(meetup.pk, 1)
+    return 201
+
+
+def atomic_join(meetup_id, user, view=MeetupViewSet.as_view({'post': 'join'}), factory=APIRequestFactory()):
+    request = factory.post(f'/api/meetups/{meetup_id}/join/', {}, format='json')
+    force_authenticate(request, user=user)
+    return view(request, pk=str(meetup_id)).status_code
+
+
+def run(strategy, meetup, users, concurrency):
+    join = legacy_join if strategy == 'legacy' else atomic_join
+    began = []
+    start = threading.Barrier(min(concurrency, len(users)), action=lambda: began.append(time.perf_counter()))
+    local = threading.local()
+
+    def worker(user):
+        if not getattr(local, 'ready', False):
+            # Open each thread's connection before the clock starts, then release all threads at once
+            connection.ensure_connection()
+            local.ready = True
+            start.wait()
+        started = time.perf_counter()
+        try:
+            code = join(meetup.pk, user)
+        except Exception as e:
+            code = type(e).__name__
+        return code, (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(worker, users))
+    return outcomes, time.perf_counter() - began[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500, help='parallel joins, one per user')
+    parser.add_argument('--capacity', type=int, default=100, help='max_participants, organizer included')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--strategy', choices=('atomic', 'legacy'), default='atomic')
+    parser.add_argument('--drop', action='store_true', help='delete the synthetic rows and exit')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    if args.drop:
+        deleted, _ = User.objects.filter(username__startswith=USER_PREFIX).delete()
+        Movie.objects.filter(title=TITLE).delete()
+        print(f'deleted {deleted} rows')
+        return
+    if connection.vendor == 'sqlite':
+        print('warning: SQLite serializes writers, so there is little contention to measure; use PostgreSQL')
+
+    meetup, users = setup(args.users, args.capacity)
+    outcomes, elapsed = run(args.strategy, meetup, users, args.concurrency)
+
+    codes = Counter(code for code, _ in outcomes)
+    latencies = sorted(ms for _, ms in outcomes)
+    meetup.refresh_from_db()
+    rows = meetup.participants.filter(status='accepted').count()
+    seats = args.capacity - 1
+    print(f'{connection.vendor}, {args.strategy}: {len(users)} joins, {args.concurrency} threads, {seats} seats')
+    print(f'throughput: {len(users) / elapsed:.0f} joins/s ({elapsed:.2f} s)')
+    print(f'latency: p50 {statistics.median(latencies):.1f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms')
+    print(f'status codes: {dict(sorted(codes.items(), key=str))}')
+    print(f'participants: {rows}, counter: {meetup.accepted_count}, '
+          f'{"OVERSOLD" if rows > seats else "ok"}{"" if rows == meetup.accepted_count else ", counter drifted"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: ranked local movie search vs the old ``title__icontains`` lookup.
+
+Fills the configured database with a synthetic catalog (1M movies by
+default, generated once and reused on later runs), then times the first
+result page of both searches for single words, multi-word, prefix and
+misspelled queries and reports p50/p95 per query type. On PostgreSQL it also
+prints the plan of the ranked query, which should use the GIN indexes from
+migration 0004.
+
+Point it at a scratch database, since rows are added to the movies table:
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_movie_search.py
+    python benchmarks/bench_movie_search.py --movies 20000   # quick SQLite run
+    python benchmarks/bench_movie_search.py --drop            # remove the synthetic rows
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from movies.models import Movie  # noqa: E402
+from movies.search import search_movies  # noqa: E402
+
+# Synthetic rows are tagged through the genre column so they can be counted and dropped
+GENRE_TAG = 'bench-search'
+PAGE_SIZE = 20
+SYLLABLES = 'ka ri to mo na shi ve lo da re zu pa ti go me ra no ble stra ven dor ith ael wyn'.split()
+
+
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def populate(target, batch_size, rng, words):
+    # Zipf-like word frequencies, so some words are common and most are rare
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    existing = Movie.objects.filter(genre=GENRE_TAG).count()
+    started = time.perf_counter()
+    while existing < target:
+        batch = []
+        for _ in range(min(batch_size, target - existing)):
+            title = ' '.join(rng.choices(words, weights, k=rng.randint(1, 4))).title()
+            batch.append(Movie(
+                title=title,
+                description=' '.join(rng.choices(words, weights, k=rng.randint(20, 40))),
+                release_date=date(1950 + rng.randrange(75), 1, 1),
+                genre=GENRE_TAG,
+                popularity=round(rng.paretovariate(1.5), 2),
+            ))
+        Movie.objects.bulk_create(batch)
+        existing += len(batch)
+        print(f'\rinserted {existing}/{target}', end='', flush=True)
+    if time.perf_counter() - started > 1:
+        print(f'\ngenerated in {time.perf_counter() - started:.0f}s')
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE movies_movie')
+
+
+def typo(rng, word):
+    i = rng.randrange(1, len(word))
+    return word[:i] + word[i + 1:]
+
+
+def queries(rng, words):
+    common, rare = words[:50], words[200:]
+    return {
+        'common word': [rng.choice(common) for _ in range(10)],
+        'rare word': [rng.choice(rare) for _ in range(10)],
+        'two words': [f'{rng.choice(common)} {rng.choice(rare)}' for _ in range(10)],
+        'prefix': [rng.choice(rare)[:4] for _ in range(10)],
+        'typo': [typo(rng, rng.choice(rare)) for _ in range(10)],
+    }
+
+
+def legacy_page(query):
+    queryset = Movie.objects.filter(title__icontains=query)
+    return queryset.count(), list(queryset[:PAGE_SIZE])
+
+
+def ranked_page(query):
+    queryset = search_movies(Movie.objects.all(), query)
+    return queryset.count(), list(queryset[:PAGE_SIZE])
+
+
+def timed(fn, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count, _rows = fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, count
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] if len(samples) > 1 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per query')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='delete the synthetic movies and exit')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    if args.drop:
+        deleted, _ = Movie.objects.filter(genre=GENRE_TAG).delete()
+        print(f'deleted {deleted} rows')
+        return
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, args.vocabulary)
+    populate(args.movies, args.batch_size, rng, words)
+
+    print(f'{connection.vendor}, {Movie.objects.count()} movies, first page of {PAGE_SIZE} plus total count')
+    print(f'{"query type":<12} {"legacy p50":>11} {"p95":>8} {"hits":>7}   {"ranked p50":>10} {"p95":>8} {"hits":>7}')
+    for label, batch in queries(rng, words).items():
+        results = {}
+        for name, fn in (('legacy', legacy_page), ('ranked', ranked_page)):
+            fn(batch[0])  # warm up caches
+            samples, hits = [], []
+            for query in batch:
+                query_samples, count = timed(fn, query, args.repeat)
+                samples += query_samples
+                hits.append(count)
+            results[name] = (percentile(samples, 50), percentile(samples, 95), statistics.mean(hits))
+        print(f'{label:<12} ' + '   '.join(
+            f'{p50:8.1f} ms {p95:6.1f} ms {hits:7.0f}' for p50, p95, hits in results.values()
+        ))
+
+    if connection.vendor == 'postgresql':
+        sample = queries(rng, words)['typo'][0]
+        print(f'\nEXPLAIN ANALYZE ranked search for {sample!r}:')
+        print(search_movies(Movie.objects.all(), sample)[:PAGE_SIZE].explain(analyze=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: page-number vs keyset pagination of /api/movies/ at increasing depth.
+
+Fills the configured database with synthetic movies (reused on later runs),
+then requests the same depths through ``MovieViewSet`` with ``?page=N``
+(OFFSET + COUNT) and with a cursor (index range scan), reporting the median
+time per page.
+
+Point it at a scratch database, since rows are added to the movies table:
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_pagination.py
+    python benchmarks/bench_pagination.py --movies 50000   # quick SQLite run
+    python benchmarks/bench_pagination.py --drop
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from moviemeetup.pagination import KeysetPagination  # noqa: E402
+from movies.models import Movie  # noqa: E402
+from movies.views import MovieViewSet  # noqa: E402
+
+GENRE_TAG = 'bench-pagination'
+PAGE_SIZE = 20
+
+
+def populate(target, batch_size, rng):
+    existing = Movie.objects.filter(genre=GENRE_TAG).count()
+    while existing < target:
+        batch = [
+            Movie(
+                title=f'Synthetic {existing + i}', description='Plot', genre=GENRE_TAG,
+                release_date=date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 75)),
+            )
+            for i in range(min(batch_size, target - existing))
+        ]
+        Movie.objects.bulk_create(batch)
+        existing += len(batch)
+        print(f'\rinserted {existing}/{target}', end='', flush=True)
+    print()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE movies_movie')
+
+
+def cursor_at(depth):
+    """The cursor a client would hold after reading ``depth`` rows"""
+    row = Movie.objects.order_by('-release_date', '-id').values('release_date', 'id')[depth - 1]
+    return KeysetPagination().encode_cursor([row['release_date'], row['id']], False)
+
+
+def timed(view, factory, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = view(factory.get('/api/movies/', params))
+        response.render()
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=500_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='delete the synthetic movies and exit')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    if args.drop:
+        deleted, _ = Movie.objects.filter(genre=GENRE_TAG).delete()
+        print(f'deleted {deleted} rows')
+        return
+    populate(args.movies, args.batch_size, random.Random(args.seed))
+
+    total = Movie.objects.count()
+    view = MovieViewSet.as_view({'get': 'list'})
+    factory = APIRequestFactory()
+    print(f'{connection.vendor}, {total} movies, {PAGE_SIZE} per page')
+    print(f'{"depth":>9} {"?page=N":>10} {"cursor":>10}')
+    depth = PAGE_SIZE
+    while depth < total:
+        page = depth // PAGE_SIZE + 1
+        offset_ms = timed(view, factory, {'page': page}, args.repeat)
+        keyset_ms = timed(view, factory, {'cursor': cursor_at(depth)}, args.repeat)
+        print(f'{depth:>9} {offset_ms:7.1f} ms {keyset_ms:7.1f} ms')
+        depth *= 10
+
+
+if __name__ == '__main__':
+    main()
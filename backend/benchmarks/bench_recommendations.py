@@ -0,0 +1,151 @@
+"""
+Benchmark: full and incremental similar-movie builds on synthetic ratings.
+
+Fills the configured database with synthetic users, movies and ratings
+(reused on later runs). Users mostly rate movies from a few taste clusters,
+with Zipf-like movie popularity, so the similarity matrix has the long tail
+real ratings have. It then times a full ``rebuild_similarities`` and an
+incremental one after a batch of new ratings, and a sample of lookups on the
+similar-movies endpoint.
+
+Point it at a scratch database, since rows are added to the users, movies and
+ratings tables:
+    DATABASE_URL=postgres://localhost/moviemeetup_bench python benchmarks/bench_recommendations.py
+    python benchmarks/bench_recommendations.py --users 2000 --movies 1000 --ratings 50000   # quick SQLite run
+    python benchmarks/bench_recommendations.py --drop
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from movies.models import Movie, MovieRating, MovieSimilarity  # noqa: E402
+from movies.recommendations import rebuild_similarities  # noqa: E402
+from movies.views import MovieViewSet  # noqa: E402
+
+GENRE_TAG = 'bench-recommendations'
+USER_PREFIX = 'bench-rec-'
+CLUSTERS = 50
+
+
+def populate_movies(target, batch_size):
+    existing = Movie.objects.filter(genre=GENRE_TAG).count()
+    while existing < target:
+        batch = [
+            Movie(title=f'Synthetic {existing + i}', description='Plot', genre=GENRE_TAG, release_date=date(2000, 1, 1))
+            for i in range(min(batch_size, target - existing))
+        ]
+        Movie.objects.bulk_create(batch)
+        existing += len(batch)
+    return list(Movie.objects.filter(genre=GENRE_TAG).order_by('pk').values_list('pk', flat=True))
+
+
+def populate_users(target, batch_size):
+    existing = User.objects.filter(username__startswith=USER_PREFIX).count()
+    while existing < target:
+        batch = [User(username=f'{USER_PREFIX}{existing + i}') for i in range(min(batch_size, target - existing))]
+        User.objects.bulk_create(batch)
+        existing += len(batch)
+    return list(User.objects.filter(username__startswith=USER_PREFIX).order_by('pk').values_list('pk', flat=True))
+
+
+def synthetic_ratings(rng, users, movies, count):
+    """``count`` (user, movie, rating) triples, mostly within each user's favourite clusters"""
+    weights = [1 / rank for rank in range(1, len(movies) + 1)]
+    clusters = [movies[start::CLUSTERS] for start in range(CLUSTERS)]
+    for _ in range(count):
+        user = rng.choice(users)
+        if rng.random() < 0.8:
+            # Each user's tastes are a stable function of their id
+            cluster = clusters[(user * 7 + rng.randrange(3)) % CLUSTERS]
+            movie = rng.choice(cluster)
+        else:
+            movie = rng.choices(movies, weights)[0]
+        yield user, movie, rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 3, 3))[0]
+
+
+def populate_ratings(target, batch_size, rng, users, movies):
+    existing = MovieRating.objects.filter(movie__genre=GENRE_TAG).count()
+    batch = []
+    for user, movie, rating in synthetic_ratings(rng, users, movies, max(target - existing, 0)):
+        batch.append(MovieRating(user_id=user, movie_id=movie, rating=rating))
+        if len(batch) >= batch_size:
+            MovieRating.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+            print(f'\rrated {MovieRating.objects.filter(movie__genre=GENRE_TAG).count()}/{target}', end='', flush=True)
+    MovieRating.objects.bulk_create(batch, ignore_conflicts=True)
+    print()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE movies_movierating')
+
+
+def timed_build(**kwargs):
+    started = time.perf_counter()
+    build = rebuild_similarities(**kwargs)
+    elapsed = time.perf_counter() - started
+    kind = 'full' if build.full else 'incremental'
+    print(f'{kind:>11} build: {elapsed:7.2f} s, {build.movies} movies recomputed, {build.rows} rows written')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--movies', type=int, default=50_000)
+    parser.add_argument('--ratings', type=int, default=2_000_000)
+    parser.add_argument('--new-ratings', type=int, default=10_000, help='ratings added before the incremental build')
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='delete the synthetic rows and exit')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    if args.drop:
+        MovieSimilarity.objects.all().delete()
+        deleted, _ = Movie.objects.filter(genre=GENRE_TAG).delete()
+        deleted_users, _ = User.objects.filter(username__startswith=USER_PREFIX).delete()
+        print(f'deleted {deleted + deleted_users} rows')
+        return
+
+    rng = random.Random(args.seed)
+    movies = populate_movies(args.movies, args.batch_size)
+    users = populate_users(args.users, args.batch_size)
+    populate_ratings(args.ratings, args.batch_size, rng, users, movies)
+    print(f'{connection.vendor}, {len(users)} users, {len(movies)} movies, {MovieRating.objects.count()} ratings')
+
+    timed_build(full=True)
+    MovieRating.objects.bulk_create(
+        [MovieRating(user_id=u, movie_id=m, rating=r) for u, m, r in synthetic_ratings(rng, users, movies, args.new_ratings)],
+        ignore_conflicts=True,
+    )
+    timed_build()
+
+    view = MovieViewSet.as_view({'get': 'similar'})
+    factory = APIRequestFactory()
+    samples = []
+    for movie in rng.choices(movies, k=args.lookups):
+        started = time.perf_counter()
+        response = view(factory.get(f'/api/movies/{movie}/similar/'), pk=str(movie))
+        response.render()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    print(f'similar/ lookups: p50 {statistics.median(samples):.2f} ms, '
+          f'p95 {samples[int(len(samples) * 0.95) - 1]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark: sync WSGI vs async ASGI TMDB proxy views.
+
+Starts the offline fake TMDB server (``manage.py fake_tmdb``) with injected
+latency, then serves the project under gunicorn (sync views) and uvicorn
+(async views) in turn and fires the same concurrent load at one TMDB proxy
+endpoint. The TMDB response cache and the local mirror are switched off, so
+every request goes upstream. Search, detail, recommendations and reviews ask
+for a different query or movie id each time; popular cycles through the pages
+the fake actually has (TMDB answers pages past 500 with a 400 and pages past
+``total_pages`` with no results), so concurrent requests for the same page may
+share one upstream call as they would in production. No network access or TMDB key is needed; pass ``--replay DIR`` to serve
+responses recorded with ``manage.py fake_tmdb --record DIR``.
+
+Usage (from backend/):
+    python benchmarks/bench_tmdb_async.py --requests 2000 --concurrency 200 --latency-ms 100
+    python benchmarks/bench_tmdb_async.py --endpoint detail --error-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def start(cmd, env):
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+# (path, params) of the i-th request (from 1) when popular movies have ``pages`` pages
+ENDPOINTS = {
+    'popular': lambda i, pages: ('/api/movies/tmdb/popular/', {'page': 1 + (i - 1) % pages}),
+    'search': lambda i, pages: ('/api/movies/tmdb/search/', {'q': f'bench {i}'}),
+    'detail': lambda i, pages: (f'/api/movies/tmdb/{i}/', {}),
+    'recommendations': lambda i, pages: (f'/api/movies/tmdb/{i}/recommendations/', {}),
+    'reviews': lambda i, pages: (f'/api/movies/tmdb/{i}/reviews/', {}),
+}
+
+
+def popular_pages(fake_url):
+    """Pages of popular movies the fake TMDB serves, at most the 500 TMDB allows"""
+    total_pages = httpx.get(f'{fake_url}/movie/popular', params={'api_key': 'bench'}).json()['total_pages']
+    return max(1, min(total_pages, 500))
+
+
+async def load(base_url, endpoint, total, concurrency, pages):
+    latencies = []
+    errors = 0
+    counter = iter(range(1, total + 1))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                path, params = ENDPOINTS[endpoint](i, pages)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'errors': errors,
+    }
+
+
+def run(label, cmd, port, env, args, pages):
+    server = start(cmd, env)
+    try:
+        wait_for(f'http://127.0.0.1:{port}/api/movies/tmdb/stats/')
+        result = asyncio.run(load(f'http://127.0.0.1:{port}', args.endpoint, args.requests, args.concurrency,
+                                  pages))
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{label:<34} {result['rps']:>9.1f} {result['p50']:>9.1f} {result['p99']:>9.1f} {result['errors']:>7}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='popular')
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of fake TMDB responses that are 503s')
+    parser.add_argument('--results-per-page', type=int, default=20)
+    parser.add_argument('--replay', metavar='DIR', help='Serve fixtures recorded in DIR')
+    parser.add_argument('--wsgi-workers', type=int, default=4)
+    parser.add_argument('--wsgi-threads', type=int, default=1)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    fake_port = free_port()
+    env = dict(
+        os.environ,
+        DEBUG='False',
+        DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite:////tmp/moviemeetup-bench.sqlite3'),
+        TMDB_API_KEY='bench',
+        TMDB_BASE_URL=f'http://127.0.0.1:{fake_port}/3',
+        TMDB_MAX_RETRIES='0',
+        TMDB_MIRROR_ENABLED='False',
+        TMDB_CACHE_BACKEND='django.core.cache.backends.dummy.DummyCache',
+        # Measure the proxy layer, not the outbound limiter and breaker
+        TMDB_RATE_LIMIT='100000',
+        TMDB_RATE_LIMIT_BURST='100000',
+        TMDB_BREAKER_FAILURE_THRESHOLD='1000000',
+    )
+    fake_cmd = [sys.executable, 'manage.py', 'fake_tmdb', '--port', str(fake_port),
+                '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+                '--error-rate', str(args.error_rate), '--results-per-page', str(args.results_per_page)]
+    if args.replay:
+        fake_cmd += ['--replay', args.replay]
+    fake = start(fake_cmd, env)
+    try:
+        wait_for(f'http://127.0.0.1:{fake_port}/3/movie/popular')
+        pages = popular_pages(f'http://127.0.0.1:{fake_port}/3')
+        print(f'{args.requests} requests to {args.endpoint}, concurrency {args.concurrency}, '
+              f'upstream latency {args.latency_ms:g} ms, error rate {args.error_rate:g}')
+        print(f"{'server':<34} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+        port = free_port()
+        run(f'gunicorn sync ({args.wsgi_workers}w x {args.wsgi_threads}t)',
+            [sys.executable, '-m', 'gunicorn', 'moviemeetup.wsgi:application', '-b', f'127.0.0.1:{port}',
+             '-w', str(args.wsgi_workers), '--threads', str(args.wsgi_threads)], port, env, args, pages)
+
+        port = free_port()
+        run('uvicorn async (1 process)',
+            [sys.executable, '-m', 'uvicorn', 'moviemeetup.asgi:application', '--port', str(port),
+             '--log-level', 'warning'], port, env, args, pages)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: typeahead lookups against the in-process title index.
+
+Loads a synthetic catalog straight into a ``TitleIndex`` (no database) and
+times completions for random 1-6 character prefixes, reporting build time,
+p50/p95/p99 lookup latency per prefix length and the memoized prefix count.
+
+Usage (from backend/):
+    python benchmarks/bench_typeahead.py --movies 200000 --lookups 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+from itertools import accumulate
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from movies.typeahead import TitleIndex, normalize  # noqa: E402
+
+SYLLABLES = 'ka ri to mo na shi ve lo da re zu pa ti go me ra no ble stra ven dor ith ael wyn'.split()
+
+
+def synthetic_rows(rng, count, words):
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    for pk in range(1, count + 1):
+        yield {
+            'pk': pk,
+            'title': ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))).title(),
+            'popularity': round(rng.paretovariate(1.5), 2),
+            'release_date': date(1950 + rng.randrange(75), 1, 1),
+            'poster_url': '',
+            'tmdb_id': pk,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=200_000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = set()
+    while len(words) < args.vocabulary:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+
+    index = TitleIndex()
+    started = time.perf_counter()
+    index.load(synthetic_rows(rng, args.movies, words))
+    stats = index.stats()
+    print(f'built {stats["movies"]} movies / {stats["keys"]} keys in {time.perf_counter() - started:.1f}s')
+
+    by_length = {}
+    for _ in range(args.lookups):
+        length = rng.randint(1, 6)
+        prefix = normalize(rng.choice(words))[:length]
+        started = time.perf_counter()
+        index.complete(prefix, args.limit)
+        by_length.setdefault(length, []).append((time.perf_counter() - started) * 1e6)
+
+    print(f'{"prefix":>6} {"p50":>9} {"p95":>9} {"p99":>9}')
+    for length, samples in sorted(by_length.items()):
+        p = statistics.quantiles(samples, n=100)
+        print(f'{length:>6} {p[49]:7.1f}us {p[94]:7.1f}us {p[98]:7.1f}us')
+    print(f'memoized prefixes: {index.stats()["memoized_prefixes"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Bounded, opt-in embedding of participants and comments on meetup detail.
+
+``GET /api/meetups/{id}/`` renders the meetup alone. ``?expand=participants``
+and/or ``?expand=comments`` embed the first ``MEETUP_EMBED_LIMIT`` rows of
+each collection as ``{"results": [...], "next": url}``, where ``next``
+continues in the cursor-paginated ``/api/meetups/participants/`` or
+``/api/meetups/comments/`` list in the same order, without the total (the
+detail page only follows ``next``). Each expanded collection is one
+prefetch query (sliced, with the users and profiles joined in), so the
+detail endpoint costs a fixed number of queries and has a bounded payload
+whatever the meetup's size. ``?fields=`` trims the meetup's own fields.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from moviemeetup.pagination import KeysetPagination
+
+from .models import MeetupComment, MeetupParticipant
+
+EXPAND_PARAM = 'expand'
+FIELDS_PARAM = 'fields'
+
+
+class Embedded:
+    """A relation of the meetup that can be embedded, and the list endpoint paging through the rest"""
+
+    def __init__(self, name, model, ordering, url_name):
+        self.name = name
+        self.model = model
+        self.ordering = ordering  # must match the list endpoint's keyset_ordering
+        self.url_name = url_name
+        self.to_attr = f'embedded_{name}'
+
+    def prefetch(self, limit):
+        # One extra row tells whether there is a next page
+        queryset = self.model.objects.select_related('user__profile').order_by(*self.ordering)
+        return Prefetch(self.name, queryset=queryset[:limit + 1], to_attr=self.to_attr)
+
+    def page(self, meetup, limit, request=None):
+        """(rows, next link) from the prefetched slice"""
+        rows = getattr(meetup, self.to_attr)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        key = [getattr(rows[-1], name.lstrip('-')) for name in self.ordering]
+        url = f'{reverse(self.url_name)}?meetup={meetup.pk}&{KeysetPagination.count_query_param}=false'
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return rows, replace_query_param(url, KeysetPagination.cursor_query_param,
+                                         KeysetPagination().encode_cursor(key, False))
+
+
+EMBEDDED = {
+    embedded.name: embedded for embedded in (
+        Embedded('participants', MeetupParticipant, ('joined_at', 'id'), 'meetup-participant-list'),
+        Embedded('comments', MeetupComment, ('-created_at', '-id'), 'meetup-comment-list'),
+    )
+}
+
+
+def _names(params, param):
+    raw = params.get(param)
+    if raw is None:
+        return None
+    return [name for name in (part.strip() for part in raw.split(',')) if name]
+
+
+def parse_expand(params):
+    """The relations named in ``?expand=``, in a stable order"""
+    names = _names(params, EXPAND_PARAM) or []
+    unknown = sorted(set(names) - set(EMBEDDED))
+    if unknown:
+        raise ValidationError({EXPAND_PARAM: f'Unknown relations: {", ".join(unknown)}; '
+                                              f'expected any of {", ".join(EMBEDDED)}'})
+    return [name for name in EMBEDDED if name in names]
+
+
+def parse_fields(params, available):
+    """The fields named in ``?fields=``, or None for all of them"""
+    names = _names(params, FIELDS_PARAM)
+    if not names:
+        return None
+    unknown = sorted(set(names) - set(available))
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f'Unknown fields: {", ".join(unknown)}'})
+    return set(names)
+
+
+def prefetches(expand):
+    return [EMBEDDED[name].prefetch(settings.MEETUP_EMBED_LIMIT) for name in expand]
@@ -0,0 +1,135 @@
+"""
+Geometry for "meetups near me": bounding boxes, the latitude band index and
+great-circle distances in SQL.
+
+Meetups store ``latitude``/``longitude`` and a ``lat_band`` (the latitude
+strip of ``BAND_DEGREES`` they fall in), indexed as ``(lat_band, longitude)``.
+A search box becomes ``lat_band IN (...)`` plus a longitude range, which both
+PostgreSQL and SQLite answer with one short index range scan per band instead
+of scanning every meetup at that latitude. Radius searches take the box
+around the circle, then compute the exact haversine distance for the few
+rows left, filter on it and sort by it. No PostGIS or spatial extension is
+needed.
+"""
+import math
+from collections import namedtuple
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+# About 11 km of latitude per band
+BAND_DEGREES = 0.1
+# Taller boxes filter on a band range instead of listing every band
+MAX_LISTED_BANDS = 200
+
+# Degrees; west > east means the box crosses the antimeridian
+Box = namedtuple('Box', ['south', 'west', 'north', 'east'])
+
+
+def band(latitude):
+    """The ``lat_band`` of a latitude, or None"""
+    if latitude is None:
+        return None
+    return math.floor(latitude / BAND_DEGREES)
+
+
+def _wrap(longitude):
+    if longitude > 180:
+        return longitude - 360
+    if longitude < -180:
+        return longitude + 360
+    return longitude
+
+
+def radius_box(latitude, longitude, radius_km):
+    """The smallest latitude/longitude box containing the circle of ``radius_km`` around a point"""
+    angle = radius_km / EARTH_RADIUS_KM
+    delta = math.degrees(angle)
+    south, north = latitude - delta, latitude + delta
+    if south <= -90 or north >= 90:
+        # The circle contains a pole, so every longitude is in reach
+        return Box(max(south, -90.0), -180.0, min(north, 90.0), 180.0)
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return Box(south, -180.0, north, 180.0)
+    lng_delta = math.degrees(math.asin(ratio))
+    return Box(south, _wrap(longitude - lng_delta), north, _wrap(longitude + lng_delta))
+
+
+def box_center(box):
+    west, east = box.west, box.east
+    if west > east:
+        east += 360
+    return (box.south + box.north) / 2, _wrap((west + east) / 2)
+
+
+def box_filter(box):
+    """Q for meetups inside ``box``, in a form the (lat_band, longitude) index can serve"""
+    if box.west <= box.east:
+        longitude = Q(longitude__gte=box.west, longitude__lte=box.east)
+    else:
+        longitude = Q(longitude__gte=box.west) | Q(longitude__lte=box.east)
+    first, last = band(box.south), band(box.north)
+    if last - first < MAX_LISTED_BANDS:
+        bands = Q(lat_band__in=range(first, last + 1))
+    else:
+        bands = Q(lat_band__gte=first, lat_band__lte=last)
+    return bands & longitude & Q(latitude__gte=box.south, latitude__lte=box.north)
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance in km from a point to each row's latitude/longitude, as an expression"""
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    row_lat, row_lng = Radians(F('latitude')), Radians(F('longitude'))
+    a = (
+        Power(Sin((row_lat - Value(lat)) / 2), 2)
+        + Value(math.cos(lat)) * Cos(row_lat) * Power(Sin((row_lng - Value(lng)) / 2), 2)
+    )
+    # Least() keeps rounding error from pushing ASIN's argument past 1 for antipodal points
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0)), output_field=FloatField())
+
+
+def _floats(raw, count, name, shape):
+    try:
+        values = [float(part) for part in raw.split(',')]
+    except ValueError:
+        values = []
+    if len(values) != count or not all(math.isfinite(value) for value in values):
+        raise ValueError(f'{name} must be "{shape}"')
+    return values
+
+
+def _check(latitude, longitude, name):
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError(f'{name}: latitude must be within ±90 and longitude within ±180')
+
+
+def parse_point(raw, name='near'):
+    """(latitude, longitude) from "lat,lng"; ``ValueError`` with a client-facing message otherwise"""
+    latitude, longitude = _floats(raw, 2, name, 'latitude,longitude')
+    _check(latitude, longitude, name)
+    return latitude, longitude
+
+
+def parse_box(raw, name='bbox'):
+    """A ``Box`` from "south,west,north,east"; west > east selects a box across the antimeridian"""
+    south, west, north, east = _floats(raw, 4, name, 'south,west,north,east')
+    _check(south, west, name)
+    _check(north, east, name)
+    if south > north:
+        raise ValueError(f'{name}: south must not be greater than north')
+    return Box(south, west, north, east)
+
+
+def parse_radius(raw, default, maximum, name='radius'):
+    """Radius in km, ``default`` when not given, at most ``maximum``"""
+    if raw in (None, ''):
+        return default
+    try:
+        radius = float(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a number of kilometres')
+    if not 0 < radius <= maximum:
+        raise ValueError(f'{name} must be greater than 0 and at most {maximum} km')
+    return radius
@@ -0,0 +1,100 @@
+"""
+Turning a meetup's free-text ``location`` into latitude/longitude.
+
+The provider is the class named by ``MEETUP_GEOCODER``: anything with a
+``geocode(text)`` method returning ``(latitude, longitude)`` or None. The
+default ``GazetteerGeocoder`` works offline from ``data/gazetteer.csv`` (major
+cities and their common aliases) and resolves a location by the longest
+place name it mentions, so "AMC Century City, Los Angeles" lands on Los
+Angeles. Swap in a provider backed by a real geocoding service for street
+level precision; it runs inside the create/update request, so keep it fast,
+and ``manage.py geocode_meetups`` fills in rows saved without coordinates.
+
+A location that is itself a coordinate pair ("40.71,-74.00") is used as is,
+whatever the provider.
+"""
+import csv
+import logging
+import os
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .geo import parse_point
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+COORDINATES = re.compile(r'^\s*[-+]?\d+(\.\d+)?\s*,\s*[-+]?\d+(\.\d+)?\s*$')
+
+
+def normalize(text):
+    """Lowercase ASCII words separated by single spaces ("São Paulo, SP" -> "sao paulo sp")"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+
+class Geocoder:
+    """Provider interface"""
+
+    def geocode(self, text):
+        raise NotImplementedError
+
+
+class GazetteerGeocoder(Geocoder):
+    """Offline lookup of the place names in a CSV gazetteer (name, latitude, longitude, aliases)"""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.places = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                point = (float(row['latitude']), float(row['longitude']))
+                for name in [row['name'], *filter(None, row['aliases'].split('|'))]:
+                    # The first entry wins for names that occur twice
+                    self.places.setdefault(normalize(name), point)
+        # Longest names first, so "new york city" beats "york" and "san jose" beats "jose"
+        self.names = sorted(self.places, key=len, reverse=True)
+
+    def geocode(self, text):
+        padded = f' {normalize(text)} '
+        for name in self.names:
+            if f' {name} ' in padded:
+                return self.places[name]
+        return None
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    """The process-wide instance of the ``MEETUP_GEOCODER`` class"""
+    global _geocoder
+    path = settings.MEETUP_GEOCODER
+    current = _geocoder
+    if current is None or current[0] != path:
+        with _geocoder_lock:
+            current = _geocoder
+            if current is None or current[0] != path:
+                current = _geocoder = (path, import_string(path)())
+    return current[1]
+
+
+def geocode(location):
+    """(latitude, longitude) for a location string, or None when it can't be placed"""
+    if not location:
+        return None
+    if COORDINATES.match(location):
+        try:
+            return parse_point(location, 'location')
+        except ValueError:
+            return None
+    try:
+        return get_geocoder().geocode(location)
+    except Exception:
+        # A failing provider must not block saving the meetup; geocode_meetups can retry later
+        logger.exception('Geocoding %r failed', location)
+        return None
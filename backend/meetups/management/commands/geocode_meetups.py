@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from meetups.geocoding import geocode
+from meetups.models import Meetup
+
+
+class Command(BaseCommand):
+    help = 'Fill in Meetup latitude/longitude from the location text with the configured geocoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-geocode meetups that already have coordinates')
+        parser.add_argument('--ids', type=int, nargs='*', default=[], help='Only these meetup ids')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Meetups written per statement')
+
+    def handle(self, *args, **options):
+        meetups = Meetup.objects.order_by('pk')
+        if not options['all']:
+            meetups = meetups.filter(latitude__isnull=True)
+        if options['ids']:
+            meetups = meetups.filter(pk__in=options['ids'])
+
+        # Walk the table in primary key ranges; each location string is geocoded once per batch
+        batch_size = options['batch_size']
+        located = missed = 0
+        last_pk = 0
+        while True:
+            batch = list(meetups.filter(pk__gt=last_pk).only('pk', 'location', 'updated_at')[:batch_size])
+            if not batch:
+                break
+            points = {}
+            now = timezone.now()
+            for meetup in batch:
+                if meetup.location not in points:
+                    points[meetup.location] = geocode(meetup.location)
+                meetup.set_coordinates(points[meetup.location])
+                meetup.updated_at = now  # bulk_update skips auto_now, and ETags depend on it
+                if meetup.latitude is None:
+                    missed += 1
+                else:
+                    located += 1
+            Meetup.objects.bulk_update(batch, ['latitude', 'longitude', 'lat_band', 'updated_at'])
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {located} meetups, {missed} locations not found'))
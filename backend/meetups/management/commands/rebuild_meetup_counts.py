@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from meetups.models import Meetup, MeetupParticipant
+
+
+class Command(BaseCommand):
+    help = 'Recompute Meetup.accepted_count from the MeetupParticipant table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, nargs='*', default=[], help='Only these meetup ids')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Meetups updated per statement')
+
+    def handle(self, *args, **options):
+        accepted = MeetupParticipant.objects.filter(meetup=OuterRef('pk'), status='accepted').order_by().values('meetup')
+        count = Coalesce(Subquery(accepted.annotate(total=Count('pk')).values('total')), 0)
+
+        meetups = Meetup.objects.order_by('pk')
+        if options['ids']:
+            meetups = meetups.filter(pk__in=options['ids'])
+
+        # Walk the table in primary key ranges so each UPDATE stays short on large tables
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(meetups.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            updated += Meetup.objects.filter(pk__in=batch).update(accepted_count=count)
+            last_pk = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt participant counts for {updated} meetups'))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meetups', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meetupcomment',
+            index=models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meetupcomment',
+            index=models.Index(fields=['meetup', '-created_at', '-id'], name='comment_meetup_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meetupparticipant',
+            index=models.Index(fields=['joined_at', 'id'], name='participant_joined_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meetupparticipant',
+            index=models.Index(fields=['meetup', 'joined_at', 'id'], name='participant_meetup_joined_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_accepted_counts(apps, schema_editor):
+    Meetup = apps.get_model('meetups', 'Meetup')
+    MeetupParticipant = apps.get_model('meetups', 'MeetupParticipant')
+    accepted = MeetupParticipant.objects.filter(meetup=OuterRef('pk'), status='accepted').order_by().values('meetup')
+    Meetup.objects.update(
+        accepted_count=Coalesce(Subquery(accepted.annotate(total=Count('pk')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meetups', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meetup',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_accepted_counts, migrations.RunPython.noop),
+    ]
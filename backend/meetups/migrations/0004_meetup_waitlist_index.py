@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meetups', '0003_meetup_accepted_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meetupparticipant',
+            index=models.Index(fields=['meetup', 'status', 'joined_at', 'id'], name='participant_waitlist_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meetups', '0004_meetup_waitlist_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meetup',
+            name='lat_band',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='meetup',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='meetup',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='meetup',
+            index=models.Index(fields=['lat_band', 'longitude'], name='meetup_geo_band_idx'),
+        ),
+    ]
@@ -1,7 +1,37 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 from movies.models import Movie
 
+from . import geo
+
+
+class MeetupQuerySet(models.QuerySet):
+    def with_open_spots(self):
+        """Annotate ``open_spots`` (seats left after the organizer and accepted participants) in SQL"""
+        return self.annotate(open_spots=F('max_participants') - F('accepted_count') - 1)
+
+    def within(self, box):
+        """Meetups inside a ``geo.Box``, found through the (lat_band, longitude) index"""
+        return self.filter(geo.box_filter(box))
+
+    def with_distance(self, latitude, longitude):
+        """Annotate ``distance_km`` (great-circle) from a point"""
+        return self.annotate(distance_km=geo.distance_km(latitude, longitude))
+
+    def near(self, latitude, longitude, radius_km):
+        """Meetups within ``radius_km`` of a point, nearest first"""
+        return (
+            self.within(geo.radius_box(latitude, longitude, radius_km))
+            .with_distance(latitude, longitude)
+            .filter(distance_km__lte=radius_km)
+            .order_by('distance_km', 'id')
+        )
+
 
 class Meetup(models.Model):
     STATUS_CHOICES = [
@@ -15,22 +45,36 @@ class Meetup(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='meetups')
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organized_meetups')
     location = models.CharField(max_length=200)
+    # Geocoded from location unless given explicitly (see meetups.geocoding and geocode_meetups)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Latitude strip of geo.BAND_DEGREES, derived from latitude; indexed with longitude for area searches
+    lat_band = models.SmallIntegerField(null=True, blank=True, editable=False)
     theater_name = models.CharField(max_length=200, blank=True)
     meetup_datetime = models.DateTimeField()
     max_participants = models.IntegerField(default=10)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='upcoming')
+    # Accepted participants: taken by MeetupViewSet.join, given back by the release_seat receiver
+    # whenever a participant is deleted (see rebuild_meetup_counts)
+    accepted_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MeetupQuerySet.as_manager()
+
     class Meta:
         ordering = ['meetup_datetime']
+        indexes = [
+            # Radius and bounding-box searches: one longitude range scan per latitude band
+            models.Index(fields=['lat_band', 'longitude'], name='meetup_geo_band_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.movie.title}"
 
     @property
     def participants_count(self):
-        return self.participants.filter(status='accepted').count() + 1  # +1 for organizer
+        return self.accepted_count + 1  # +1 for organizer
 
     @property
     def is_full(self):
@@ -40,6 +84,57 @@ class Meetup(models.Model):
     def available_spots(self):
         return self.max_participants - self.participants_count
 
+    def set_coordinates(self, point):
+        """Store a (latitude, longitude) pair, or clear it with None"""
+        self.latitude, self.longitude = point if point is not None else (None, None)
+        self.lat_band = geo.band(self.latitude)
+
+    @staticmethod
+    def reserve_seat(meetup_id):
+        """Take one seat if any is left, in a single conditional UPDATE; False when the meetup is full"""
+        return bool(
+            Meetup.objects.filter(pk=meetup_id, accepted_count__lt=F('max_participants') - 1)
+            .update(accepted_count=F('accepted_count') + 1)
+        )
+
+    @staticmethod
+    def promote_waitlist(meetup_id):
+        """Accept the longest-waiting pending participants into the free seats; returns their ids.
+
+        Locks the meetup row, so call it inside the transaction that freed the seats.
+        """
+        meetup = Meetup.objects.select_for_update().only('max_participants', 'accepted_count').get(pk=meetup_id)
+        free = meetup.max_participants - 1 - meetup.accepted_count
+        if free <= 0:
+            return []
+        waiting = MeetupParticipant.objects.filter(meetup_id=meetup_id, status='pending')
+        promoted = list(waiting.order_by('joined_at', 'id').values_list('pk', flat=True)[:free])
+        if promoted:
+            now = timezone.now()
+            MeetupParticipant.objects.filter(pk__in=promoted).update(status='accepted', updated_at=now)
+            Meetup.objects.filter(pk=meetup_id).update(
+                accepted_count=F('accepted_count') + len(promoted), updated_at=now,
+            )
+        return promoted
+
+    @staticmethod
+    def recount_seats(meetup_id):
+        """Recount the accepted participants under the meetup's row lock, then promote waiters into free seats.
+
+        Counting rather than decrementing keeps the counter right when two
+        requests delete the same participant. Call it inside a transaction.
+        """
+        if not Meetup.objects.select_for_update().filter(pk=meetup_id).values_list('pk', flat=True).first():
+            return []
+        accepted = MeetupParticipant.objects.filter(meetup_id=meetup_id, status='accepted').count()
+        Meetup.objects.filter(pk=meetup_id).update(accepted_count=accepted)
+        return Meetup.promote_waitlist(meetup_id)
+
+    @staticmethod
+    def adjust_accepted_count(meetup_id, delta):
+        """Apply a join or leave to the stored counter in one atomic UPDATE"""
+        Meetup.objects.filter(pk=meetup_id).update(accepted_count=F('accepted_count') + delta)
+
 
 class MeetupParticipant(models.Model):
     STATUS_CHOICES = [
@@ -58,10 +153,26 @@ class MeetupParticipant(models.Model):
     class Meta:
         unique_together = ['meetup', 'user']
         ordering = ['joined_at']
+        indexes = [
+            # Keyset pagination of /api/meetups/participants/, optionally filtered by meetup
+            models.Index(fields=['joined_at', 'id'], name='participant_joined_id_idx'),
+            models.Index(fields=['meetup', 'joined_at', 'id'], name='participant_meetup_joined_idx'),
+            # A meetup's waitlist in queue order
+            models.Index(fields=['meetup', 'status', 'joined_at', 'id'], name='participant_waitlist_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.meetup.title} ({self.status})"
 
+    def waitlist(self):
+        """(position, length) of the meetup's waitlist, position being None unless this participant is on it"""
+        ahead = Q(joined_at__lt=self.joined_at) | Q(joined_at=self.joined_at, id__lt=self.id)
+        counts = MeetupParticipant.objects.filter(meetup_id=self.meetup_id, status='pending').aggregate(
+            length=Count('pk'), ahead=Count('pk', filter=ahead),
+        )
+        position = counts['ahead'] + 1 if self.status == 'pending' else None
+        return position, counts['length']
+
 
 class MeetupComment(models.Model):
     meetup = models.ForeignKey(Meetup, on_delete=models.CASCADE, related_name='comments')
@@ -72,6 +183,32 @@ class MeetupComment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of /api/meetups/comments/, optionally filtered by meetup
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(fields=['meetup', '-created_at', '-id'], name='comment_meetup_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} on {self.meetup.title}"
+
+
+@receiver(pre_save, sender=Meetup)
+def set_lat_band(sender, instance, **kwargs):
+    """Keep the indexed band in step with latitude (bulk writes go through set_coordinates)"""
+    instance.lat_band = geo.band(instance.latitude)
+
+
+@receiver(post_delete, sender=MeetupParticipant)
+def release_seat(sender, instance, origin=None, **kwargs):
+    """Give the seat back however the participant went: leave, the admin, or their user being deleted"""
+    if isinstance(origin, Meetup) or isinstance(origin, models.QuerySet) and origin.model is Meetup:
+        return  # The whole meetup is going
+    Meetup.recount_seats(instance.meetup_id)
+
+
+@receiver([post_save, post_delete], sender=MeetupParticipant)
+@receiver([post_save, post_delete], sender=MeetupComment)
+def touch_meetup(sender, instance, **kwargs):
+    """Participants and comments are rendered inside their meetup, so they count as changing it"""
+    Meetup.objects.filter(pk=instance.meetup_id).update(updated_at=timezone.now())
@@ -1,7 +1,9 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Meetup, MeetupParticipant, MeetupComment
 from movies.serializers import MovieSerializer
 from accounts.serializers import UserSerializer
+from .embedding import EMBEDDED
 
 
 class MeetupParticipantSerializer(serializers.ModelSerializer):
@@ -22,25 +24,42 @@ class MeetupCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class MeetupSerializer(serializers.ModelSerializer):
+class CoordinatesMixin:
+    """Latitude and longitude are written together; leaving both out geocodes the location"""
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        latitude, longitude = attrs.get('latitude'), attrs.get('longitude')
+        if ('latitude' in attrs) != ('longitude' in attrs) or (latitude is None) != (longitude is None):
+            raise serializers.ValidationError({'latitude': 'latitude and longitude must be given together'})
+        return attrs
+
+
+class MeetupSerializer(CoordinatesMixin, serializers.ModelSerializer):
     movie = MovieSerializer(read_only=True)
     organizer = UserSerializer(read_only=True)
     participants_count = serializers.ReadOnlyField()
     is_full = serializers.ReadOnlyField()
     available_spots = serializers.ReadOnlyField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Meetup
         fields = [
             'id', 'title', 'description', 'movie', 'organizer', 'location', 
-            'theater_name', 'meetup_datetime', 'max_participants', 'status',
-            'participants_count', 'is_full', 'available_spots', 
+            'theater_name', 'latitude', 'longitude', 'meetup_datetime', 'max_participants', 'status',
+            'participants_count', 'is_full', 'available_spots', 'distance_km',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    def get_distance_km(self, obj):
+        # Only annotated on ?near= and ?bbox= searches
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
 
-class MeetupCreateSerializer(serializers.ModelSerializer):
+
+class MeetupCreateSerializer(CoordinatesMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     movie_name = serializers.CharField(write_only=True, required=False)
     movie = serializers.IntegerField(write_only=True)  # Accept TMDB ID as integer
@@ -49,13 +68,12 @@ class MeetupCreateSerializer(serializers.ModelSerializer):
         model = Meetup
         fields = [
             'id', 'title', 'description', 'movie', 'movie_name', 'location', 'theater_name', 
-            'meetup_datetime', 'max_participants'
+            'latitude', 'longitude', 'meetup_datetime', 'max_participants'
         ]
     
     def create(self, validated_data):
         from movies.models import Movie
-        import requests
-        from django.conf import settings
+        from movies.mirror import ingest_movie
         
         movie_id = validated_data.get('movie')
         movie_name = validated_data.pop('movie_name', None)
@@ -66,36 +84,9 @@ class MeetupCreateSerializer(serializers.ModelSerializer):
             try:
                 movie = Movie.objects.get(id=movie_id)
             except Movie.DoesNotExist:
-                # If not found, assume it's a TMDB ID and create/get the movie
+                # If not found, assume it's a TMDB ID and mirror it from TMDB
                 try:
-                    # Fetch from TMDB API
-                    tmdb_api_key = settings.TMDB_API_KEY
-                    response = requests.get(
-                        f'https://api.themoviedb.org/3/movie/{movie_id}',
-                        params={'api_key': tmdb_api_key}
-                    )
-                    movie_data = response.json()
-                    
-                    # Create or get the movie in local database
-                    from datetime import date
-                    release_date_str = movie_data.get('release_date')
-                    if release_date_str:
-                        from datetime import datetime
-                        release_date = datetime.strptime(release_date_str, '%Y-%m-%d').date()
-                    else:
-                        release_date = date.today()
-                    
-                    movie, created = Movie.objects.get_or_create(
-                        tmdb_id=movie_id,
-                        defaults={
-                            'title': movie_data.get('title', movie_name or 'Unknown'),
-                            'description': movie_data.get('overview', 'No description available'),
-                            'release_date': release_date,
-                            'poster_url': f"https://image.tmdb.org/t/p/w500{movie_data['poster_path']}" if movie_data.get('poster_path') else '',
-                            'genre': ', '.join([g['name'] for g in movie_data.get('genres', [])]) if movie_data.get('genres') else '',
-                            'rating': movie_data.get('vote_average', 0.0),
-                        }
-                    )
+                    movie = ingest_movie(movie_id)
                 except Exception as e:
                     # If TMDB fetch fails, create a basic movie entry
                     from datetime import date
@@ -114,24 +105,59 @@ class MeetupCreateSerializer(serializers.ModelSerializer):
 
 
 class MeetupDetailSerializer(serializers.ModelSerializer):
+    """A meetup with the relations in ``context['expand']`` embedded, bounded (see meetups.embedding)"""
     movie = MovieSerializer(read_only=True)
     organizer = UserSerializer(read_only=True)
-    participants = MeetupParticipantSerializer(many=True, read_only=True)
-    comments = MeetupCommentSerializer(many=True, read_only=True)
+    participants = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
     participants_count = serializers.ReadOnlyField()
     is_full = serializers.ReadOnlyField()
     available_spots = serializers.ReadOnlyField()
+    my_status = serializers.SerializerMethodField()
 
     class Meta:
         model = Meetup
         fields = [
             'id', 'title', 'description', 'movie', 'organizer', 'location',
-            'theater_name', 'meetup_datetime', 'max_participants', 'status',
-            'participants_count', 'is_full', 'available_spots',
+            'theater_name', 'latitude', 'longitude', 'meetup_datetime', 'max_participants', 'status',
+            'participants_count', 'is_full', 'available_spots', 'my_status',
             'participants', 'comments', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    embedded_serializers = {'participants': MeetupParticipantSerializer, 'comments': MeetupCommentSerializer}
+
+    @classmethod
+    def plain_fields(cls):
+        """Fields that ``?fields=`` can pick; the embedded relations go through ``?expand=``"""
+        return [name for name in cls.Meta.fields if name not in EMBEDDED]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand', ())
+        only = self.context.get('fields')
+        for name in list(self.fields):
+            keep = name in expand if name in EMBEDDED else only is None or name in only
+            if not keep:
+                self.fields.pop(name)
+
+    def embed(self, meetup, name):
+        rows, next_link = EMBEDDED[name].page(meetup, settings.MEETUP_EMBED_LIMIT, self.context.get('request'))
+        return {'results': self.embedded_serializers[name](rows, many=True).data, 'next': next_link}
+
+    def get_participants(self, obj):
+        return self.embed(obj, 'participants')
+
+    def get_comments(self, obj):
+        return self.embed(obj, 'comments')
+
+    def get_my_status(self, obj):
+        # Whether the requesting user joined, without needing every participant embedded
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return None
+        return obj.participants.filter(user=request.user).values_list('status', flat=True).first()
+
 
 class JoinMeetupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,536 @@
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from movies.genres import genres_from_string, set_movie_genres
+from movies.models import Movie
+from .models import Meetup, MeetupComment, MeetupParticipant
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock, skipUnless
+
+
+class MeetupConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.guest = User.objects.create_user(username='guest', password='testpass123')
+        self.movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.meetup = Meetup.objects.create(
+            title='Heat screening',
+            description='Director\'s cut',
+            movie=self.movie,
+            organizer=self.organizer,
+            location='Downtown',
+            meetup_datetime=timezone.now() + timedelta(days=3),
+        )
+
+    def test_unchanged_list_and_detail_are_answered_304(self):
+        listing = self.client.get('/api/meetups/')
+        detail = self.client.get(f'/api/meetups/{self.meetup.id}/')
+
+        self.assertEqual(
+            self.client.get('/api/meetups/', HTTP_IF_NONE_MATCH=listing['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEqual(
+            self.client.get(f'/api/meetups/{self.meetup.id}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_joining_changes_list_and_detail_validators(self):
+        listing = self.client.get('/api/meetups/')['ETag']
+        detail = self.client.get(f'/api/meetups/{self.meetup.id}/')['ETag']
+
+        self.client.force_authenticate(user=self.guest)
+        self.client.post(f'/api/meetups/{self.meetup.id}/join/')
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(f'/api/meetups/{self.meetup.id}/', HTTP_IF_NONE_MATCH=detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['participants_count'], 2)
+        self.assertEqual(self.client.get('/api/meetups/', HTTP_IF_NONE_MATCH=listing).status_code, status.HTTP_200_OK)
+
+    def test_leaving_changes_detail_validator(self):
+        MeetupParticipant.objects.create(meetup=self.meetup, user=self.guest)
+        detail = self.client.get(f'/api/meetups/{self.meetup.id}/')['ETag']
+        MeetupParticipant.objects.filter(meetup=self.meetup, user=self.guest).get().delete()
+        response = self.client.get(f'/api/meetups/{self.meetup.id}/', HTTP_IF_NONE_MATCH=detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_movie_edit_changes_meetup_validators(self):
+        listing = self.client.get('/api/meetups/')['ETag']
+        detail = self.client.get(f'/api/meetups/{self.meetup.id}/')['ETag']
+        self.movie.title = 'Heat (1995)'
+        self.movie.save()
+        self.assertEqual(self.client.get('/api/meetups/', HTTP_IF_NONE_MATCH=listing).status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.get(f'/api/meetups/{self.meetup.id}/', HTTP_IF_NONE_MATCH=detail).status_code,
+            status.HTTP_200_OK,
+        )
+
+
+    def test_user_changes_refresh_embedded_profiles(self):
+        MeetupParticipant.objects.create(meetup=self.meetup, user=self.guest)
+        url = f'/api/meetups/{self.meetup.id}/?expand=participants'
+        listing = self.client.get('/api/meetups/')['ETag']
+        detail = self.client.get(url)['ETag']
+
+        self.organizer.username = 'host'
+        self.organizer.save()
+        response = self.client.get('/api/meetups/', HTTP_IF_NONE_MATCH=listing)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['organizer']['username'], 'host')
+        detail = self.client.get(url)['ETag']
+
+        self.guest.username = 'renamed'
+        self.guest.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['participants']['results'][0]['user']['username'], 'renamed')
+
+class MeetupGenreFilterTest(TestCase):
+    def test_filters_by_movie_genre(self):
+        organizer = User.objects.create(username='organizer')
+        for title, genre in [('Heat', 'Crime, Drama'), ('Alien', 'Horror')]:
+            movie = Movie.objects.create(title=title, description='Plot', release_date=date(2000, 1, 1), genre=genre)
+            set_movie_genres({movie.pk: genres_from_string(genre)})
+            Meetup.objects.create(
+                title=f'{title} night', description='', movie=movie, organizer=organizer,
+                location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1),
+            )
+
+        response = APIClient().get('/api/meetups/', {'genre': 'drama'})
+
+        self.assertEqual([meetup['title'] for meetup in response.data['results']], ['Heat night'])
+        self.assertEqual(response.data['results'][0]['movie']['genres'], ['Crime', 'Drama'])
+
+
+class MeetupCommentPaginationTest(TestCase):
+    def test_comments_and_participants_routes_are_keyset_paginated(self):
+        organizer = User.objects.create(username='organizer')
+        movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        meetup = Meetup.objects.create(
+            title='Heat screening', description='', movie=movie, organizer=organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1),
+        )
+        comments = [MeetupComment.objects.create(meetup=meetup, user=organizer, text=str(i)) for i in range(5)]
+        MeetupParticipant.objects.create(meetup=meetup, user=User.objects.create(username='guest'))
+        client = APIClient()
+
+        first = client.get('/api/meetups/comments/', {'meetup': meetup.id, 'page_size': 3}).data
+        second = client.get(first['next']).data
+
+        texts = [comment['text'] for comment in first['results'] + second['results']]
+        self.assertEqual(texts, [comment.text for comment in reversed(comments)])
+        self.assertIsNone(second['next'])
+        participants = client.get('/api/meetups/participants/', {'meetup': meetup.id}).data
+        self.assertEqual(len(participants['results']), 1)
+
+
+class MeetupCapacityTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.guests = [User.objects.create_user(username=f'guest{i}', password='testpass123') for i in range(3)]
+        self.movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.meetup = self.create_meetup(max_participants=3)
+
+    def create_meetup(self, **fields):
+        return Meetup.objects.create(
+            title='Heat screening', description='', movie=self.movie, organizer=self.organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1), **fields,
+        )
+
+    def join(self, user, meetup=None):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/meetups/{(meetup or self.meetup).id}/join/')
+
+    def test_join_and_leave_keep_the_counter(self):
+        self.assertEqual(self.join(self.guests[0]).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.join(self.guests[1]).status_code, status.HTTP_201_CREATED)
+        self.meetup.refresh_from_db()
+        self.assertEqual((self.meetup.accepted_count, self.meetup.is_full, self.meetup.available_spots), (2, True, 0))
+        self.assertEqual(self.join(self.guests[2]).status_code, status.HTTP_202_ACCEPTED)
+
+        self.client.force_authenticate(self.guests[1])
+        self.client.post(f'/api/meetups/{self.meetup.id}/leave/')
+        self.client.force_authenticate(self.guests[0])
+        self.client.post(f'/api/meetups/{self.meetup.id}/leave/')
+        self.meetup.refresh_from_db()
+        # guest2 was promoted into the first freed seat
+        self.assertEqual(self.meetup.participants_count, 2)
+
+    def test_list_renders_capacity_without_per_meetup_queries(self):
+        for i in range(5):
+            meetup = self.create_meetup(max_participants=2 + i)
+            for guest in self.guests[:i % 3]:
+                self.join(guest, meetup)
+        self.client.force_authenticate(None)
+
+        # ETag aggregate, count, page rows with movie and organizer, genres
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/meetups/')
+        spots = {meetup['id']: meetup['available_spots'] for meetup in response.data['results']}
+        self.assertEqual(len(spots), 6)
+        self.assertEqual(spots[self.meetup.id], 2)
+
+        open_ids = {meetup['id'] for meetup in self.client.get('/api/meetups/', {'has_spots': 'true'}).data['results']}
+        self.assertEqual(open_ids, {meetup_id for meetup_id, left in spots.items() if left > 0})
+
+    def test_rebuild_command_repairs_drift(self):
+        MeetupParticipant.objects.create(meetup=self.meetup, user=self.guests[0])
+        MeetupParticipant.objects.create(meetup=self.meetup, user=self.guests[1], status='pending')
+        other = self.create_meetup()
+        Meetup.objects.filter(pk=other.pk).update(accepted_count=7)
+
+        call_command('rebuild_meetup_counts', '--batch-size', '1', stdout=StringIO())
+
+        self.meetup.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.meetup.accepted_count, other.accepted_count), (1, 0))
+
+
+class MeetupJoinTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.guest = User.objects.create_user(username='guest', password='testpass123')
+        movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.meetup = Meetup.objects.create(
+            title='Heat screening', description='', movie=movie, organizer=self.organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1), max_participants=2,
+        )
+        self.url = f'/api/meetups/{self.meetup.id}/join/'
+
+    def join(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url)
+
+    def test_organizer_and_repeat_joins_are_rejected(self):
+        self.assertEqual(self.join(self.organizer).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.join(self.guest).status_code, status.HTTP_201_CREATED)
+        response = self.join(self.guest)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['error'], 'You have already joined this meetup')
+
+    def test_losing_the_unique_race_is_a_409_and_gives_the_seat_back(self):
+        Meetup.objects.filter(pk=self.meetup.pk).update(max_participants=5)
+        MeetupParticipant.objects.create(meetup=self.meetup, user=self.guest)
+        Meetup.adjust_accepted_count(self.meetup.pk, 1)
+
+        # As if the concurrent insert landed between the exists() check and our own insert
+        with mock.patch('meetups.views.MeetupParticipant.objects.filter') as participants:
+            participants.return_value.exists.return_value = False
+            response = self.join(self.guest)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.meetup.refresh_from_db()
+        self.assertEqual(self.meetup.accepted_count, 1)
+
+    def test_full_meetup_waitlists_instead_of_overselling(self):
+        self.assertEqual(self.join(self.guest).status_code, status.HTTP_201_CREATED)
+        late = User.objects.create_user(username='late', password='testpass123')
+        response = self.join(late)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['status'], response.data['waitlist_position']), ('pending', 1))
+        self.meetup.refresh_from_db()
+        self.assertEqual(
+            (self.meetup.accepted_count, self.meetup.participants.filter(status='accepted').count()), (1, 1)
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent connections')
+class MeetupConcurrentJoinTest(TransactionTestCase):
+    def test_parallel_joins_fill_exactly_the_capacity(self):
+        organizer = User.objects.create(username='organizer')
+        users = [User.objects.create(username=f'guest{i}') for i in range(40)]
+        movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        meetup = Meetup.objects.create(
+            title='Heat screening', description='', movie=movie, organizer=organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1), max_participants=11,
+        )
+
+        def join(user):
+            try:
+                client = APIClient()
+                client.force_authenticate(user)
+                return client.post(f'/api/meetups/{meetup.id}/join/').status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            codes = list(pool.map(join, users + users[:10]))
+
+        meetup.refresh_from_db()
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 10)
+        self.assertEqual(codes.count(status.HTTP_202_ACCEPTED), 30)
+        self.assertEqual(codes.count(status.HTTP_409_CONFLICT), 10)
+        accepted = meetup.participants.filter(status='accepted').count()
+        self.assertEqual((meetup.accepted_count, accepted, meetup.participants.count()), (10, 10, 40))
+
+
+class MeetupWaitlistTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.users = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(4)]
+        movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.meetup = Meetup.objects.create(
+            title='Heat screening', description='', movie=movie, organizer=self.organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1), max_participants=2,
+        )
+        for user in self.users:
+            self.post(user, 'join')
+
+    def post(self, user, action):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/meetups/{self.meetup.id}/{action}/')
+
+    def waitlist(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(f'/api/meetups/{self.meetup.id}/waitlist/')
+
+    def statuses(self):
+        participants = MeetupParticipant.objects.filter(meetup=self.meetup)
+        return {participant.user_id: participant.status for participant in participants}
+
+    def test_queue_positions(self):
+        self.assertEqual(self.waitlist(self.users[0]).data, {'status': 'accepted', 'position': None, 'length': 3})
+        with self.assertNumQueries(3):  # meetup, participant, one aggregate
+            response = self.waitlist(self.users[3])
+        self.assertEqual(response.data, {'status': 'pending', 'position': 3, 'length': 3})
+        self.assertEqual(self.waitlist(self.organizer).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leave_promotes_the_first_waiter(self):
+        self.post(self.users[2], 'leave')  # a waiter leaving frees no seat
+        self.assertEqual(self.statuses()[self.users[1].pk], 'pending')
+
+        self.post(self.users[0], 'leave')
+
+        self.assertEqual(self.statuses(), {self.users[1].pk: 'accepted', self.users[3].pk: 'pending'})
+        self.assertEqual(self.waitlist(self.users[3]).data['position'], 1)
+        self.meetup.refresh_from_db()
+        self.assertEqual(self.meetup.accepted_count, 1)
+
+    def test_deleting_a_participant_user_frees_their_seat(self):
+        self.users[0].delete()
+
+        self.assertEqual(self.statuses(), {self.users[1].pk: 'accepted', self.users[2].pk: 'pending',
+                                           self.users[3].pk: 'pending'})
+        self.meetup.refresh_from_db()
+        self.assertEqual(self.meetup.accepted_count, 1)
+        self.users[1].delete()
+        self.assertEqual(self.statuses()[self.users[2].pk], 'accepted')
+
+    def test_deleting_the_meetup_skips_the_seat_bookkeeping(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.meetup.delete()
+        self.assertFalse(any('FOR UPDATE' in query['sql'] or 'COUNT' in query['sql'] for query in queries))
+        self.assertFalse(MeetupParticipant.objects.exists())
+
+    def test_raising_capacity_promotes_waiters_in_order(self):
+        self.client.force_authenticate(self.organizer)
+        response = self.client.patch(f'/api/meetups/{self.meetup.id}/', {'max_participants': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        statuses = self.statuses()
+        self.assertEqual([statuses[user.pk] for user in self.users], ['accepted', 'accepted', 'accepted', 'pending'])
+        self.meetup.refresh_from_db()
+        self.assertEqual((self.meetup.accepted_count, self.meetup.is_full), (3, True))
+
+
+@override_settings(MEETUP_EMBED_LIMIT=3)
+class MeetupEmbeddingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.guests = [User.objects.create_user(username=f'guest{i}', password='testpass123') for i in range(5)]
+        self.movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.meetup = Meetup.objects.create(
+            title='Heat screening', description='', movie=self.movie, organizer=self.organizer,
+            location='Downtown', meetup_datetime=timezone.now() + timedelta(days=1), max_participants=10,
+        )
+        for guest in self.guests:
+            MeetupParticipant.objects.create(meetup=self.meetup, user=guest)
+            MeetupComment.objects.create(meetup=self.meetup, user=guest, text=f'from {guest.username}')
+
+    def get(self, **params):
+        return self.client.get(f'/api/meetups/{self.meetup.id}/', params)
+
+    def test_relations_are_opt_in(self):
+        response = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('participants', response.data)
+        self.assertNotIn('comments', response.data)
+
+        response = self.get(expand='comments')
+        self.assertNotIn('participants', response.data)
+        self.assertEqual(len(response.data['comments']['results']), 3)
+
+    def test_embedded_page_continues_in_the_list_endpoint(self):
+        response = self.get(expand='participants,comments')
+        participants = response.data['participants']
+        self.assertEqual([p['user']['username'] for p in participants['results']], ['guest0', 'guest1', 'guest2'])
+        self.assertEqual([c['text'] for c in response.data['comments']['results']],
+                         ['from guest4', 'from guest3', 'from guest2'])
+
+        rest = self.client.get(participants['next'])
+        self.assertEqual([p['user']['username'] for p in rest.data['results']], ['guest3', 'guest4'])
+        rest = self.client.get(response.data['comments']['next'])
+        self.assertEqual([c['text'] for c in rest.data['results']], ['from guest1', 'from guest0'])
+
+    def test_continuation_pages_cost_a_fixed_number_of_queries(self):
+        response = self.get(expand='participants,comments')
+        for name in ('participants', 'comments'):
+            # The page rows with their users and profiles; nothing per row
+            with self.assertNumQueries(1):
+                rest = self.client.get(response.data[name]['next'])
+            self.assertEqual(len(rest.data['results']), 2)
+
+    def test_short_collections_have_no_next(self):
+        MeetupComment.objects.filter(meetup=self.meetup).exclude(user=self.guests[0]).delete()
+        response = self.get(expand='comments')
+        self.assertEqual(len(response.data['comments']['results']), 1)
+        self.assertIsNone(response.data['comments']['next'])
+
+    def test_query_count_does_not_grow_with_the_meetup(self):
+        # Meetup with movie and organizer, genres, participants page, comments page,
+        # ETag timestamps of the meetup's own joins, of participants' and of commenters' profiles
+        with self.assertNumQueries(7):
+            self.get(expand='participants,comments')
+        for i in range(20):
+            guest = User.objects.create_user(username=f'late{i}', password='testpass123')
+            MeetupParticipant.objects.create(meetup=self.meetup, user=guest)
+            MeetupComment.objects.create(meetup=self.meetup, user=guest, text='late')
+        with self.assertNumQueries(7):
+            response = self.get(expand='participants,comments')
+        self.assertEqual(len(response.data['participants']['results']), 3)
+
+    def test_fields_and_my_status(self):
+        self.client.force_authenticate(self.guests[1])
+        response = self.get(fields='id,title,my_status', expand='participants')
+        self.assertEqual(set(response.data), {'id', 'title', 'my_status', 'participants'})
+        self.assertEqual(response.data['my_status'], 'accepted')
+
+        self.client.force_authenticate(self.organizer)
+        self.assertIsNone(self.get(fields='my_status').data['my_status'])
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.get(expand='organizer').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get(fields='id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+
+class MeetupGeoTest(TestCase):
+    # (location, expected point) pairs in and around Los Angeles
+    DOWNTOWN = (34.0522, -118.2437)
+    SANTA_MONICA = (34.0195, -118.4912)  # ~23 km west of downtown
+    PASADENA = (34.1478, -118.1445)      # ~14 km north-east
+
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create_user(username='organizer', password='testpass123')
+        self.movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+
+    def create_meetup(self, point, **fields):
+        meetup = Meetup(
+            title='Heat screening', description='', movie=self.movie, organizer=self.organizer,
+            location='Somewhere', meetup_datetime=timezone.now() + timedelta(days=1), **fields,
+        )
+        meetup.set_coordinates(point)
+        meetup.save()
+        return meetup
+
+    def search(self, **params):
+        response = self.client.get('/api/meetups/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_create_geocodes_the_location(self):
+        self.client.force_authenticate(self.organizer)
+        payload = {
+            'title': 'Heat', 'description': 'Night screening', 'movie': self.movie.id, 'location': 'AMC Century City, Los Angeles, CA',
+            'meetup_datetime': (timezone.now() + timedelta(days=1)).isoformat(),
+        }
+        response = self.client.post('/api/meetups/', payload, format='json')
+        meetup = Meetup.objects.get(pk=response.data['id'])
+        self.assertEqual((meetup.latitude, meetup.longitude), self.DOWNTOWN)
+        self.assertEqual(meetup.lat_band, 340)
+
+        # Explicit coordinates win over the location text
+        response = self.client.post('/api/meetups/', {**payload, 'latitude': 34.0195, 'longitude': -118.4912}, format='json')
+        self.assertEqual(Meetup.objects.get(pk=response.data['id']).latitude, 34.0195)
+        response = self.client.post('/api/meetups/', {**payload, 'latitude': 34.0195}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_moving_a_meetup_geocodes_the_new_location(self):
+        meetup = self.create_meetup(self.DOWNTOWN)
+        self.client.force_authenticate(self.organizer)
+        self.client.patch(f'/api/meetups/{meetup.id}/', {'location': 'Somewhere in Tokyo'}, format='json')
+        meetup.refresh_from_db()
+        self.assertEqual((meetup.latitude, meetup.longitude), (35.6762, 139.6503))
+
+        self.client.patch(f'/api/meetups/{meetup.id}/', {'location': 'The moon'}, format='json')
+        meetup.refresh_from_db()
+        self.assertEqual((meetup.latitude, meetup.longitude, meetup.lat_band), (None, None, None))
+
+    def test_gazetteer_prefers_the_longest_name_and_coordinate_strings(self):
+        from .geocoding import geocode
+        self.assertEqual(geocode('Nitehawk, Brooklyn, New York City'), (40.7128, -74.0060))
+        self.assertEqual(geocode('Cinemateca, São Paulo'), (-23.5505, -46.6333))
+        self.assertEqual(geocode(' 51.5, -0.12 '), (51.5, -0.12))
+        self.assertIsNone(geocode('Springfield'))
+
+    def test_near_filters_by_radius_and_sorts_by_distance(self):
+        santa_monica = self.create_meetup(self.SANTA_MONICA)
+        pasadena = self.create_meetup(self.PASADENA)
+        self.create_meetup((40.7128, -74.0060))
+        self.create_meetup(None)
+
+        results = self.search(near='34.0522,-118.2437')
+        self.assertEqual([meetup['id'] for meetup in results], [pasadena.id, santa_monica.id])
+        self.assertAlmostEqual(results[0]['distance_km'], 14.2, delta=0.5)
+        results = self.search(near='34.0522,-118.2437', radius=20)
+        self.assertEqual([meetup['id'] for meetup in results], [pasadena.id])
+        self.assertEqual(len(self.search(near='34.0522,-118.2437', radius=500)), 2)
+
+    def test_bbox_and_the_antimeridian(self):
+        fiji = self.create_meetup((-18.1248, 178.4501))
+        samoa = self.create_meetup((-13.8333, -171.7500))
+        self.create_meetup(self.DOWNTOWN)
+
+        results = self.search(bbox='-25,175,-10,-170')
+        self.assertEqual({meetup['id'] for meetup in results}, {fiji.id, samoa.id})
+        self.assertEqual([meetup['id'] for meetup in self.search(bbox='-25,175,-10,180')], [fiji.id])
+        # A radius search across the antimeridian finds both sides too
+        results = self.search(near='-16,179.9', radius=500)
+        self.assertEqual([meetup['id'] for meetup in results], [fiji.id])
+        results = self.search(near='-16,-179.9', radius=500)
+        self.assertEqual([meetup['id'] for meetup in results], [fiji.id])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'near': 'downtown'}, {'near': '91,0'}, {'near': '34,-118', 'radius': '0'},
+                       {'near': '34,-118', 'radius': '100000'}, {'bbox': '1,2,3'}, {'bbox': '10,0,5,1'}):
+            response = self.client.get('/api/meetups/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_geocode_command_backfills_missing_coordinates(self):
+        meetup = self.create_meetup(None)
+        Meetup.objects.filter(pk=meetup.pk).update(location='Odeon Leicester Square, London')
+        unknown = self.create_meetup(None)
+
+        out = StringIO()
+        call_command('geocode_meetups', stdout=out)
+
+        meetup.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual((meetup.latitude, meetup.longitude, meetup.lat_band), (51.5074, -0.1278, 515))
+        self.assertIsNone(unknown.latitude)
+        self.assertIn('Geocoded 1 meetups, 1 locations not found', out.getvalue())
@@ -3,9 +3,10 @@ from rest_framework.routers import DefaultRouter
 from .views import MeetupViewSet, MeetupParticipantViewSet, MeetupCommentViewSet
 
 router = DefaultRouter()
-router.register('', MeetupViewSet, basename='meetup')
 router.register('participants', MeetupParticipantViewSet, basename='meetup-participant')
 router.register('comments', MeetupCommentViewSet, basename='meetup-comment')
+# Registered last so its detail route doesn't swallow participants/ and comments/
+router.register('', MeetupViewSet, basename='meetup')
 
 urlpatterns = [
     path('', include(router.urls)),
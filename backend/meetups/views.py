@@ -1,8 +1,17 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from moviemeetup.conditional import ConditionalGetMixin
+from moviemeetup.pagination import KeysetPagination
+from movies.genres import movies_in_genres, parse_genre_filter
+from . import geo
+from .embedding import parse_expand, parse_fields, prefetches
+from .geocoding import geocode
 from .models import Meetup, MeetupParticipant, MeetupComment
 from .serializers import (
     MeetupSerializer,
@@ -14,10 +23,20 @@ from .serializers import (
 )
 
 
-class MeetupViewSet(viewsets.ModelViewSet):
+class MeetupViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """CRUD operations for meetups"""
     queryset = Meetup.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
+    # The movie and organizer are rendered inline; participants and comments touch the meetup itself
+    conditional_related_fields = ('movie__updated_at', 'organizer__profile__updated_at')
+
+    def get_conditional_related_fields(self):
+        fields = super().get_conditional_related_fields()
+        if self.action == 'retrieve':
+            # Embedded participants and comments render their users too
+            expand = parse_expand(self.request.query_params)
+            fields += tuple(f'{name}__user__profile__updated_at' for name in expand)
+        return fields
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -26,11 +45,47 @@ class MeetupViewSet(viewsets.ModelViewSet):
             return MeetupDetailSerializer
         return MeetupSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            params = self.request.query_params
+            context['expand'] = parse_expand(params)
+            context['fields'] = parse_fields(params, MeetupDetailSerializer.plain_fields())
+        return context
+
+    def geocoded(self, serializer):
+        """Coordinates for a new or moved location, unless the client sent its own"""
+        data = serializer.validated_data
+        instance = serializer.instance
+        if 'latitude' in data:
+            return {}
+        if instance is not None and data.get('location', instance.location) == instance.location:
+            return {}
+        point = geocode(data.get('location', ''))
+        latitude, longitude = point if point is not None else (None, None)
+        return {'latitude': latitude, 'longitude': longitude}
+
     def perform_create(self, serializer):
-        serializer.save(organizer=self.request.user)
+        serializer.save(organizer=self.request.user, **self.geocoded(serializer))
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_max = serializer.instance.max_participants
+        meetup = serializer.save(**self.geocoded(serializer))
+        if meetup.max_participants > old_max:
+            Meetup.promote_waitlist(meetup.pk)
 
     def get_queryset(self):
-        queryset = Meetup.objects.all()
+        if self.action in ('join', 'leave', 'waitlist'):
+            # Nothing is rendered from the meetup itself
+            return Meetup.objects.all()
+        
+        # Capacity fields come from the accepted_count column, so a page costs a fixed number of queries
+        queryset = Meetup.objects.with_open_spots().select_related('movie', 'organizer__profile')
+        queryset = queryset.prefetch_related('movie__genres')
+        if self.action == 'retrieve':
+            # Only the ?expand= relations, and only their first page, so the query count stays fixed
+            queryset = queryset.prefetch_related(*prefetches(parse_expand(self.request.query_params)))
         
         # Filter by status
         status_param = self.request.query_params.get('status')
@@ -42,6 +97,11 @@ class MeetupViewSet(viewsets.ModelViewSet):
         if movie_id:
             queryset = queryset.filter(movie_id=movie_id)
         
+        # Filter by the movie's genre (?genre=drama or ?genre=drama,comedy)
+        genre = self.request.query_params.get('genre')
+        if genre:
+            queryset = queryset.filter(movie_id__in=movies_in_genres(parse_genre_filter(genre)))
+        
         # Filter upcoming meetups
         upcoming = self.request.query_params.get('upcoming')
         if upcoming == 'true':
@@ -50,11 +110,36 @@ class MeetupViewSet(viewsets.ModelViewSet):
                 status='upcoming'
             )
         
+        # Only meetups with seats left (?has_spots=true)
+        if self.request.query_params.get('has_spots') == 'true':
+            queryset = queryset.filter(open_spots__gt=0)
+        
         # Filter user's meetups
         my_meetups = self.request.query_params.get('my_meetups')
         if my_meetups == 'true' and self.request.user.is_authenticated:
             queryset = queryset.filter(organizer=self.request.user)
         
+        # Meetups near a point (?near=lat,lng&radius=km) or inside ?bbox=south,west,north,east, nearest first
+        return self.filter_area(queryset)
+
+    def filter_area(self, queryset):
+        params = self.request.query_params
+        if 'near' in params:
+            try:
+                latitude, longitude = geo.parse_point(params['near'])
+                radius = geo.parse_radius(
+                    params.get('radius'), settings.MEETUP_NEAR_DEFAULT_RADIUS_KM, settings.MEETUP_NEAR_MAX_RADIUS_KM,
+                )
+            except ValueError as e:
+                raise ValidationError({'near': str(e)})
+            return queryset.near(latitude, longitude, radius)
+        if 'bbox' in params:
+            try:
+                box = geo.parse_box(params['bbox'])
+            except ValueError as e:
+                raise ValidationError({'bbox': str(e)})
+            # Sorted by distance from the middle of the box
+            return queryset.within(box).with_distance(*geo.box_center(box)).order_by('distance_km', 'id')
         return queryset
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
@@ -63,39 +148,48 @@ class MeetupViewSet(viewsets.ModelViewSet):
         meetup = self.get_object()
         
         # Check if user is the organizer
-        if meetup.organizer == request.user:
+        if meetup.organizer_id == request.user.pk:
             return Response(
                 {'error': 'You are the organizer of this meetup'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if meetup is full
-        if meetup.is_full:
-            return Response(
-                {'error': 'This meetup is full'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if already joined
-        if MeetupParticipant.objects.filter(meetup=meetup, user=request.user).exists():
-            return Response(
-                {'error': 'You have already joined this meetup'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         serializer = JoinMeetupSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        participant = MeetupParticipant.objects.create(
-            meetup=meetup,
-            user=request.user,
-            message=serializer.validated_data.get('message', '')
+        already_joined = Response(
+            {'error': 'You have already joined this meetup'},
+            status=status.HTTP_409_CONFLICT
         )
+        if MeetupParticipant.objects.filter(meetup=meetup, user=request.user).exists():
+            return already_joined
         
-        return Response(
-            MeetupParticipantSerializer(participant).data,
-            status=status.HTTP_201_CREATED
-        )
+        try:
+            with transaction.atomic():
+                # The seat is taken by one conditional UPDATE, so concurrent joins can't oversell;
+                # the row stays locked until the participant is inserted and the transaction commits
+                seated = Meetup.reserve_seat(meetup.pk)
+                if not seated:
+                    # Full: lock the meetup so a concurrent leave can't free a seat before we queue,
+                    # then check once more
+                    Meetup.objects.select_for_update().values_list('pk', flat=True).get(pk=meetup.pk)
+                    seated = Meetup.reserve_seat(meetup.pk)
+                participant = MeetupParticipant.objects.create(
+                    meetup=meetup,
+                    user=request.user,
+                    status='accepted' if seated else 'pending',
+                    message=serializer.validated_data.get('message', '')
+                )
+        except IntegrityError:
+            # A concurrent join by the same user won the unique (meetup, user) race; the seat was rolled back
+            return already_joined
+        
+        data = MeetupParticipantSerializer(participant).data
+        if not seated:
+            # Waitlisted: promoted automatically when a seat frees up, so there is no need to retry
+            data['waitlist_position'], data['waitlist_length'] = participant.waitlist()
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def leave(self, request, pk=None):
@@ -103,8 +197,10 @@ class MeetupViewSet(viewsets.ModelViewSet):
         meetup = self.get_object()
         
         try:
-            participant = MeetupParticipant.objects.get(meetup=meetup, user=request.user)
-            participant.delete()
+            with transaction.atomic():
+                participant = MeetupParticipant.objects.get(meetup=meetup, user=request.user)
+                # The release_seat receiver gives the seat back and promotes the waitlist
+                participant.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except MeetupParticipant.DoesNotExist:
             return Response(
@@ -112,11 +208,24 @@ class MeetupViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def waitlist(self, request, pk=None):
+        """The requesting user's place in the meetup's waitlist"""
+        meetup = self.get_object()
+        participant = MeetupParticipant.objects.filter(meetup=meetup, user=request.user).first()
+        if participant is None:
+            return Response(
+                {'error': 'You are not a participant of this meetup'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        position, length = participant.waitlist()
+        return Response({'status': participant.status, 'position': position, 'length': length})
+
     @action(detail=True, methods=['get'])
     def participants(self, request, pk=None):
         """Get meetup participants"""
         meetup = self.get_object()
-        participants = meetup.participants.all()
+        participants = meetup.participants.select_related('user__profile')
         serializer = MeetupParticipantSerializer(participants, many=True)
         return Response(serializer.data)
 
@@ -138,7 +247,7 @@ class MeetupViewSet(viewsets.ModelViewSet):
     def comments(self, request, pk=None):
         """Get meetup comments"""
         meetup = self.get_object()
-        comments = meetup.comments.all()
+        comments = meetup.comments.select_related('user__profile')
         serializer = MeetupCommentSerializer(comments, many=True)
         return Response(serializer.data)
 
@@ -148,9 +257,12 @@ class MeetupParticipantViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = MeetupParticipant.objects.all()
     serializer_class = MeetupParticipantSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('joined_at', 'id')
 
     def get_queryset(self):
-        queryset = MeetupParticipant.objects.all()
+        # Also where the embedded participants on meetup detail continue, so no per-row user queries
+        queryset = MeetupParticipant.objects.select_related('user__profile')
         
         # Filter by meetup
         meetup_id = self.request.query_params.get('meetup')
@@ -170,12 +282,14 @@ class MeetupCommentViewSet(viewsets.ModelViewSet):
     queryset = MeetupComment.objects.all()
     serializer_class = MeetupCommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     def get_queryset(self):
-        queryset = MeetupComment.objects.all()
+        queryset = MeetupComment.objects.select_related('user__profile')
         
         # Filter by meetup
         meetup_id = self.request.query_params.get('meetup')
@@ -7,5 +7,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviemeetup.settings')
+# Serve the TMDB proxies with the non-blocking async views under ASGI
+os.environ.setdefault('TMDB_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
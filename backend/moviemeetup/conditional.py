@@ -0,0 +1,166 @@
+"""
+Conditional GET support: ETag / Last-Modified validators and 304 responses.
+
+Validators are computed before anything is serialized. Model endpoints use
+the row count and newest ``updated_at`` of the (filtered) queryset, TMDB
+proxy data uses the body hash stored next to the cached response. When the
+client's ``If-None-Match`` / ``If-Modified-Since`` still matches, the view
+answers 304 Not Modified without serializing or rendering the body.
+
+Rows rendered inside another resource (participants and comments of a
+meetup, ratings of a movie) bump their parent's ``updated_at`` through
+signals, so the parent's validator covers them. Nested users are covered by
+their profile's ``updated_at``, which every ``User`` save bumps (see
+accounts.models), listed in the view's ``conditional_related_fields``.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """Strong ETag from any reprable values"""
+    return '"%s"' % hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def body_etag(data):
+    """ETag of a JSON-serializable body, independent of dict ordering"""
+    raw = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _opaque(etag):
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def is_not_modified(request, etag=None, last_modified=None):
+    """True if the copy the client already holds is still current.
+
+    ``If-None-Match`` takes precedence; ``If-Modified-Since`` is only looked at
+    when it is absent, as RFC 9110 requires.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        candidates = {_opaque(tag.strip()) for tag in if_none_match.split(',')}
+        return '*' in candidates or _opaque(etag) in candidates
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified is not None:
+        since = parse_http_date_safe(if_modified_since)
+        return since is not None and int(last_modified.timestamp()) <= since
+    return False
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified_response(etag=None, last_modified=None):
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
+
+
+def conditional_response(request, etag, make_response, last_modified=None):
+    """A 304 if the client is current, otherwise ``make_response()`` with validators set"""
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return set_validators(make_response(), etag, last_modified)
+
+
+def _is_to_many(model, lookup):
+    """True if ``lookup`` (e.g. ``ratings__user__profile__updated_at``) follows a reverse FK or M2M"""
+    for name in lookup.split('__')[:-1]:
+        field = model._meta.get_field(name)
+        if field.one_to_many or field.many_to_many:
+            return True
+        model = field.related_model
+    return False
+
+
+class ConditionalGetMixin:
+    """ViewSet mixin answering ``list`` and ``retrieve`` with 304 when nothing changed.
+
+    The list validator is the count and newest ``updated_at`` of the filtered
+    queryset (deletes change the count, inserts and edits the timestamp), plus
+    the newest timestamp of every ``conditional_related_fields`` lookup for
+    related rows that are rendered inline. Under keyset pagination it is the
+    ids and timestamps of the requested page's rows instead. Views whose
+    related lookups depend on the action or query override
+    ``get_conditional_related_fields()``; lookups through a to-many relation
+    are aggregated in a query of their own, so that several of them don't
+    multiply each other's rows. Lists only get an ETag: a delete
+    doesn't move the newest timestamp, so Last-Modified alone would be wrong.
+    Single objects get both. Note that ``QuerySet.update()`` skips
+    ``auto_now``, so bulk updates must set ``updated_at`` themselves.
+    """
+    conditional_related_fields = ()
+
+    def get_conditional_related_fields(self):
+        return self.conditional_related_fields
+
+    def _etag_context(self):
+        # Page/filter params and the user change the body even when the rows don't
+        user = self.request.user
+        return (
+            type(self).__name__, self.action, self.request.get_full_path(),
+            user.pk if user.is_authenticated else None,
+        )
+
+    def _aggregate(self, queryset, count=True):
+        queryset = queryset.order_by()
+        aggregates = {'updated': Max('updated_at')}
+        if count:
+            aggregates['rows'] = Count('pk')
+        separate = {}
+        for index, lookup in enumerate(self.get_conditional_related_fields()):
+            target = separate if _is_to_many(queryset.model, lookup) else aggregates
+            target[f'related_{index}'] = Max(lookup)
+        # Single objects already know their own updated_at, so skip a query that would only repeat it
+        values = queryset.aggregate(**aggregates) if count or len(aggregates) > 1 else {}
+        for name, aggregate in separate.items():
+            values.update(queryset.aggregate(**{name: aggregate}))
+        return values
+
+    def list_etag(self, queryset):
+        # Keyset pages are validated by their own rows: one index range scan instead of a full aggregate
+        page_window = getattr(self.paginator, 'page_window', None)
+        window = page_window(queryset, self.request, self) if page_window is not None else None
+        if window is not None:
+            rows = window.values_list('pk', 'updated_at', *self.get_conditional_related_fields())
+            return make_etag(self._etag_context(), list(rows))
+        return make_etag(self._etag_context(), sorted(self._aggregate(queryset).items()))
+
+    def list(self, request, *args, **kwargs):
+        etag = self.list_etag(self.filter_queryset(self.get_queryset()))
+        response = conditional_response(
+            request, etag, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        timestamps = [instance.updated_at]
+        if self.get_conditional_related_fields():
+            values = self._aggregate(type(instance)._default_manager.filter(pk=instance.pk), count=False)
+            timestamps += [value for name, value in sorted(values.items()) if name != 'updated']
+        etag = make_etag(self._etag_context(), instance.pk, timestamps)
+        last_modified = max(timestamp for timestamp in timestamps if timestamp is not None)
+
+        response = conditional_response(
+            request, etag, lambda: Response(self.get_serializer(instance).data), last_modified=last_modified
+        )
+        patch_vary_headers(response, ['Authorization'])
+        return response
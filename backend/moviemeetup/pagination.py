@@ -0,0 +1,182 @@
+"""
+Keyset (cursor) pagination for large, append-heavy collections.
+
+``PageNumberPagination`` runs ``OFFSET n`` plus a ``COUNT(*)`` on every page,
+so deep pages get slower as the table grows. ``KeysetPagination`` orders by a
+unique composite key such as ``(-created_at, -id)`` and continues from the
+last row the client saw::
+
+    created_at < :t OR (created_at = :t AND id < :id)
+
+together with a redundant ``created_at <= :t`` bound, so every page is one
+range scan of an index on the same columns, however deep it is. Cursors are
+opaque and carry the key of the boundary row and a direction, which gives
+``next`` and ``previous`` links. Responses keep ``count`` like page-number
+pages do; clients that walk deep pages can send ``?count=false`` to skip the
+``COUNT(*)``, and the links carry it along.
+
+Views opt in per endpoint with ``pagination_class = KeysetPagination`` and a
+``keyset_ordering`` (or ``get_keyset_ordering()``, which may return None for
+orderings that have no usable key). Requests it can't serve, and requests that
+still send ``?page=``, are paginated by page number.
+"""
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Unlike DjangoJSONEncoder, keep full microsecond precision: keys are compared for equality
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on ``view.keyset_ordering``, whose last field must be unique"""
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    fallback_class = PageNumberPagination
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.fallback = None
+
+    def get_ordering(self, request, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering()
+        return getattr(view, 'keyset_ordering', None)
+
+    def uses_keyset(self, request, view):
+        return (
+            self.get_ordering(request, view) is not None
+            and self.fallback_class.page_query_param not in request.query_params
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() not in ('0', 'false', 'no')
+
+    def encode_cursor(self, key, reverse):
+        raw = json.dumps({'k': key, 'r': int(reverse)}, default=_encode_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, queryset, ordering):
+        """The (key, reverse) of the request's cursor, or None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            if len(raw['k']) != len(ordering):
+                raise ValueError(encoded)
+            fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in ordering]
+            key = [field.to_python(value) for field, value in zip(fields, raw['k'])]
+            return key, bool(raw['r'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(ordering, key):
+        """Rows strictly after ``key`` in ``ordering`` (a list of ``[-]field`` names)"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(ordering, key):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        # Redundant bound on the leading column so the index is range-scanned
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": key[0]})
+        return bound & condition
+
+    @staticmethod
+    def reversed_ordering(ordering):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+    def window(self, queryset, request, view):
+        """The ordered, sliced queryset for the requested page (plus one row to detect more)"""
+        ordering = list(self.get_ordering(request, view))
+        cursor = self.decode_cursor(request, queryset, ordering)
+        reverse = cursor is not None and cursor[1]
+        if reverse:
+            ordering = self.reversed_ordering(ordering)
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(ordering, cursor[0]))
+        return queryset[:self.get_page_size(request) + 1], cursor
+
+    def page_window(self, queryset, request, view):
+        """Rows of the requested page for computing validators, or None when keyset doesn't apply"""
+        if not self.uses_keyset(request, view) or self.wants_count(request):
+            return None
+        return self.window(queryset, request, view)[0]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.uses_keyset(request, view):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+        self.fallback = None
+        self.request = request
+        self.ordering = [name.lstrip('-') for name in self.get_ordering(request, view)]
+        self.count = queryset.count() if self.wants_count(request) else None
+
+        window, cursor = self.window(queryset, request, view)
+        page_size = self.get_page_size(request)
+        rows = list(window)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if cursor is not None and cursor[1]:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def _key(self, row):
+        return [getattr(row, name) for name in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._key(self.page[-1]), False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._key(self.page[0]), True))
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        body = OrderedDict()
+        if self.count is not None:
+            body['count'] = self.count
+        body['next'] = self.get_next_link()
+        body['previous'] = self.get_previous_link()
+        body['results'] = data
+        return Response(body)
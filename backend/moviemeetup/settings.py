@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -39,7 +40,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'moviemeetup.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -172,4 +173,100 @@ SIMPLE_JWT = {
 
 # TMDB API Configuration
 TMDB_API_KEY = config('TMDB_API_KEY', default='')
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+TMDB_BASE_URL = config('TMDB_BASE_URL', default='https://api.themoviedb.org/3')
+TMDB_CONNECT_TIMEOUT = config('TMDB_CONNECT_TIMEOUT', default=3.05, cast=float)  # seconds
+TMDB_READ_TIMEOUT = config('TMDB_READ_TIMEOUT', default=10.0, cast=float)  # seconds
+TMDB_MAX_RETRIES = config('TMDB_MAX_RETRIES', default=2, cast=int)
+TMDB_RETRY_BACKOFF = config('TMDB_RETRY_BACKOFF', default=0.3, cast=float)
+# Longest sleep between retries, including a Retry-After the server asks for
+TMDB_RETRY_MAX_WAIT = config('TMDB_RETRY_MAX_WAIT', default=2.0, cast=float)  # seconds
+TMDB_POOL_MAXSIZE = config('TMDB_POOL_MAXSIZE', default=20, cast=int)
+# Async proxy views (enabled by moviemeetup/asgi.py) share one connection pool per event loop
+TMDB_ASYNC_VIEWS = config('TMDB_ASYNC_VIEWS', default=False, cast=bool)
+TMDB_ASYNC_POOL_MAXSIZE = config('TMDB_ASYNC_POOL_MAXSIZE', default=200, cast=int)
+
+# Outbound TMDB budget (requests/second). With TMDB_RATE_LIMIT_SHARED the budget is
+# counted in the 'tmdb' cache, so all workers sharing a Redis cache share it.
+TMDB_RATE_LIMIT = config('TMDB_RATE_LIMIT', default=40, cast=float)
+TMDB_RATE_LIMIT_BURST = config('TMDB_RATE_LIMIT_BURST', default=40, cast=int)
+TMDB_RATE_LIMIT_MAX_WAIT = config('TMDB_RATE_LIMIT_MAX_WAIT', default=2.0, cast=float)  # seconds
+TMDB_RATE_LIMIT_SHARED = config('TMDB_RATE_LIMIT_SHARED', default=False, cast=bool)
+# Fail fast for TMDB_BREAKER_RECOVERY_TIMEOUT seconds after this many consecutive TMDB failures
+TMDB_BREAKER_FAILURE_THRESHOLD = config('TMDB_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+TMDB_BREAKER_RECOVERY_TIMEOUT = config('TMDB_BREAKER_RECOVERY_TIMEOUT', default=30.0, cast=float)
+
+TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p'
+
+# Local TMDB mirror: detail/search proxies answer from the Movie table while a
+# movie's copy is younger than TMDB_MIRROR_MAX_AGE seconds
+TMDB_MIRROR_ENABLED = config('TMDB_MIRROR_ENABLED', default=True, cast=bool)
+TMDB_MIRROR_MAX_AGE = config('TMDB_MIRROR_MAX_AGE', default=60 * 60 * 24, cast=int)
+TMDB_MIRROR_SEARCH_MIN_RESULTS = 20
+
+# /api/movies/typeahead/ index: rebuilt from the database once older than this many seconds
+# (catches bulk writes and changes made by other worker processes)
+MOVIE_TYPEAHEAD_MAX_AGE = config('MOVIE_TYPEAHEAD_MAX_AGE', default=300, cast=int)
+
+# /api/movies/tmdb/batch/: ids accepted per request and parallel TMDB fetches per request
+TMDB_BATCH_MAX_IDS = 50
+TMDB_BATCH_CONCURRENCY = config('TMDB_BATCH_CONCURRENCY', default=8, cast=int)
+
+# /api/movies/rating-stats/: seconds each movie's breakdown stays cached, how far back
+# "recent_reviews" counts, and movies accepted per batch request
+MOVIE_RATING_STATS_TTL = config('MOVIE_RATING_STATS_TTL', default=300, cast=int)
+MOVIE_RATING_STATS_RECENT_DAYS = config('MOVIE_RATING_STATS_RECENT_DAYS', default=30, cast=int)
+MOVIE_RATING_STATS_MAX_IDS = 100
+
+# ?user_state=true badges: seconds a user's favorites/ratings stay cached between their writes
+MOVIE_MEMBERSHIP_TTL = config('MOVIE_MEMBERSHIP_TTL', default=600, cast=int)
+
+# /api/movies/favorites/bulk/: movie ids added or removed per request
+FAVORITES_BULK_MAX_IDS = 500
+
+# Meetup detail ?expand=participants,comments: rows embedded per relation before its "next" cursor
+MEETUP_EMBED_LIMIT = 10
+
+# Meetup geocoding: the provider class (see meetups.geocoding), and the ?near= search radius in km
+MEETUP_GEOCODER = config('MEETUP_GEOCODER', default='meetups.geocoding.GazetteerGeocoder')
+MEETUP_NEAR_DEFAULT_RADIUS_KM = 25
+MEETUP_NEAR_MAX_RADIUS_KM = 500
+
+# Results whose title or overview contains any of these (case-insensitive) are hidden
+TMDB_BLOCKED_KEYWORDS = ['erotic', 'sex', 'adult', 'pornographic']
+
+# TMDB response cache TTLs in seconds, per proxy endpoint
+TMDB_CACHE_TTLS = {
+    'default': 60 * 60,
+    'search': 60 * 10,
+    'movie': 60 * 60 * 6,
+    'recommendations': 60 * 60 * 6,
+    'reviews': 60 * 60,
+    'popular': 60 * 60,
+}
+# Expired TMDB entries are served for this much longer while they refresh in the background
+TMDB_CACHE_STALE_TTL = config('TMDB_CACHE_STALE_TTL', default=60 * 60, cast=int)
+TMDB_CACHE_REFRESH_WORKERS = config('TMDB_CACHE_REFRESH_WORKERS', default=4, cast=int)
+
+
+# Caches
+# The 'tmdb' cache holds proxied TMDB responses. LocMemCache evicts least recently
+# used entries once MAX_ENTRIES is reached; point TMDB_CACHE_BACKEND/TMDB_CACHE_LOCATION
+# at FileBasedCache or RedisCache (with maxmemory-policy allkeys-lru) to share it
+# between workers.
+TMDB_CACHE_BACKEND = config('TMDB_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tmdb': {
+        'BACKEND': TMDB_CACHE_BACKEND,
+        'LOCATION': config('TMDB_CACHE_LOCATION', default='tmdb'),
+        'TIMEOUT': TMDB_CACHE_TTLS['default'],
+    },
+}
+
+if not TMDB_CACHE_BACKEND.endswith('RedisCache'):
+    CACHES['tmdb']['OPTIONS'] = {
+        'MAX_ENTRIES': config('TMDB_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    }
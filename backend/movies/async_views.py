@@ -0,0 +1,217 @@
+"""
+Async versions of the TMDB proxy views.
+
+These are plain Django coroutine views (DRF 3.14 has no async support) that
+await the non-blocking TMDB client instead of holding a worker thread for the
+whole upstream round trip. ``moviemeetup/asgi.py`` switches them on, so one
+ASGI process can keep hundreds of TMDB calls in flight; responses, status
+codes and caching match the sync views in ``views.py``.
+"""
+import asyncio
+from functools import wraps
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from moviemeetup.conditional import body_etag, conditional_response, make_etag
+
+from . import membership, mirror
+from .cache import tmdb_cache
+from .membership import Membership
+from .filters import TMDB_FILTER_PARAMS, filter_tmdb_page
+from .tmdb import AsyncTMDBUnavailable
+from .utils import parse_id_list
+
+
+def async_get_only(view):
+    """Reject anything but GET/HEAD (Django 4.2's require_GET can't wrap coroutines).
+
+    Also authenticates the bearer token up front, as DRF does for the sync
+    views: a bad or expired token is a 401, not an anonymous response.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        request.jwt_user = None
+        if request.META.get('HTTP_AUTHORIZATION'):
+            try:
+                request.jwt_user = await sync_to_async(_authenticate)(request)
+            except AuthenticationFailed as e:
+                return _authentication_failed(request, e)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _authenticate(request):
+    authenticated = JWTAuthentication().authenticate(request)
+    return authenticated[0] if authenticated else None
+
+
+def _authentication_failed(request, exc):
+    """The 401 DRF's exception handler would send for ``exc``"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    response['WWW-Authenticate'] = JWTAuthentication().authenticate_header(request)
+    return response
+
+
+def _request_membership(request):
+    """``membership.for_request`` for a plain Django request, which DRF hasn't authenticated"""
+    return membership.for_request(request.jwt_user, request.GET)
+
+
+async def _tmdb_response(request, etag, data, decorate=None):
+    """Async ``views.tmdb_response``: the payload with the user's badges under ``?user_state=true``"""
+    state = await sync_to_async(_request_membership)(request) if decorate is not None else None
+    if state is None:
+        return conditional_response(request, etag, lambda: JsonResponse(data))
+    response = conditional_response(
+        request, make_etag(etag, state.version), lambda: JsonResponse(decorate(state, data))
+    )
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+async def _proxy(request, endpoint, path, params, transform=None, decorate=None):
+    if not settings.TMDB_API_KEY:
+        return JsonResponse({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    try:
+        entry = await tmdb_cache.afetch_entry(endpoint, path, params, transform=transform)
+    except AsyncTMDBUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except httpx.HTTPError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return await _tmdb_response(request, entry['etag'], entry['data'], decorate)
+
+
+@async_get_only
+async def search_tmdb_movies(request):
+    """Search movies from TMDB API - English language only (Hollywood), family-friendly"""
+    query = request.GET.get('q', '')
+    if not query:
+        return JsonResponse({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    local = await sync_to_async(mirror.search_fresh)(query)
+    if local is not None:
+        return await _tmdb_response(request, body_etag(local), local, Membership.decorate_tmdb_page)
+
+    params = {
+        'query': query,
+        'language': 'en-US',
+        'page': 1,
+        **TMDB_FILTER_PARAMS,
+    }
+    return await _proxy(
+        request, 'search', 'search/movie', params, transform=filter_tmdb_page, decorate=Membership.decorate_tmdb_page
+    )
+
+
+@async_get_only
+async def get_tmdb_movie_details(request, tmdb_id):
+    """Get movie details (with credits), from the local mirror when fresh, otherwise from TMDB API"""
+    local = await sync_to_async(mirror.get_fresh_details)(tmdb_id)
+    if local is not None:
+        return await _tmdb_response(request, body_etag(local), local, Membership.decorate_tmdb_movie)
+
+    if not settings.TMDB_API_KEY:
+        return JsonResponse({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    try:
+        entry = await tmdb_cache.afetch_entry('movie', f'movie/{tmdb_id}', mirror.DETAIL_PARAMS)
+    except AsyncTMDBUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except httpx.HTTPError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # Only mirror what TMDB just sent, never a cached copy (see views.get_tmdb_movie_details)
+    if entry.get('fetched') and settings.TMDB_MIRROR_ENABLED:
+        await sync_to_async(mirror.upsert_movies)([entry['data']])
+    return await _tmdb_response(request, entry['etag'], entry['data'], Membership.decorate_tmdb_movie)
+
+
+@async_get_only
+async def get_tmdb_movie_details_batch(request):
+    """Get details for many movies (?ids=1,2,3) in one response, with per-id errors"""
+    try:
+        tmdb_ids = parse_id_list(request.GET.get('ids', ''), settings.TMDB_BATCH_MAX_IDS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = await sync_to_async(mirror.get_fresh_details_many)(tmdb_ids)
+    missing = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in results]
+    errors = {}
+
+    if missing:
+        if not settings.TMDB_API_KEY:
+            return JsonResponse({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        semaphore = asyncio.Semaphore(settings.TMDB_BATCH_CONCURRENCY)
+
+        async def fetch(tmdb_id):
+            async with semaphore:
+                return await tmdb_cache.afetch_entry('movie', f'movie/{tmdb_id}', mirror.DETAIL_PARAMS)
+
+        outcomes = await asyncio.gather(*(fetch(tmdb_id) for tmdb_id in missing), return_exceptions=True)
+        fetched = []
+        for tmdb_id, outcome in zip(missing, outcomes):
+            if isinstance(outcome, httpx.HTTPError):
+                errors[str(tmdb_id)] = str(outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[tmdb_id] = outcome['data']
+                if outcome.get('fetched'):
+                    fetched.append(outcome['data'])
+
+        if fetched and settings.TMDB_MIRROR_ENABLED:
+            await sync_to_async(mirror.upsert_movies)(fetched)
+
+    state = await sync_to_async(_request_membership)(request)
+    if state is not None:
+        results = {tmdb_id: state.decorate_tmdb_movie(movie) for tmdb_id, movie in results.items()}
+    return JsonResponse({
+        'results': {str(tmdb_id): results[tmdb_id] for tmdb_id in tmdb_ids if tmdb_id in results},
+        'errors': errors,
+    })
+
+
+@async_get_only
+async def get_movie_recommendations(request, tmdb_id):
+    """Get recommended movies from TMDB API for a specific movie"""
+    params = {
+        'language': 'en-US',
+        'page': request.GET.get('page', 1),
+    }
+    return await _proxy(
+        request, 'recommendations', f'movie/{tmdb_id}/recommendations', params,
+        transform=filter_tmdb_page, decorate=Membership.decorate_tmdb_page,
+    )
+
+
+@async_get_only
+async def get_movie_reviews(request, tmdb_id):
+    """Get reviews for a movie from TMDB API"""
+    params = {
+        'language': 'en-US',
+        'page': request.GET.get('page', 1),
+    }
+    return await _proxy(request, 'reviews', f'movie/{tmdb_id}/reviews', params)
+
+
+@async_get_only
+async def get_popular_movies(request):
+    """Get popular movies from TMDB API - English language only (Hollywood), family-friendly"""
+    params = {
+        'language': 'en-US',
+        'page': request.GET.get('page', 1),
+        **TMDB_FILTER_PARAMS,
+    }
+    return await _proxy(
+        request, 'popular', 'movie/popular', params, transform=filter_tmdb_page, decorate=Membership.decorate_tmdb_page
+    )
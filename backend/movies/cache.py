@@ -0,0 +1,289 @@
+"""
+TTL response cache in front of the TMDB proxy endpoints.
+
+Entries live in the Django cache configured under the ``tmdb`` alias, so the
+same code runs against locmem (LRU, bounded by ``MAX_ENTRIES``), file-based or
+Redis backends. Keys are built from the endpoint name, the TMDB path and the
+normalized query params; each endpoint type has its own TTL. What gets cached
+is the already-filtered payload, so hits skip both the upstream call and the
+content filter. Each entry also stores a hash of its body, which the proxy
+views use as the ETag for conditional GETs.
+
+To keep hot keys from stampeding TMDB when they expire, concurrent misses for
+the same key are coalesced into one upstream fetch (single-flight), and an
+entry past its TTL keeps being served for ``TMDB_CACHE_STALE_TTL`` seconds
+while a background worker refreshes it (stale-while-revalidate).
+
+``afetch`` is the asyncio flavour used by the async proxy views; it shares
+keys, entries and counters with ``fetch``.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+from moviemeetup.conditional import body_etag
+
+from .tmdb import get_async_client, get_client
+
+
+class _Flight:
+    """One in-flight upstream fetch that concurrent callers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout):
+        if not self.event.wait(timeout):
+            raise requests.Timeout('Timed out waiting for an in-flight TMDB request')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TMDBResponseCache:
+    """Read-through cache for TMDB responses with per-endpoint TTLs"""
+
+    key_prefix = 'tmdb:v3'
+    counter_names = ('hits', 'misses', 'stale', 'coalesced', 'refreshes', 'refresh_errors')
+
+    def __init__(self, alias='tmdb'):
+        self.alias = alias
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._executor = None
+        self._pending = set()
+        # asyncio futures and tasks are bound to their event loop
+        self._ainflight = weakref.WeakKeyDictionary()
+        self._atasks = set()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def ttl(self, endpoint):
+        ttls = settings.TMDB_CACHE_TTLS
+        return ttls.get(endpoint, ttls['default'])
+
+    def make_key(self, endpoint, path, params=None):
+        normalized = {}
+        for name, value in (params or {}).items():
+            if name == 'api_key' or value is None:
+                continue
+            value = str(value).strip()
+            if name == 'query':
+                # TMDB search is case-insensitive, so "Dune" and " dune " share an entry
+                value = ' '.join(value.lower().split())
+            normalized[name] = value
+        raw = json.dumps([path.strip('/'), normalized], sort_keys=True)
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f'{self.key_prefix}:{endpoint}:{digest}'
+
+    def fetch(self, endpoint, path, params=None, transform=None):
+        """Return cached data for the request, calling TMDB on a miss.
+
+        ``transform`` runs once on the fresh upstream payload (e.g. content
+        filtering) and its result is what gets stored. Errors are never cached.
+        Stale entries are returned immediately and refreshed in the background.
+        """
+        return self.fetch_entry(endpoint, path, params, transform)['data']
+
+    def fetch_entry(self, endpoint, path, params=None, transform=None):
+        """Like ``fetch`` but return the cache entry, with the body's ``etag`` next to its ``data``.
+
+        ``fetched`` is True when the entry was loaded from TMDB for this call
+        (a miss, possibly shared with coalesced callers) rather than read from
+        the cache, fresh or stale.
+        """
+        key = self.make_key(endpoint, path, params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry['fresh_until'] > time.time():
+                self._count(endpoint, 'hits')
+            else:
+                self._count(endpoint, 'stale')
+                self._refresh_in_background(key, endpoint, path, params, transform)
+            return entry
+
+        self._count(endpoint, 'misses')
+        return self._single_flight(key, endpoint, lambda: self._load(key, endpoint, path, params, transform))
+
+    def _load(self, key, endpoint, path, params, transform):
+        data = get_client().get(path, params, endpoint=endpoint)
+        entry, timeout = self._make_entry(endpoint, data, transform)
+        self.cache.set(key, entry, timeout)
+        return {**entry, 'fetched': True}
+
+    def _make_entry(self, endpoint, data, transform):
+        if transform is not None:
+            data = transform(data)
+        ttl = self.ttl(endpoint)
+        entry = {'data': data, 'etag': body_etag(data), 'fresh_until': time.time() + ttl}
+        return entry, ttl + settings.TMDB_CACHE_STALE_TTL
+
+    def _single_flight(self, key, endpoint, load):
+        """Run ``load`` unless the same key is already being fetched, then share its result"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            self._count(endpoint, 'coalesced')
+            return flight.wait(self._wait_timeout())
+
+        try:
+            flight.result = load()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def _wait_timeout(self):
+        # Upper bound on how long the leader's call (with retries) can take
+        attempts = settings.TMDB_MAX_RETRIES + 1
+        waits = settings.TMDB_MAX_RETRIES * settings.TMDB_RETRY_MAX_WAIT
+        return (settings.TMDB_CONNECT_TIMEOUT + settings.TMDB_READ_TIMEOUT) * attempts + waits + 1
+
+    def _refresh_in_background(self, key, endpoint, path, params, transform):
+        with self._lock:
+            if key in self._inflight:
+                return
+        # Only one worker process refreshes a given key at a time
+        lock_key = f'{key}:refreshing'
+        if not self.cache.add(lock_key, 1, timeout=int(self._wait_timeout())):
+            return
+
+        def refresh():
+            try:
+                self._single_flight(key, endpoint, lambda: self._load(key, endpoint, path, params, transform))
+                self._count(endpoint, 'refreshes')
+            except Exception:
+                # Keep serving the stale entry; the next request past its TTL retries
+                self._count(endpoint, 'refresh_errors')
+            finally:
+                self.cache.delete(lock_key)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.TMDB_CACHE_REFRESH_WORKERS, thread_name_prefix='tmdb-refresh'
+                )
+            future = self._executor.submit(refresh)
+            self._pending.add(future)
+        future.add_done_callback(self._discard_pending)
+
+    def _discard_pending(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def wait_for_refreshes(self, timeout=None):
+        """Block until queued background refreshes have finished"""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    async def afetch(self, endpoint, path, params=None, transform=None):
+        """Async version of ``fetch`` using the non-blocking TMDB client"""
+        return (await self.afetch_entry(endpoint, path, params, transform))['data']
+
+    async def afetch_entry(self, endpoint, path, params=None, transform=None):
+        """Async version of ``fetch_entry``"""
+        key = self.make_key(endpoint, path, params)
+        entry = await self.cache.aget(key)
+        if entry is not None:
+            if entry['fresh_until'] > time.time():
+                self._count(endpoint, 'hits')
+            else:
+                self._count(endpoint, 'stale')
+                await self._arefresh_in_background(key, endpoint, path, params, transform)
+            return entry
+
+        self._count(endpoint, 'misses')
+        return await self._asingle_flight(key, endpoint, lambda: self._aload(key, endpoint, path, params, transform))
+
+    async def _aload(self, key, endpoint, path, params, transform):
+        data = await get_async_client().get(path, params, endpoint=endpoint)
+        entry, timeout = self._make_entry(endpoint, data, transform)
+        await self.cache.aset(key, entry, timeout)
+        return {**entry, 'fetched': True}
+
+    async def _asingle_flight(self, key, endpoint, load):
+        loop = asyncio.get_running_loop()
+        inflight = self._ainflight.setdefault(loop, {})
+        future = inflight.get(key)
+        if future is not None:
+            self._count(endpoint, 'coalesced')
+            return await asyncio.shield(future)
+
+        future = inflight[key] = loop.create_future()
+        try:
+            result = await load()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del inflight[key]
+
+    async def _arefresh_in_background(self, key, endpoint, path, params, transform):
+        if key in self._ainflight.get(asyncio.get_running_loop(), {}):
+            return
+        lock_key = f'{key}:refreshing'
+        if not await self.cache.aadd(lock_key, 1, timeout=int(self._wait_timeout())):
+            return
+
+        async def refresh():
+            try:
+                await self._asingle_flight(key, endpoint, lambda: self._aload(key, endpoint, path, params, transform))
+                self._count(endpoint, 'refreshes')
+            except Exception:
+                self._count(endpoint, 'refresh_errors')
+            finally:
+                await self.cache.adelete(lock_key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._atasks.add(task)
+        task.add_done_callback(self._atasks.discard)
+
+    def _count(self, endpoint, counter):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, dict.fromkeys(self.counter_names, 0))
+            counters[counter] += 1
+
+    def stats(self):
+        """Hit/miss counters per endpoint for this process"""
+        with self._lock:
+            result = {}
+            for endpoint, counters in self._counters.items():
+                served = counters['hits'] + counters['stale']
+                total = served + counters['misses']
+                result[endpoint] = dict(counters, hit_ratio=round(served / total, 3) if total else None)
+            return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters.clear()
+
+
+tmdb_cache = TMDBResponseCache()
@@ -0,0 +1,274 @@
+"""
+Offline stand-in for the TMDB API, for benchmarks and tests.
+
+``FakeTMDB`` is an ASGI app answering the endpoints the proxies call
+(``search/movie``, ``movie/<id>``, ``movie/<id>/recommendations``,
+``movie/<id>/reviews`` and ``movie/popular``) with TMDB-shaped payloads that
+are generated deterministically from the request, so two runs with the same
+options see the same data. Upstream latency, jitter, error rate and payload
+size are configurable.
+
+With a fixtures directory it can also record real TMDB responses (forwarding
+each request to ``upstream`` and saving what comes back) and replay them later
+without network access. Run it with ``python manage.py fake_tmdb`` and point
+``TMDB_BASE_URL`` at it.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import httpx
+
+
+TMDB_URL = 'https://api.themoviedb.org/3'
+
+MOVIE_PATH = re.compile(r'^movie/(\d+)(?:/(recommendations|reviews))?$')
+
+GENRES = [
+    {'id': 12, 'name': 'Adventure'}, {'id': 16, 'name': 'Animation'}, {'id': 18, 'name': 'Drama'},
+    {'id': 28, 'name': 'Action'}, {'id': 35, 'name': 'Comedy'}, {'id': 878, 'name': 'Science Fiction'},
+]
+
+WORDS = ('space heist family journey dragon detective island winter robot music friendship '
+         'war ocean kingdom secret city ghost summer train school storm river night').split()
+
+NOT_FOUND = {'success': False, 'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+INVALID_PAGE = {'success': False, 'status_code': 22,
+                'status_message': 'Invalid page: Pages start at 1 and max at 500. They are expected to be an integer.'}
+MAX_PAGE = 500
+
+
+def normalize_path(path):
+    """``/3/movie/5/`` -> ``movie/5``"""
+    path = path.strip('/')
+    if path.startswith('3/'):
+        path = path[2:]
+    return path
+
+
+class FixtureStore:
+    """Recorded TMDB responses, one JSON file per path and query (``api_key`` excluded)"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path_for(self, path, params):
+        query = sorted((key, str(value)) for key, value in params.items() if key != 'api_key')
+        digest = hashlib.sha1(json.dumps([path, query]).encode()).hexdigest()[:16]
+        return self.directory / f"{path.replace('/', '_')}-{digest}.json"
+
+    def load(self, path, params):
+        """``(status, body)`` recorded for this request, or None"""
+        try:
+            fixture = json.loads(self.path_for(path, params).read_text())
+        except FileNotFoundError:
+            return None
+        return fixture['status'], fixture['body']
+
+    def save(self, path, params, status, body):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        params = {key: value for key, value in params.items() if key != 'api_key'}
+        fixture = {'path': path, 'params': params, 'status': status, 'body': body}
+        self.path_for(path, params).write_text(json.dumps(fixture, indent=1, sort_keys=True))
+
+
+class FakeTMDB:
+    """ASGI app imitating the TMDB endpoints used by ``movies``.
+
+    ``mode`` is ``'synthetic'`` (generate every response), ``'replay'`` (serve
+    fixtures, falling back to synthetic data unless ``strict``) or
+    ``'record'`` (forward to ``upstream`` and save the responses as fixtures).
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503,
+                 results_per_page=20, overview_words=30, cast_size=10, reviews_per_page=5,
+                 seed=0, mode='synthetic', fixtures=None, strict=False,
+                 upstream=TMDB_URL, upstream_api_key='', upstream_transport=None):
+        if mode != 'synthetic' and fixtures is None:
+            raise ValueError(f'{mode} mode needs a fixtures directory')
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.results_per_page = results_per_page
+        self.overview_words = overview_words
+        self.cast_size = cast_size
+        self.reviews_per_page = reviews_per_page
+        self.seed = seed
+        self.mode = mode
+        self.fixtures = FixtureStore(fixtures) if fixtures is not None else None
+        self.strict = strict
+        self.upstream = upstream.rstrip('/')
+        self.upstream_api_key = upstream_api_key
+        self.upstream_transport = upstream_transport
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while (await receive())['type'] != 'lifespan.shutdown':
+                await send({'type': 'lifespan.startup.complete'})
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = normalize_path(scope['path'])
+        params = dict(parse_qsl(scope['query_string'].decode()))
+        self.requests += 1
+
+        if self.mode == 'record':
+            status, body = await self.record(path, params)
+        else:
+            await self.delay()
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                status, body = self.error_status, {
+                    'success': False, 'status_code': 11, 'status_message': 'Injected fake TMDB failure.',
+                }
+            else:
+                status, body = self.respond(path, params)
+
+        data = json.dumps(body).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json;charset=utf-8'),
+                        (b'content-length', str(len(data)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def delay(self):
+        latency = self.latency_ms
+        if self.jitter_ms:
+            latency += self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    async def record(self, path, params):
+        query = dict(params, api_key=self.upstream_api_key or params.get('api_key', ''))
+        async with httpx.AsyncClient(transport=self.upstream_transport, timeout=30) as client:
+            response = await client.get(f'{self.upstream}/{path}', params=query)
+        status, body = response.status_code, response.json()
+        self.fixtures.save(path, params, status, body)
+        return status, body
+
+    def respond(self, path, params):
+        if self.mode == 'replay':
+            recorded = self.fixtures.load(path, params)
+            if recorded is not None:
+                return recorded
+            if self.strict:
+                return 404, dict(NOT_FOUND, status_message=f'No recorded fixture for {path}.')
+        return self.generate(path, params)
+
+    # Synthetic payloads
+
+    def generate(self, path, params):
+        try:
+            page = int(params.get('page') or 1)
+        except ValueError:
+            page = None
+        if page is None or not 1 <= page <= MAX_PAGE:
+            # TMDB answers a malformed or out of range page with a 400 rather than clamping it
+            return 400, INVALID_PAGE
+        if path == 'movie/popular':
+            return 200, self.page(page, 'popular')
+        if path == 'search/movie':
+            query = params.get('query', '')
+            if not query:
+                return 200, {'page': 1, 'results': [], 'total_pages': 1, 'total_results': 0}
+            return 200, self.page(page, f'search:{query.lower()}', title_prefix=query.title())
+
+        match = MOVIE_PATH.match(path)
+        if not match or int(match.group(1)) == 0:
+            return 404, NOT_FOUND
+        movie_id, sub_resource = int(match.group(1)), match.group(2)
+        if sub_resource == 'recommendations':
+            return 200, self.page(page, f'recommendations:{movie_id}')
+        if sub_resource == 'reviews':
+            return 200, self.reviews(movie_id, page)
+        return 200, self.details(movie_id, params)
+
+    def rng(self, *key):
+        return random.Random(zlib.crc32(repr((self.seed,) + key).encode()))
+
+    def text(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def movie(self, movie_id, title=None):
+        rng = self.rng('movie', movie_id)
+        year = rng.randint(1970, 2025)
+        return {
+            'id': movie_id,
+            'title': title or f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {movie_id}',
+            'original_title': title or f'Movie {movie_id}',
+            'original_language': 'en',
+            'overview': self.text(rng, self.overview_words),
+            'release_date': f'{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'poster_path': f'/poster{movie_id}.jpg',
+            'backdrop_path': f'/backdrop{movie_id}.jpg',
+            'vote_average': round(rng.uniform(4, 9), 1),
+            'vote_count': rng.randint(10, 30000),
+            'popularity': round(rng.uniform(1, 500), 3),
+            'genre_ids': [genre['id'] for genre in rng.sample(GENRES, 2)],
+            'adult': False,
+            'video': False,
+        }
+
+    def page(self, page, key, title_prefix=None):
+        rng = self.rng('page', key)
+        total_results = rng.randint(self.results_per_page, 50 * self.results_per_page)
+        total_pages = -(-total_results // self.results_per_page)
+        if page > total_pages:
+            results = []
+        else:
+            first = (page - 1) * self.results_per_page
+            count = min(self.results_per_page, total_results - first)
+            base = rng.randint(1, 900000)
+            results = [
+                self.movie(base + first + i, title=f'{title_prefix} {first + i + 1}' if title_prefix else None)
+                for i in range(count)
+            ]
+        return {'page': page, 'results': results, 'total_pages': total_pages, 'total_results': total_results}
+
+    def details(self, movie_id, params):
+        rng = self.rng('details', movie_id)
+        movie = self.movie(movie_id)
+        genre_ids = movie.pop('genre_ids')
+        movie.update({
+            'genres': [genre for genre in GENRES if genre['id'] in genre_ids],
+            'runtime': rng.randint(80, 180),
+            'status': 'Released',
+            'tagline': self.text(rng, 6),
+            'imdb_id': f'tt{movie_id:07d}',
+        })
+        if 'credits' in params.get('append_to_response', '').split(','):
+            movie['credits'] = {
+                'cast': [
+                    {'id': movie_id * 100 + i, 'name': f'Actor {i}', 'character': f'Role {i}', 'order': i,
+                     'profile_path': f'/actor{movie_id}_{i}.jpg'}
+                    for i in range(self.cast_size)
+                ],
+                'crew': [{'id': movie_id * 100 + 99, 'name': 'Director', 'job': 'Director'}],
+            }
+        return movie
+
+    def reviews(self, movie_id, page):
+        rng = self.rng('reviews', movie_id)
+        total_results = rng.randint(0, 3 * self.reviews_per_page)
+        total_pages = max(1, -(-total_results // self.reviews_per_page))
+        first = (page - 1) * self.reviews_per_page
+        results = [
+            {'id': f'{movie_id}-{i}', 'author': f'critic{i}', 'content': self.text(rng, self.overview_words * 3),
+             'author_details': {'rating': rng.randint(1, 10)}, 'created_at': '2024-01-01T00:00:00.000Z'}
+            for i in range(first, min(first + self.reviews_per_page, total_results))
+        ]
+        return {'id': movie_id, 'page': page, 'results': results,
+                'total_pages': total_pages, 'total_results': total_results}
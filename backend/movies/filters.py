@@ -0,0 +1,111 @@
+"""
+Family-friendly content filter shared by the TMDB proxies and local search.
+
+The blocked keyword set (``TMDB_BLOCKED_KEYWORDS``) is compiled once. A TMDB
+results page is filtered in one pass: every title and overview is joined into
+a single lowercased buffer, each keyword is located with ``str.find`` (a C
+substring search, which beats a regex alternation or a pure-Python
+Aho-Corasick automaton in CPython), and hits are mapped back to their result
+with a binary search over the item offsets. Local ``Movie`` querysets get the
+same keywords as one case-insensitive regex evaluated by the database.
+Matching is by substring, like the original per-view loops.
+"""
+import bisect
+import re
+import threading
+from itertools import accumulate
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class ContentFilter:
+    """Compiled keyword filter for TMDB result pages and ``Movie`` querysets"""
+
+    def __init__(self, keywords):
+        keywords = {keyword.lower() for keyword in keywords if keyword}
+        # A keyword containing another one can never be the only match, so skip it
+        self.keywords = tuple(sorted(
+            keyword for keyword in keywords
+            if not any(other != keyword and other in keyword for other in keywords)
+        ))
+        self.pattern = '|'.join(re.escape(keyword) for keyword in self.keywords)
+
+    @staticmethod
+    def _text(movie):
+        # Keywords never contain a newline or NUL, so matches can't straddle fields or results
+        return f"{movie.get('title') or ''}\n{movie.get('overview') or ''}"
+
+    def is_blocked(self, movie):
+        """True if a TMDB result is flagged adult or mentions a blocked keyword"""
+        if movie.get('adult', False):
+            return True
+        text = self._text(movie).lower()
+        return any(keyword in text for keyword in self.keywords)
+
+    def filter_results(self, results):
+        """Return the results that pass the filter, scanning the page once per keyword"""
+        if not self.keywords:
+            return [movie for movie in results if not movie.get('adult', False)]
+
+        # Lowercase each text before measuring it: some characters grow ('İ' becomes two code points)
+        texts = [self._text(movie).lower() for movie in results]
+        buffer = '\0'.join(texts)
+        # Offset of the first character of each result in the buffer
+        starts = [0, *accumulate(len(text) + 1 for text in texts)]
+
+        blocked = set()
+        for keyword in self.keywords:
+            position = buffer.find(keyword)
+            while position != -1:
+                index = bisect.bisect_right(starts, position) - 1
+                blocked.add(index)
+                # Skip to the next result, one hit is enough
+                position = buffer.find(keyword, starts[index + 1])
+
+        return [
+            movie for index, movie in enumerate(results)
+            if index not in blocked and not movie.get('adult', False)
+        ]
+
+    def filter_page(self, data):
+        """Filter the ``results`` list of a TMDB page in place and return the page"""
+        if 'results' in data:
+            data['results'] = self.filter_results(data['results'])
+        return data
+
+    def filter_queryset(self, queryset, fields=('title', 'description')):
+        """Exclude movies whose ``fields`` mention a blocked keyword, in SQL"""
+        if not self.keywords:
+            return queryset
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__iregex': self.pattern})
+        return queryset.exclude(condition)
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_content_filter():
+    """Return the filter compiled from the current ``TMDB_BLOCKED_KEYWORDS``"""
+    global _filter
+    keywords = tuple(settings.TMDB_BLOCKED_KEYWORDS)
+    current = _filter
+    if current is None or current[0] != keywords:
+        with _filter_lock:
+            current = _filter
+            if current is None or current[0] != keywords:
+                current = _filter = (keywords, ContentFilter(keywords))
+    return current[1]
+
+
+# Sent with the TMDB popular and search requests, and matched by the mirror's local search:
+# English-language (Hollywood) movies only, no adult content
+TMDB_FILTER_PARAMS = {'with_original_language': 'en', 'include_adult': 'false'}
+
+
+def filter_tmdb_page(data):
+    """Cache transform used by the TMDB proxy views"""
+    return get_content_filter().filter_page(data)
@@ -0,0 +1,91 @@
+"""
+Normalized movie genres.
+
+``Movie.genres`` links movies to ``Genre`` rows through the M2M table, whose
+indexes on ``genre_id`` and ``(movie_id, genre_id)`` serve the ``?genre=``
+filters on movies and meetups. Genres are identified by slug, so "Sci-Fi"
+and "sci fi" are the same genre. ``Movie.genre`` keeps the comma-joined names
+for display and is written together with the links.
+"""
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import Genre, Movie
+
+
+def genre_slug(name):
+    return slugify(name)[:60]
+
+
+def genres_from_tmdb(data):
+    """(name, TMDB id) pairs from a TMDB detail payload"""
+    return [(genre['name'], genre.get('id')) for genre in data.get('genres', []) if genre.get('name')]
+
+
+def genres_from_string(value):
+    """(name, None) pairs from a comma-joined genre string"""
+    return [(name.strip(), None) for name in (value or '').split(',') if name.strip()]
+
+
+def parse_genre_filter(value):
+    """Slugs from a ``?genre=`` parameter, e.g. "drama,Science Fiction" """
+    return [slug for slug in (genre_slug(name) for name in value.split(',')) if slug]
+
+
+def movies_in_genres(slugs):
+    """Subquery of the ids of movies in any of the genres ``slugs``, read from the link table"""
+    return Movie.genres.through.objects.filter(genre__slug__in=slugs).values('movie_id')
+
+
+def genre_ids(genres):
+    """Primary keys for (name, TMDB id) pairs by slug, creating missing genres.
+
+    A pair matches the genre with its TMDB id first, so a genre TMDB has
+    renamed keeps its row (and slug), then the genre with its slug.
+    """
+    wanted = {}
+    for name, tmdb_id in genres:
+        slug = genre_slug(name)
+        if slug and slug not in wanted:
+            wanted[slug] = Genre(name=name[:50], slug=slug, tmdb_id=tmdb_id)
+    if not wanted:
+        return {}
+    existing = _existing_genre_ids(wanted)
+    missing = [genre for slug, genre in wanted.items() if slug not in existing]
+    if missing:
+        # Neither the slug nor the TMDB id is taken, short of a concurrent insert
+        Genre.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = _existing_genre_ids(wanted)
+    return existing
+
+
+def _existing_genre_ids(wanted):
+    tmdb_ids = [genre.tmdb_id for genre in wanted.values() if genre.tmdb_id is not None]
+    rows = Genre.objects.filter(Q(slug__in=wanted) | Q(tmdb_id__in=tmdb_ids)).values_list('pk', 'slug', 'tmdb_id')
+    by_slug, by_tmdb_id = {}, {}
+    for pk, slug, tmdb_id in rows:
+        by_slug[slug] = pk
+        if tmdb_id is not None:
+            by_tmdb_id[tmdb_id] = pk
+    existing = {}
+    for slug, genre in wanted.items():
+        pk = by_tmdb_id.get(genre.tmdb_id, by_slug.get(slug))
+        if pk is not None:
+            existing[slug] = pk
+    return existing
+
+
+def set_movie_genres(movie_genres):
+    """Replace the genre links of several movies: ``{movie_pk: [(name, tmdb_id), ...]}``"""
+    if not movie_genres:
+        return
+    ids = genre_ids(genre for genres in movie_genres.values() for genre in genres)
+    Link = Movie.genres.through
+    links = {
+        (movie_pk, ids[genre_slug(name)])
+        for movie_pk, genres in movie_genres.items()
+        for name, _tmdb_id in genres
+        if genre_slug(name) in ids
+    }
+    Link.objects.filter(movie_id__in=list(movie_genres)).delete()
+    Link.objects.bulk_create([Link(movie_id=movie_pk, genre_id=genre_pk) for movie_pk, genre_pk in links])
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.fake_tmdb import TMDB_URL, FakeTMDB
+
+
+class Command(BaseCommand):
+    help = 'Serve an offline fake TMDB API (point TMDB_BASE_URL at http://<host>:<port>/3)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=100, help='Delay before every response')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Random +/- spread around --latency-ms')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+        parser.add_argument('--error-status', type=int, default=503, help='Status code of injected errors')
+        parser.add_argument('--results-per-page', type=int, default=20)
+        parser.add_argument('--overview-words', type=int, default=30, help='Words per synthetic overview')
+        parser.add_argument('--cast-size', type=int, default=10, help='Cast members appended to movie details')
+        parser.add_argument('--seed', type=int, default=0)
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--record', metavar='DIR', help='Forward requests to --upstream and save the responses in DIR')
+        mode.add_argument('--replay', metavar='DIR', help='Serve responses recorded in DIR')
+        parser.add_argument('--strict', action='store_true', help='With --replay, 404 instead of synthesizing unrecorded requests')
+        parser.add_argument('--upstream', default=TMDB_URL)
+        parser.add_argument('--upstream-api-key', default='', help='Real TMDB key used with --record')
+
+    def handle(self, *args, **options):
+        import uvicorn
+
+        if options['record'] and not options['upstream_api_key']:
+            raise CommandError('--record needs --upstream-api-key')
+
+        mode = 'record' if options['record'] else 'replay' if options['replay'] else 'synthetic'
+        app = FakeTMDB(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            results_per_page=options['results_per_page'],
+            overview_words=options['overview_words'],
+            cast_size=options['cast_size'],
+            seed=options['seed'],
+            mode=mode,
+            fixtures=options['record'] or options['replay'],
+            strict=options['strict'],
+            upstream=options['upstream'],
+            upstream_api_key=options['upstream_api_key'],
+        )
+        self.stdout.write(f"Fake TMDB ({mode}) on http://{options['host']}:{options['port']}/3")
+        uvicorn.run(app, host=options['host'], port=options['port'], log_level='warning')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from movies.models import Movie, MovieRating
+
+
+class Command(BaseCommand):
+    help = 'Recompute Movie.rating_sum / rating_count from the MovieRating table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, nargs='*', default=[], help='Only these movie ids')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Movies updated per statement')
+
+    def handle(self, *args, **options):
+        ratings = MovieRating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+        totals = {
+            'rating_sum': Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0),
+            'rating_count': Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0),
+        }
+
+        movies = Movie.objects.order_by('pk')
+        if options['ids']:
+            movies = movies.filter(pk__in=options['ids'])
+
+        # Walk the table in primary key ranges so each UPDATE stays short on large tables
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(movies.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            updated += Movie.objects.filter(pk__in=batch).update(**totals)
+            last_pk = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating totals for {updated} movies'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from movies import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute "people who liked this also liked" neighbors from ratings and favorites'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute every movie (default: only movies rated or favorited since the last build)',
+        )
+        parser.add_argument('--neighbors', type=int, default=recommendations.NEIGHBORS, help='Neighbors kept per movie')
+        parser.add_argument(
+            '--min-support', type=int, default=recommendations.MIN_SUPPORT,
+            help='Users who must have liked both movies',
+        )
+        parser.add_argument(
+            '--shrinkage', type=float, default=recommendations.SHRINKAGE,
+            help='Damps similarities backed by few users',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=recommendations.CHUNK_SIZE,
+            help='Movies per sparse product; lower it to save memory',
+        )
+
+    def handle(self, *args, **options):
+        build = recommendations.rebuild_similarities(
+            full=options['full'],
+            neighbors=options['neighbors'],
+            min_support=options['min_support'],
+            shrinkage=options['shrinkage'],
+            chunk_size=options['chunk_size'],
+        )
+        seconds = (build.finished_at - build.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Full' if build.full else 'Incremental'} build: {build.movies} movies, "
+            f"{build.rows} neighbor rows in {seconds:.1f}s"
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from movies import mirror
+
+
+class Command(BaseCommand):
+    help = 'Mirror TMDB movies into the Movie table (popular pages, given ids and stale rows)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5, help='Popular pages to ingest (20 movies each)')
+        parser.add_argument('--ids', type=int, nargs='*', default=[], help='Extra TMDB ids to ingest')
+        parser.add_argument('--stale', action='store_true', help='Also refresh mirrored movies past TMDB_MIRROR_MAX_AGE')
+        parser.add_argument('--stale-limit', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=100, help='Movies fetched and upserted per batch')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent TMDB detail requests')
+
+    def handle(self, *args, **options):
+        tmdb_ids = list(options['ids'])
+        if options['pages']:
+            tmdb_ids += mirror.popular_ids(options['pages'])
+        if options['stale']:
+            tmdb_ids += mirror.stale_ids(options['stale_limit'])
+        tmdb_ids = list(dict.fromkeys(tmdb_ids))
+
+        batch_size = options['batch_size']
+        synced = 0
+        for start in range(0, len(tmdb_ids), batch_size):
+            payloads = mirror.fetch_details(tmdb_ids[start:start + batch_size], workers=options['workers'])
+            synced += mirror.upsert_movies(payloads)
+            self.stdout.write(f'Synced {synced}/{len(tmdb_ids)} movies')
+
+        self.stdout.write(self.style.SUCCESS(f'Mirrored {synced} of {len(tmdb_ids)} TMDB movies'))
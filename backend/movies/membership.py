@@ -0,0 +1,91 @@
+"""
+Per-user "favorited / your rating" state for decorating movie lists.
+
+Movie grids badge the movies a user has favorited or rated. Instead of the
+client paging through its favorites and ratings, list, detail and TMDB proxy
+endpoints accept ``?user_state=true`` and add ``is_favorited`` and
+``my_rating`` to every movie, looked up in the user's ``Membership``: a set
+of favorited movie ids and a movie id -> rating map, each also keyed by TMDB
+id for the proxy payloads.
+
+A membership is loaded with two queries and kept in the default Django cache
+for ``MOVIE_MEMBERSHIP_TTL`` seconds. ``FavoriteViewSet`` and
+``MovieRatingViewSet`` drop it on every write, so the next request reloads
+it. Its ``version`` (a hash of the contents) goes into ETags, so a badge
+change is never answered with 304.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from moviemeetup.conditional import make_etag
+
+from .models import Favorite, MovieRating
+
+KEY_PREFIX = 'movie-membership:v1'
+QUERY_PARAM = 'user_state'
+
+
+class Membership:
+    """Favorited movie ids and ratings of one user, by local and by TMDB id"""
+
+    def __init__(self, favorites, ratings):
+        # favorites: [(movie_id, tmdb_id)], ratings: [(movie_id, tmdb_id, rating)]
+        self.favorites = {movie_id for movie_id, _ in favorites}
+        self.ratings = {movie_id: rating for movie_id, _, rating in ratings}
+        self.tmdb_favorites = {tmdb_id for _, tmdb_id in favorites if tmdb_id is not None}
+        self.tmdb_ratings = {tmdb_id: rating for _, tmdb_id, rating in ratings if tmdb_id is not None}
+        self.version = make_etag(sorted(self.favorites), sorted(self.ratings.items()))
+
+    @classmethod
+    def load(cls, user_id):
+        favorites = Favorite.objects.filter(user_id=user_id).values_list('movie_id', 'movie__tmdb_id')
+        ratings = MovieRating.objects.filter(user_id=user_id).values_list('movie_id', 'movie__tmdb_id', 'rating')
+        return cls(list(favorites), list(ratings))
+
+    def state(self, movie_id):
+        return {'is_favorited': movie_id in self.favorites, 'my_rating': self.ratings.get(movie_id)}
+
+    def tmdb_state(self, tmdb_id):
+        return {'is_favorited': tmdb_id in self.tmdb_favorites, 'my_rating': self.tmdb_ratings.get(tmdb_id)}
+
+    def decorate_tmdb_movie(self, movie):
+        """Copy of a TMDB movie payload with the user's state added"""
+        if not isinstance(movie, dict) or 'id' not in movie:
+            return movie
+        return {**movie, **self.tmdb_state(movie['id'])}
+
+    def decorate_tmdb_page(self, page):
+        """Copy of a TMDB result page with the user's state added to every movie"""
+        return {**page, 'results': [self.decorate_tmdb_movie(movie) for movie in page.get('results', [])]}
+
+
+def cache_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def for_user(user_id):
+    key = cache_key(user_id)
+    membership = cache.get(key)
+    if membership is None:
+        membership = Membership.load(user_id)
+        cache.set(key, membership, settings.MOVIE_MEMBERSHIP_TTL)
+    return membership
+
+
+def wanted(params):
+    return params.get(QUERY_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def for_request(user, params):
+    """The membership to decorate a response with, or None when not asked for or anonymous"""
+    if not wanted(params) or user is None or not user.is_authenticated:
+        return None
+    return for_user(user.pk)
+
+
+def invalidate(user_id):
+    """Drop a user's cached membership now and again once the current transaction commits"""
+    key = cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
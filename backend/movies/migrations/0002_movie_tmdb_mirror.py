@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='popularity',
+            field=models.FloatField(blank=True, help_text='TMDB popularity score', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='tmdb_payload',
+            field=models.JSONField(blank=True, help_text='Last TMDB detail response', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='tmdb_synced_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
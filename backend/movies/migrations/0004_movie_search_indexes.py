@@ -0,0 +1,45 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# PostgreSQL-only indexes behind movies.search. They are not declared on
+# Movie.Meta because SQLite cannot create them when it rebuilds the table.
+# The vector expression must stay identical to movies.search.search_vector()
+# or the planner will not use the index.
+SEARCH_INDEXES = [
+    GinIndex(
+        SearchVector('title', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english'),
+        name='movie_search_vector_idx',
+    ),
+    GinIndex(fields=['title'], name='movie_title_trgm_idx', opclasses=['gin_trgm_ops']),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Movie, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Movie, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_movie_rating_totals'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
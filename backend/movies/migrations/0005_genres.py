@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:32
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def split_genres(apps, schema_editor):
+    """Link movies to Genre rows from their TMDB payload or comma-joined genre string"""
+    Genre = apps.get_model('movies', 'Genre')
+    Movie = apps.get_model('movies', 'Movie')
+    Link = Movie.genres.through
+
+    genres = {}  # slug -> pk
+    links = []
+    rows = Movie.objects.order_by().values_list('pk', 'genre', 'tmdb_payload')
+    for movie_pk, genre, payload in rows.iterator(chunk_size=2000):
+        if payload and payload.get('genres'):
+            pairs = [(g['name'], g.get('id')) for g in payload['genres'] if g.get('name')]
+        else:
+            pairs = [(name.strip(), None) for name in (genre or '').split(',') if name.strip()]
+        for name, tmdb_id in pairs:
+            slug = slugify(name)[:60]
+            if not slug:
+                continue
+            if slug not in genres:
+                # A TMDB id already taken by another spelling is left off
+                if tmdb_id is not None and Genre.objects.filter(tmdb_id=tmdb_id).exists():
+                    tmdb_id = None
+                genres[slug] = Genre.objects.create(name=name[:50], slug=slug, tmdb_id=tmdb_id).pk
+            links.append(Link(movie_id=movie_pk, genre_id=genres[slug]))
+        if len(links) >= 2000:
+            Link.objects.bulk_create(links, ignore_conflicts=True)
+            links = []
+    Link.objects.bulk_create(links, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_movie_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(max_length=60, unique=True)),
+                ('tmdb_id', models.IntegerField(blank=True, null=True, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='movies', to='movies.genre'),
+        ),
+        migrations.RunPython(split_genres, migrations.RunPython.noop),
+    ]
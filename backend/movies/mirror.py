@@ -0,0 +1,181 @@
+"""
+Local mirror of TMDB movies in the ``Movie`` table.
+
+Movies are ingested from TMDB (popular pages from the ``sync_tmdb_movies``
+command, single movies on demand from the detail proxy) and bulk-upserted by
+``tmdb_id``, together with their genre links. Each row keeps the full TMDB detail payload plus the time it was
+synced, so the detail and search proxies can answer from the database while
+the copy is younger than ``TMDB_MIRROR_MAX_AGE`` and only fall back to TMDB
+when it is missing or stale. Movies created locally (no ``tmdb_synced_at``)
+are never overwritten by the mirror, even when they carry a ``tmdb_id``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .filters import TMDB_FILTER_PARAMS, get_content_filter
+from .genres import genres_from_tmdb, set_movie_genres
+from .models import Movie
+from .search import search_movies
+from .tmdb import get_client
+
+
+DETAIL_PARAMS = {'language': 'en-US', 'append_to_response': 'credits'}
+
+# Fields refreshed when an already mirrored movie is ingested again
+SYNCED_FIELDS = [
+    'title', 'description', 'release_date', 'poster_url', 'backdrop_url', 'genre',
+    'duration', 'rating', 'popularity', 'tmdb_payload', 'tmdb_synced_at', 'updated_at',
+]
+
+# Keys of a TMDB search result, rebuilt from a stored detail payload
+SEARCH_RESULT_KEYS = [
+    'id', 'title', 'original_title', 'original_language', 'overview', 'release_date',
+    'poster_path', 'backdrop_path', 'vote_average', 'vote_count', 'popularity', 'adult', 'video',
+]
+
+
+def image_url(path, size):
+    return f"{settings.TMDB_IMAGE_BASE_URL}/{size}{path}" if path else ''
+
+
+def movie_from_tmdb(data, synced_at=None):
+    """Build an unsaved ``Movie`` from a TMDB detail payload"""
+    release_date = date.today()
+    if data.get('release_date'):
+        try:
+            release_date = datetime.strptime(data['release_date'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+
+    rating = data.get('vote_average')
+    return Movie(
+        tmdb_id=data['id'],
+        title=(data.get('title') or 'Unknown')[:200],
+        description=data.get('overview') or 'No description available',
+        release_date=release_date,
+        poster_url=image_url(data.get('poster_path'), 'w500'),
+        backdrop_url=image_url(data.get('backdrop_path'), 'original'),
+        genre=', '.join(g['name'] for g in data.get('genres', []))[:100],
+        duration=data.get('runtime') or None,
+        rating=Decimal(str(round(rating, 1))) if rating is not None else None,
+        popularity=data.get('popularity'),
+        tmdb_payload=data,
+        tmdb_synced_at=synced_at or timezone.now(),
+    )
+
+
+def upsert_movies(payloads, batch_size=500):
+    """Insert or refresh movies from TMDB detail payloads, ``batch_size`` rows per statement.
+
+    Only rows the mirror created (``tmdb_synced_at`` set) are refreshed; a
+    movie added locally with the same ``tmdb_id`` keeps its own fields.
+    """
+    synced_at = timezone.now()
+    movies = {}
+    for data in payloads:
+        if data and data.get('id'):
+            movies[data['id']] = movie_from_tmdb(data, synced_at)
+    with transaction.atomic():
+        local = Movie.objects.filter(tmdb_id__in=list(movies), tmdb_synced_at__isnull=True)
+        for tmdb_id in local.values_list('tmdb_id', flat=True):
+            del movies[tmdb_id]
+        Movie.objects.bulk_create(
+            list(movies.values()),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['tmdb_id'],
+            update_fields=SYNCED_FIELDS,
+        )
+        # bulk_create doesn't return primary keys for upserted rows on every backend
+        pks = dict(Movie.objects.filter(tmdb_id__in=list(movies)).values_list('tmdb_id', 'pk'))
+        set_movie_genres({pks[tmdb_id]: genres_from_tmdb(movie.tmdb_payload) for tmdb_id, movie in movies.items()})
+    return len(movies)
+
+
+def ingest_movie(tmdb_id, data=None):
+    """Mirror one movie (fetching its details unless ``data`` is given) and return it"""
+    if data is None:
+        data = get_client().get(f'movie/{tmdb_id}', DETAIL_PARAMS, endpoint='movie')
+    upsert_movies([data])
+    return Movie.objects.get(tmdb_id=data['id'])
+
+
+def fetch_details(tmdb_ids, workers=8):
+    """Fetch TMDB details for many ids concurrently; ids that fail are skipped"""
+    def fetch(tmdb_id):
+        try:
+            return get_client().get(f'movie/{tmdb_id}', DETAIL_PARAMS, endpoint='movie')
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [data for data in pool.map(fetch, tmdb_ids) if data]
+
+
+def popular_ids(pages):
+    """TMDB ids on the first ``pages`` pages of popular movies"""
+    ids = []
+    for page in range(1, pages + 1):
+        params = {'language': 'en-US', 'page': page, **TMDB_FILTER_PARAMS}
+        data = get_client().get('movie/popular', params, endpoint='popular')
+        ids.extend(movie['id'] for movie in data.get('results', []))
+    return ids
+
+
+def stale_ids(limit=None):
+    """TMDB ids of mirrored movies whose copy is older than ``TMDB_MIRROR_MAX_AGE``"""
+    cutoff = timezone.now() - timedelta(seconds=settings.TMDB_MIRROR_MAX_AGE)
+    queryset = Movie.objects.filter(tmdb_id__isnull=False, tmdb_synced_at__lt=cutoff)
+    ids = queryset.order_by('tmdb_synced_at').values_list('tmdb_id', flat=True)
+    return list(ids[:limit] if limit else ids)
+
+
+def fresh_queryset():
+    cutoff = timezone.now() - timedelta(seconds=settings.TMDB_MIRROR_MAX_AGE)
+    return Movie.objects.filter(tmdb_payload__isnull=False, tmdb_synced_at__gte=cutoff)
+
+
+def get_fresh_details(tmdb_id):
+    """The mirrored TMDB detail payload for ``tmdb_id``, or None if missing or stale"""
+    if not settings.TMDB_MIRROR_ENABLED:
+        return None
+    return fresh_queryset().filter(tmdb_id=tmdb_id).values_list('tmdb_payload', flat=True).first()
+
+
+def get_fresh_details_many(tmdb_ids):
+    """Mirrored detail payloads for the fresh ones among ``tmdb_ids``, keyed by TMDB id"""
+    if not settings.TMDB_MIRROR_ENABLED:
+        return {}
+    return dict(fresh_queryset().filter(tmdb_id__in=tmdb_ids).values_list('tmdb_id', 'tmdb_payload'))
+
+
+def search_result(payload):
+    result = {key: payload.get(key) for key in SEARCH_RESULT_KEYS}
+    result['genre_ids'] = [genre['id'] for genre in payload.get('genres', [])]
+    return result
+
+
+def search_fresh(query):
+    """A TMDB-shaped search page from the mirror, or None if it can't fill a page.
+
+    The mirror only holds part of the catalog, so local results are used only
+    when at least ``TMDB_MIRROR_SEARCH_MIN_RESULTS`` fresh movies match. Movies
+    the TMDB proxies filter out (``TMDB_FILTER_PARAMS``) are left out here too.
+    """
+    if not settings.TMDB_MIRROR_ENABLED:
+        return None
+    page_size = settings.TMDB_MIRROR_SEARCH_MIN_RESULTS
+    queryset = fresh_queryset().filter(
+        tmdb_payload__original_language=TMDB_FILTER_PARAMS['with_original_language'],
+    ).exclude(tmdb_payload__adult=True)
+    queryset = search_movies(get_content_filter().filter_queryset(queryset), query)
+    payloads = list(queryset.values_list('tmdb_payload', flat=True)[:page_size])
+    if len(payloads) < page_size:
+        return None
+    page = get_content_filter().filter_page({'results': [search_result(payload) for payload in payloads]})
+    return {'page': 1, 'results': page['results'], 'total_pages': 1, 'total_results': len(page['results'])}
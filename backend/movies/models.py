@@ -1,8 +1,25 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, NullIf
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+class Genre(models.Model):
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60, unique=True)
+    tmdb_id = models.IntegerField(unique=True, null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class Movie(models.Model):
     tmdb_id = models.IntegerField(unique=True, null=True, blank=True)
     title = models.CharField(max_length=200)
@@ -10,25 +27,63 @@ class Movie(models.Model):
     release_date = models.DateField()
     poster_url = models.URLField(max_length=500, blank=True)
     backdrop_url = models.URLField(max_length=500, blank=True)
+    # Comma-joined genre names for display; filter on ``genres`` (see movies.genres)
     genre = models.CharField(max_length=100, blank=True)
+    genres = models.ManyToManyField(Genre, related_name='movies', blank=True)
     duration = models.IntegerField(help_text="Duration in minutes", null=True, blank=True)
     rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
+    popularity = models.FloatField(null=True, blank=True, help_text="TMDB popularity score")
+    tmdb_payload = models.JSONField(null=True, blank=True, help_text="Last TMDB detail response")
+    tmdb_synced_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Totals of movie_ratings, kept up to date by the MovieRating signal receivers below; bulk
+    # writes skip those, so run rebuild_movie_ratings after them
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-release_date']
+        indexes = [
+            # Keyset pagination of /api/movies/
+            models.Index(fields=['-release_date', '-id'], name='movie_release_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     @property
     def average_user_rating(self):
-        ratings = self.movie_ratings.all()
-        if ratings:
-            return sum(r.rating for r in ratings) / len(ratings)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return None
 
+    @staticmethod
+    def adjust_rating_totals(movie_id, sum_delta, count_delta):
+        """Apply a rating change to the stored totals in one atomic UPDATE"""
+        Movie.objects.filter(pk=movie_id).update(
+            rating_sum=F('rating_sum') + sum_delta,
+            rating_count=F('rating_count') + count_delta,
+        )
+
+
+def user_rating_expression():
+    """SQL expression for the average user rating (NULL when unrated)"""
+    return Cast('rating_sum', models.FloatField()) / NullIf('rating_count', 0)
+
+
+@receiver(post_save, sender=Movie)
+def index_movie_title(sender, instance, **kwargs):
+    from .typeahead import title_index
+    transaction.on_commit(lambda: title_index.update(instance))
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_movie_title(sender, instance, **kwargs):
+    from .typeahead import title_index
+    pk = instance.pk
+    transaction.on_commit(lambda: title_index.discard(pk))
+
 
 class MovieRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='movie_ratings')
@@ -41,11 +96,65 @@ class MovieRating(models.Model):
     class Meta:
         unique_together = ['user', 'movie']
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of /api/movies/ratings/, optionally filtered by movie
+            models.Index(fields=['-created_at', '-id'], name='rating_created_id_idx'),
+            models.Index(fields=['movie', '-created_at', '-id'], name='rating_movie_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.movie.title} ({self.rating}/5)"
 
 
+@receiver(pre_save, sender=MovieRating)
+def remember_rated_movie(sender, instance, raw=False, **kwargs):
+    """Keep the stored movie and score of a rating being updated, for update_rating_totals"""
+    instance._previous_rating = None
+    if not raw and not instance._state.adding:
+        instance._previous_rating = (
+            MovieRating.objects.filter(pk=instance.pk).values_list('movie_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=MovieRating)
+def update_rating_totals(sender, instance, created, raw=False, **kwargs):
+    # Fixtures carry their own totals
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        Movie.adjust_rating_totals(instance.movie_id, instance.rating, 1)
+        return
+    old_movie_id, old_rating = previous
+    if old_movie_id != instance.movie_id:
+        from . import rating_stats
+        Movie.adjust_rating_totals(old_movie_id, -old_rating, -1)
+        Movie.adjust_rating_totals(instance.movie_id, instance.rating, 1)
+        # The rating left that movie too
+        Movie.objects.filter(pk=old_movie_id).update(updated_at=timezone.now())
+        rating_stats.invalidate(old_movie_id)
+    elif old_rating != instance.rating:
+        Movie.adjust_rating_totals(instance.movie_id, instance.rating - old_rating, 0)
+
+
+@receiver(post_delete, sender=MovieRating)
+def remove_from_rating_totals(sender, instance, **kwargs):
+    # Also runs for ratings deleted by a cascade, e.g. when their user is deleted
+    Movie.adjust_rating_totals(instance.movie_id, -instance.rating, -1)
+
+
+@receiver([post_save, post_delete], sender=MovieRating)
+def touch_movie(sender, instance, **kwargs):
+    """Ratings are rendered inside their movie, so they count as changing it"""
+    Movie.objects.filter(pk=instance.movie_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=MovieRating)
+def invalidate_rating_stats(sender, instance, **kwargs):
+    from . import rating_stats
+    rating_stats.invalidate(instance.movie_id)
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='favorited_by')
@@ -57,3 +166,35 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.movie.title}"
+
+
+class MovieSimilarity(models.Model):
+    """A precomputed "people who liked this also liked" neighbor (see movies.recommendations)"""
+    # Looked up through the (movie, -score) index, so no separate index on movie
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similarities', db_index=False)
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['movie', '-score']
+        indexes = [
+            models.Index(fields=['movie', '-score'], name='similarity_movie_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} -> {self.similar_id} ({self.score:.3f})"
+
+
+class RecommendationBuild(models.Model):
+    """One run of rebuild_movie_similarities; incremental runs start from the last one"""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    full = models.BooleanField()
+    movies = models.PositiveIntegerField(help_text="Movies whose neighbors were recomputed")
+    rows = models.PositiveIntegerField(help_text="Neighbor rows written")
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{'Full' if self.full else 'Incremental'} build at {self.started_at:%Y-%m-%d %H:%M}"
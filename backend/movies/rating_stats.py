@@ -0,0 +1,79 @@
+"""
+Rating breakdowns (1-5 star histogram, count, mean, recent reviews) per movie.
+
+All requested movies are aggregated in one grouped query over
+``MovieRating``, one row per movie, and each result is kept in the default
+Django cache for ``MOVIE_RATING_STATS_TTL`` seconds. Saving or deleting a
+rating drops its movie's entry, both right away and again once the
+transaction commits, so a read racing the write can't cache the old numbers.
+With a per-process cache (the default locmem) other workers only see a
+change once their entry expires.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import MovieRating
+
+KEY_PREFIX = 'movie-rating-stats:v1'
+STARS = range(1, 6)
+
+
+def cache_key(movie_id):
+    return f'{KEY_PREFIX}:{movie_id}'
+
+
+def empty_stats(movie_id):
+    return {
+        'movie_id': movie_id, 'count': 0, 'mean': None,
+        'histogram': {str(stars): 0 for stars in STARS}, 'recent_reviews': 0,
+    }
+
+
+def aggregate(movie_ids):
+    """{movie_id: stats} for every id in ``movie_ids``, from one GROUP BY query"""
+    since = timezone.now() - timedelta(days=settings.MOVIE_RATING_STATS_RECENT_DAYS)
+    rows = (
+        MovieRating.objects.filter(movie_id__in=movie_ids)
+        .order_by()
+        .values('movie_id')
+        .annotate(
+            count=Count('pk'),
+            total=Sum('rating'),
+            recent_reviews=Count('pk', filter=Q(created_at__gte=since) & ~Q(review='')),
+            **{f'stars_{stars}': Count('pk', filter=Q(rating=stars)) for stars in STARS},
+        )
+    )
+    stats = {movie_id: empty_stats(movie_id) for movie_id in movie_ids}
+    for row in rows:
+        stats[row['movie_id']].update(
+            count=row['count'],
+            mean=round(row['total'] / row['count'], 2),
+            histogram={str(stars): row[f'stars_{stars}'] for stars in STARS},
+            recent_reviews=row['recent_reviews'],
+        )
+    return stats
+
+
+def get_many(movie_ids):
+    """{movie_id: stats} for ``movie_ids``, aggregating only the ones not cached"""
+    cached = cache.get_many([cache_key(movie_id) for movie_id in movie_ids])
+    stats = {movie_id: cached[cache_key(movie_id)] for movie_id in movie_ids if cache_key(movie_id) in cached}
+    missing = [movie_id for movie_id in movie_ids if movie_id not in stats]
+    if missing:
+        fresh = aggregate(missing)
+        cache.set_many({cache_key(movie_id): value for movie_id, value in fresh.items()},
+                       settings.MOVIE_RATING_STATS_TTL)
+        stats.update(fresh)
+    return stats
+
+
+def invalidate(movie_id):
+    """Drop a movie's cached stats now and again once the current transaction commits"""
+    key = cache_key(movie_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,179 @@
+"""
+Item-to-item recommendations from local ratings and favorites.
+
+Every ``MovieRating`` and ``Favorite`` becomes one cell of a sparse
+users x movies matrix holding how much the user liked the movie: ratings of
+4 and 5 count 0.5 and 1, lower ratings nothing, and a favorite adds 1. Two
+movies are similar when the same users liked them. The score is the cosine
+similarity of their columns, shrunk towards zero when few users liked both:
+``cos * n / (n + shrinkage)``.
+
+Similarities are computed with SciPy sparse products over blocks of columns,
+so memory stays bounded by ``chunk_size`` rows of the movie x movie matrix,
+never the whole thing. Only each movie's top ``neighbors`` are kept, in the
+``MovieSimilarity`` table, and the similar-movies endpoint reads them with a
+single lookup on its ``(movie, -score)`` index.
+
+A full build recomputes every movie. An incremental build recomputes only the
+movies rated or favorited since the last build, then merges their new scores
+into the neighbor lists of the movies they are similar to. A movie that drops
+out of a list is only replaced by the next best one on the next full build.
+Deleted ratings and favorites are also only picked up by full builds.
+"""
+from array import array
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Favorite, MovieRating, MovieSimilarity, RecommendationBuild
+
+NEIGHBORS = 20
+MIN_SUPPORT = 2
+SHRINKAGE = 10.0
+CHUNK_SIZE = 500
+WRITE_BATCH_SIZE = 5000
+
+
+def rating_weight(rating):
+    """How much a star rating says the user liked the movie (0 for 3 stars or fewer)"""
+    return max(rating - 3, 0) / 2
+
+
+def interaction_matrix():
+    """CSR users x movies matrix of likes and the movie id of each column"""
+    users, movies, weights = array('q'), array('q'), array('f')
+    ratings = MovieRating.objects.filter(rating__gt=3).values_list('user_id', 'movie_id', 'rating')
+    for user_id, movie_id, rating in ratings.iterator(chunk_size=10000):
+        users.append(user_id)
+        movies.append(movie_id)
+        weights.append(rating_weight(rating))
+    for user_id, movie_id in Favorite.objects.values_list('user_id', 'movie_id').iterator(chunk_size=10000):
+        users.append(user_id)
+        movies.append(movie_id)
+        weights.append(1.0)
+
+    user_ids, rows = np.unique(np.asarray(users, dtype=np.int64), return_inverse=True)
+    movie_ids, columns = np.unique(np.asarray(movies, dtype=np.int64), return_inverse=True)
+    # Duplicate cells (a rating and a favorite) are summed
+    matrix = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (rows, columns)),
+        shape=(len(user_ids), len(movie_ids)),
+    )
+    return matrix, movie_ids
+
+
+def similarity_rows(matrix, columns, min_support=MIN_SUPPORT, shrinkage=SHRINKAGE, chunk_size=CHUNK_SIZE):
+    """Yield ``(column, neighbor_columns, scores)`` for every column in ``columns``, best first"""
+    if not len(columns):
+        return
+    matrix = matrix.tocsc()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    liked = matrix.copy()
+    liked.data[:] = 1
+
+    for start in range(0, len(columns), chunk_size):
+        block = columns[start:start + chunk_size]
+        # Every cell is positive, so both products share one sparsity pattern
+        cosine = (normalized[:, block].T @ normalized).tocsr()
+        support = (liked[:, block].T @ liked).tocsr()
+        cosine.sort_indices()
+        support.sort_indices()
+        for row, column in enumerate(block):
+            lo, hi = cosine.indptr[row], cosine.indptr[row + 1]
+            neighbors = cosine.indices[lo:hi]
+            counts = support.data[lo:hi]
+            keep = (neighbors != column) & (counts >= min_support)
+            neighbors, counts = neighbors[keep], counts[keep]
+            scores = cosine.data[lo:hi][keep] * counts / (counts + shrinkage)
+            order = np.argsort(-scores, kind='stable')
+            yield column, neighbors[order], scores[order]
+
+
+def rebuild_similarities(full=False, neighbors=NEIGHBORS, min_support=MIN_SUPPORT, shrinkage=SHRINKAGE,
+                         chunk_size=CHUNK_SIZE):
+    """Recompute ``MovieSimilarity`` and return the ``RecommendationBuild`` recording it"""
+    started_at = timezone.now()
+    previous = RecommendationBuild.objects.first()
+    full = full or previous is None
+    matrix, movie_ids = interaction_matrix()
+
+    if full:
+        columns = np.arange(len(movie_ids))
+    else:
+        changed = changed_movie_ids(previous.started_at)
+        columns = np.flatnonzero(np.isin(movie_ids, np.array(sorted(changed), dtype=np.int64)))
+
+    rows = similarity_rows(matrix, columns, min_support, shrinkage, chunk_size)
+    with transaction.atomic():
+        if full:
+            written = _write_full(rows, movie_ids, neighbors)
+        else:
+            written = _write_incremental(rows, movie_ids, neighbors, changed)
+        return RecommendationBuild.objects.create(
+            started_at=started_at, finished_at=timezone.now(), full=full, movies=len(columns), rows=written,
+        )
+
+
+def changed_movie_ids(since):
+    """Movies rated, re-rated or favorited since ``since``"""
+    rated = MovieRating.objects.filter(updated_at__gte=since).values_list('movie_id', flat=True)
+    favorited = Favorite.objects.filter(created_at__gte=since).values_list('movie_id', flat=True)
+    return set(rated.distinct()) | set(favorited.distinct())
+
+
+def _write_full(rows, movie_ids, count):
+    MovieSimilarity.objects.all().delete()
+    batch, written = [], 0
+    for column, neighbors, scores in rows:
+        movie_id = int(movie_ids[column])
+        batch.extend(
+            MovieSimilarity(movie_id=movie_id, similar_id=int(movie_ids[neighbor]), score=float(score))
+            for neighbor, score in zip(neighbors[:count], scores[:count])
+        )
+        if len(batch) >= WRITE_BATCH_SIZE:
+            written += len(MovieSimilarity.objects.bulk_create(batch))
+            batch = []
+    return written + len(MovieSimilarity.objects.bulk_create(batch))
+
+
+def _write_incremental(rows, movie_ids, count, changed):
+    """Rewrite the lists of ``changed`` movies and merge their new scores into every other list"""
+    lists = {movie_id: {} for movie_id in changed}  # movie id -> {similar id: score} to write
+    candidates = {}  # other movie id -> {changed movie id: new score}
+    for column, neighbors, scores in rows:
+        movie_id = int(movie_ids[column])
+        lists[movie_id] = {int(movie_ids[n]): float(s) for n, s in zip(neighbors[:count], scores[:count])}
+        # Similarity is symmetric, so this movie may now enter every neighbor's list
+        for neighbor, score in zip(neighbors, scores):
+            candidates.setdefault(int(movie_ids[neighbor]), {})[movie_id] = float(score)
+
+    # Other lists that gain, rescore or lose a changed movie
+    affected = set(candidates)
+    for ids in _chunks(list(changed)):
+        affected.update(MovieSimilarity.objects.filter(similar_id__in=ids).values_list('movie_id', flat=True))
+    affected -= changed
+    for ids in _chunks(list(affected)):
+        existing = MovieSimilarity.objects.filter(movie_id__in=ids).values_list('movie_id', 'similar_id', 'score')
+        for movie_id, similar_id, score in existing:
+            if similar_id not in changed:
+                lists.setdefault(movie_id, {})[similar_id] = score
+    for movie_id in affected:
+        lists.setdefault(movie_id, {}).update(candidates.get(movie_id, {}))
+
+    for ids in _chunks(list(lists)):
+        MovieSimilarity.objects.filter(movie_id__in=ids).delete()
+    batch = [
+        MovieSimilarity(movie_id=movie_id, similar_id=similar_id, score=score)
+        for movie_id, scores in lists.items()
+        for similar_id, score in sorted(scores.items(), key=lambda item: -item[1])[:count]
+    ]
+    return len(MovieSimilarity.objects.bulk_create(batch, batch_size=WRITE_BATCH_SIZE))
+
+
+def _chunks(ids, size=1000):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
@@ -0,0 +1,239 @@
+"""
+Outbound protection for TMDB calls: a token-bucket rate limiter and a
+circuit breaker.
+
+The limiter keeps this service inside TMDB's request quota. ``TokenBucket``
+budgets one process; ``SharedTokenBucket`` keeps a per-second counter in the
+``tmdb`` Django cache so every worker pointed at the same Redis shares one
+budget. A caller waits at most ``max_wait`` seconds for a token and is
+rejected after that.
+
+The breaker stops us from hammering TMDB while it is failing: after
+``failure_threshold`` consecutive failures (connection errors, timeouts,
+429/5xx) it opens and calls fail fast for ``recovery_timeout`` seconds, then a
+single trial call decides whether it closes again. The response cache keeps
+serving stale entries in the meantime.
+"""
+import asyncio
+import threading
+import time
+
+from django.core.cache import caches
+
+
+class TokenBucket:
+    """Process-local token bucket refilling ``rate`` tokens per second up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None, max_wait=1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.max_wait = max_wait
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _reserve(self):
+        """Take a token, possibly from the future; return seconds to wait or None if too long"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > self.max_wait:
+                self.rejected += 1
+                return None
+            self._tokens -= 1
+            self.granted += 1
+            if wait:
+                self.throttled += 1
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait is None:
+            return False
+        if wait:
+            await asyncio.sleep(wait)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': 'local',
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'available_tokens': round(self._tokens, 2),
+                'granted': self.granted,
+                'throttled': self.throttled,
+                'rejected': self.rejected,
+            }
+
+
+class SharedTokenBucket:
+    """Budget of ``rate`` calls per one-second window, shared through a Django cache"""
+
+    def __init__(self, rate, max_wait=1.0, cache_alias='tmdb', key='tmdb:ratelimit'):
+        self.rate = int(rate)
+        self.max_wait = max_wait
+        self.cache_alias = cache_alias
+        self.key = key
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _window_key(self, now):
+        return f'{self.key}:{int(now)}'
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def acquire(self):
+        deadline = time.time() + self.max_wait
+        waited = False
+        while True:
+            now = time.time()
+            key = self._window_key(now)
+            self.cache.add(key, 0, timeout=2)
+            if self.cache.incr(key) <= self.rate:
+                self._count('granted')
+                if waited:
+                    self._count('throttled')
+                return True
+            next_window = int(now) + 1
+            if next_window > deadline:
+                self._count('rejected')
+                return False
+            waited = True
+            time.sleep(next_window - now)
+
+    async def aacquire(self):
+        deadline = time.time() + self.max_wait
+        waited = False
+        while True:
+            now = time.time()
+            key = self._window_key(now)
+            await self.cache.aadd(key, 0, timeout=2)
+            if await self.cache.aincr(key) <= self.rate:
+                self._count('granted')
+                if waited:
+                    self._count('throttled')
+                return True
+            next_window = int(now) + 1
+            if next_window > deadline:
+                self._count('rejected')
+                return False
+            waited = True
+            await asyncio.sleep(next_window - now)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': 'shared',
+                'rate_per_second': self.rate,
+                'used_this_second': self.cache.get(self._window_key(time.time()), 0),
+                'granted': self.granted,
+                'throttled': self.throttled,
+                'rejected': self.rejected,
+            }
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self):
+        """True if a call may go out now; half-open lets a single trial call through"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give back a permission from ``allow()`` that didn't lead to a call"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)), 2)
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_in_seconds': retry_in,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+            }
@@ -0,0 +1,70 @@
+"""
+Ranked search over the local ``Movie`` table.
+
+On PostgreSQL a movie matches when its weighted title + description
+tsvector matches the query (``websearch_to_tsquery``, English stemming) or
+when its title is word-similar to the query (``pg_trgm``'s ``<%`` operator,
+for typos; tune with ``pg_trgm.word_similarity_threshold``). Both
+conditions are served by GIN indexes created in migration 0004, and rows
+are ranked by ``ts_rank`` plus trigram word similarity.
+
+Other databases (SQLite in local development) fall back to requiring every
+query word in the title or description and ranking exact, prefix and
+substring title matches above description-only ones. There is no typo
+tolerance there.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+SEARCH_CONFIG = 'english'
+
+
+def search_vector():
+    """The tsvector searched; migration 0004 indexes exactly this expression"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def search_movies(queryset, query):
+    """``queryset`` narrowed to movies matching ``query``, best matches first"""
+    query = ' '.join(query.split())
+    if not query:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, query)
+    return _fallback_search(queryset, query)
+
+
+def _postgres_search(queryset, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset
+        .alias(
+            search=search_vector(),
+            similarity=TrigramWordSimilarity(query, 'title'),
+        )
+        .filter(Q(search=search_query) | Q(title__trigram_word_similar=query))
+        .annotate(search_rank=SearchRank(F('search'), search_query) + F('similarity'))
+        .order_by(F('search_rank').desc(), F('popularity').desc(nulls_last=True), 'pk')
+    )
+
+
+def _fallback_search(queryset, query):
+    words = query.split()
+    for word in words:
+        queryset = queryset.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    return (
+        queryset
+        .annotate(search_rank=Case(
+            When(title__iexact=query, then=Value(4)),
+            When(title__istartswith=query, then=Value(3)),
+            When(title__icontains=query, then=Value(2)),
+            When(Q(*[Q(title__icontains=word) for word in words]), then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        .order_by(F('search_rank').desc(), F('popularity').desc(nulls_last=True), 'pk')
+    )
@@ -1,15 +1,42 @@
 from rest_framework import serializers
+from .genres import genres_from_string, set_movie_genres
 from .models import Movie, MovieRating, Favorite
 from accounts.serializers import UserSerializer
 
 
-class MovieSerializer(serializers.ModelSerializer):
+class UserStateMixin:
+    """Adds ``is_favorited`` / ``my_rating`` when the view passes a ``membership`` in the context"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        membership = self.context.get('membership')
+        if membership is not None:
+            data.update(membership.state(instance.pk))
+        return data
+
+
+class MovieSerializer(UserStateMixin, serializers.ModelSerializer):
     average_user_rating = serializers.ReadOnlyField()
+    genres = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
 
     class Meta:
         model = Movie
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
+        # The TMDB mirror columns are maintained by movies.mirror only: the raw payload stays out of
+        # responses, and clients must not be able to rewrite what the TMDB proxies serve
+        exclude = ['tmdb_payload']
+        read_only_fields = ['rating_sum', 'rating_count', 'tmdb_synced_at', 'popularity', 'created_at', 'updated_at']
+
+    # Genres are written as the comma-joined ``genre`` string and linked from it
+    def create(self, validated_data):
+        movie = super().create(validated_data)
+        set_movie_genres({movie.pk: genres_from_string(movie.genre)})
+        return movie
+
+    def update(self, instance, validated_data):
+        movie = super().update(instance, validated_data)
+        if 'genre' in validated_data:
+            set_movie_genres({movie.pk: genres_from_string(movie.genre)})
+        return movie
 
 
 class MovieRatingSerializer(serializers.ModelSerializer):
@@ -25,7 +52,7 @@ class MovieRatingSerializer(serializers.ModelSerializer):
 class MovieRatingCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MovieRating
-        fields = ['movie', 'rating', 'review']
+        fields = ['id', 'movie', 'rating', 'review']
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -38,14 +65,28 @@ class FavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class MovieDetailSerializer(serializers.ModelSerializer):
+class FavoriteCompactSerializer(serializers.ModelSerializer):
+    """Just enough of the movie to render a favorites list, without the user or ratings"""
+    tmdb_id = serializers.IntegerField(source='movie.tmdb_id', read_only=True)
+    title = serializers.CharField(source='movie.title', read_only=True)
+    poster_url = serializers.CharField(source='movie.poster_url', read_only=True)
+    release_date = serializers.DateField(source='movie.release_date', read_only=True)
+
+    class Meta:
+        model = Favorite
+        fields = ['movie_id', 'tmdb_id', 'title', 'poster_url', 'release_date', 'created_at']
+
+
+class MovieDetailSerializer(UserStateMixin, serializers.ModelSerializer):
     average_user_rating = serializers.ReadOnlyField()
+    genres = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
     ratings = MovieRatingSerializer(source='movie_ratings', many=True, read_only=True)
     ratings_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = ['tmdb_payload']
+        read_only_fields = ['rating_sum', 'rating_count', 'tmdb_synced_at', 'popularity']
 
     def get_ratings_count(self, obj):
-        return obj.movie_ratings.count()
+        return obj.rating_count
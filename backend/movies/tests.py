@@ -1,9 +1,41 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Movie, MovieRating, Favorite
-from datetime import date
+from rest_framework.pagination import PageNumberPagination
+from .genres import genres_from_string, set_movie_genres
+from .models import Genre, Movie, MovieRating, MovieSimilarity, Favorite
+from . import async_views, mirror
+from .cache import tmdb_cache
+from .filters import ContentFilter
+from .fake_tmdb import FakeTMDB
+from .typeahead import title_index
+from .resilience import CircuitBreaker, SharedTokenBucket, TokenBucket
+from .tmdb import (
+    AsyncTMDBClient, AsyncTMDBUnavailable, TMDBClient, TMDBUnavailable,
+    get_breaker, get_client, get_rate_limiter, reset_client,
+)
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from importlib import import_module
+from importlib.util import find_spec, module_from_spec, spec_from_file_location
+from io import StringIO
+from unittest import mock, skipUnless
+import httpx
+import json
+import requests
+import shutil
+import tempfile
+import threading
+import time
 
 
 class MovieModelTest(TestCase):
@@ -72,3 +104,1306 @@ class MovieAPITest(TestCase):
         }
         response = self.client.post('/api/movies/ratings/', data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TMDBClientTest(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+        self.client_ = TMDBClient(base_url='https://tmdb.test/3', api_key='key',
+                                  connect_timeout=1, read_timeout=2, max_retries=0,
+                                  rate_limiter=TokenBucket(1000), breaker=self.breaker)
+
+    def test_get_uses_pooled_session_with_timeouts(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'id': 603}
+        with mock.patch.object(self.client_.session, 'get', return_value=response) as session_get:
+            data = self.client_.get('movie/603', {'language': 'en-US'}, endpoint='movie')
+
+        self.assertEqual(data, {'id': 603})
+        session_get.assert_called_once_with(
+            'https://tmdb.test/3/movie/603',
+            params={'api_key': 'key', 'language': 'en-US'},
+            timeout=(1, 2),
+        )
+        self.assertEqual(self.client_.stats()['movie']['calls'], 1)
+        self.assertEqual(self.client_.stats()['movie']['errors'], 0)
+
+    def test_failed_call_is_recorded_as_error(self):
+        with mock.patch.object(self.client_.session, 'get', side_effect=requests.Timeout('slow')):
+            with self.assertRaises(requests.RequestException):
+                self.client_.get('movie/popular', endpoint='popular')
+        self.assertEqual(self.client_.stats()['popular']['errors'], 1)
+
+    def test_shared_client_gets_the_process_wide_limiter_and_breaker(self):
+        reset_client()
+        self.addCleanup(reset_client)
+        client = get_client()
+        self.assertIs(client.rate_limiter, get_rate_limiter())
+        self.assertIs(client.breaker, get_breaker())
+
+    def test_breaker_opens_after_repeated_failures_and_fails_fast(self):
+        with mock.patch.object(self.client_.session, 'get', side_effect=requests.ConnectionError('down')) as session_get:
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    self.client_.get('movie/popular')
+            with self.assertRaises(TMDBUnavailable):
+                self.client_.get('movie/popular')
+        self.assertEqual(session_get.call_count, 2)
+        self.assertEqual(self.breaker.stats()['state'], 'open')
+
+    def test_half_open_trial_ending_in_other_errors_does_not_wedge_the_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.recovery_timeout = 0
+        # A connection dropped mid-body counts as a failure and re-opens the breaker
+        with mock.patch.object(self.client_.session, 'get',
+                               side_effect=requests.exceptions.ChunkedEncodingError('broken')):
+            with self.assertRaises(requests.RequestException):
+                self.client_.get('movie/603')
+        self.assertEqual(self.breaker.stats()['times_opened'], 2)
+
+        # An error that says nothing about TMDB gives the trial back
+        with mock.patch.object(self.client_.session, 'get', side_effect=ValueError('bad params')):
+            with self.assertRaises(ValueError):
+                self.client_.get('movie/603')
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'id': 603}
+        with mock.patch.object(self.client_.session, 'get', return_value=response):
+            self.assertEqual(self.client_.get('movie/603'), {'id': 603})
+        self.assertEqual(self.breaker.state, 'closed')
+
+        # A 2xx with an undecodable body still closed the breaker
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        response.json.side_effect = ValueError('not JSON')
+        with mock.patch.object(self.client_.session, 'get', return_value=response):
+            with self.assertRaises(ValueError):
+                self.client_.get('movie/603')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_not_found_does_not_trip_the_breaker(self):
+        response = mock.Mock(status_code=404)
+        response.raise_for_status.side_effect = requests.HTTPError('404')
+        with mock.patch.object(self.client_.session, 'get', return_value=response):
+            for _ in range(3):
+                with self.assertRaises(requests.HTTPError):
+                    self.client_.get('movie/0')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_every_attempt_takes_a_token_and_reports_to_the_breaker(self):
+        bucket = TokenBucket(1000)
+        breaker = CircuitBreaker(failure_threshold=5)
+        client = TMDBClient(base_url='https://tmdb.test/3', api_key='key', max_retries=2, backoff_factor=0,
+                            max_retry_wait=1, rate_limiter=bucket, breaker=breaker)
+        response = mock.Mock(status_code=503, headers={'Retry-After': '3600'})
+        response.raise_for_status.side_effect = requests.HTTPError('503')
+        with mock.patch.object(client.session, 'get', return_value=response) as session_get, \
+                mock.patch('movies.tmdb.time.sleep') as sleep:
+            with self.assertRaises(requests.HTTPError):
+                client.get('movie/603')
+        self.assertEqual(session_get.call_count, 3)
+        self.assertEqual(bucket.stats()['granted'], 3)
+        self.assertEqual(breaker.stats()['failures'], 3)
+        # Retry-After is honoured only up to max_retry_wait
+        self.assertEqual(sleep.call_args_list, [mock.call(1), mock.call(1)])
+
+        # A 429 is not retried; it counts against TMDB once
+        response = mock.Mock(status_code=429, headers={'Retry-After': '10'})
+        response.raise_for_status.side_effect = requests.HTTPError('429')
+        with mock.patch.object(client.session, 'get', return_value=response) as session_get:
+            with self.assertRaises(requests.HTTPError):
+                client.get('movie/603')
+        self.assertEqual(session_get.call_count, 1)
+        self.assertEqual(bucket.stats()['granted'], 4)
+        self.assertEqual(breaker.stats()['failures'], 4)
+
+        # Once the breaker opens, the remaining retries are not sent
+        with mock.patch.object(client.session, 'get', side_effect=requests.ConnectionError('down')) as session_get, \
+                mock.patch('movies.tmdb.time.sleep'):
+            with self.assertRaises(requests.ConnectionError):
+                client.get('movie/603')
+        self.assertEqual(session_get.call_count, 1)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(bucket.stats()['granted'], 5)
+
+    async def test_async_retries_take_tokens_and_stop_when_the_breaker_opens(self):
+        bucket = TokenBucket(1000)
+        breaker = CircuitBreaker(failure_threshold=2)
+        client = AsyncTMDBClient(base_url='https://tmdb.test/3', api_key='key', max_retries=3, backoff_factor=0,
+                                 rate_limiter=bucket, breaker=breaker)
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(502, json={})
+
+        client.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with self.assertRaises(httpx.HTTPStatusError):
+            await client.get('movie/603')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(bucket.stats()['granted'], 2)
+        self.assertEqual(breaker.stats()['failures'], 2)
+        self.assertEqual(breaker.state, 'open')
+
+
+class ResilienceTest(TestCase):
+    def test_breaker_half_opens_after_recovery_timeout_with_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+
+    def test_token_bucket_waits_for_a_token_up_to_max_wait(self):
+        bucket = TokenBucket(rate=20, capacity=1, max_wait=0.1)
+        self.assertTrue(bucket.acquire())
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(bucket.stats()['throttled'], 1)
+
+    def test_token_bucket_rejects_when_wait_exceeds_max_wait(self):
+        bucket = TokenBucket(rate=1, capacity=1, max_wait=0.1)
+        self.assertTrue(bucket.acquire())
+        self.assertFalse(bucket.acquire())
+        self.assertEqual(bucket.stats()['rejected'], 1)
+
+    def test_shared_bucket_budget_is_shared_across_instances(self):
+        caches['tmdb'].clear()
+        first = SharedTokenBucket(rate=2, max_wait=0, key='test:ratelimit')
+        second = SharedTokenBucket(rate=2, max_wait=0, key='test:ratelimit')
+        with mock.patch('movies.resilience.time.time', return_value=1000.5):
+            granted = [first.acquire(), second.acquire(), first.acquire()]
+        self.assertEqual(granted, [True, True, False])
+        self.assertEqual(first.stats()['rejected'], 1)
+
+
+class MovieRatingTotalsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='critic', password='testpass123')
+        self.other = User.objects.create_user(username='fan', password='testpass123')
+        self.heat = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.ronin = Movie.objects.create(title='Ronin', description='Heist', release_date=date(1998, 9, 25))
+        self.client.force_authenticate(user=self.user)
+
+    def test_totals_follow_create_update_and_delete(self):
+        rating_id = self.client.post('/api/movies/ratings/', {'movie': self.heat.id, 'rating': 4}).data['id']
+        MovieRating.objects.create(user=self.other, movie=self.heat, rating=5)
+        self.heat.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (9, 2))
+        self.assertEqual(self.heat.average_user_rating, 4.5)
+
+        self.client.patch(f'/api/movies/ratings/{rating_id}/', {'rating': 2})
+        self.heat.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (7, 2))
+
+        self.client.patch(f'/api/movies/ratings/{rating_id}/', {'movie': self.ronin.id})
+        self.heat.refresh_from_db()
+        self.ronin.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (5, 1))
+        self.assertEqual((self.ronin.rating_sum, self.ronin.rating_count), (2, 1))
+
+        self.client.delete(f'/api/movies/ratings/{rating_id}/')
+        self.ronin.refresh_from_db()
+        self.assertEqual((self.ronin.rating_sum, self.ronin.rating_count), (0, 0))
+        self.assertIsNone(self.ronin.average_user_rating)
+
+    def test_totals_follow_writes_outside_the_api(self):
+        rating = MovieRating.objects.create(user=self.user, movie=self.heat, rating=4)
+        MovieRating.objects.create(user=self.other, movie=self.heat, rating=2)
+        # An edit through the admin or a shell saves the model directly
+        rating.rating = 5
+        rating.save()
+        self.heat.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (7, 2))
+
+        # Deleting the rater cascades to their ratings
+        self.user.delete()
+        self.heat.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (2, 1))
+
+    def test_rebuild_command_repairs_drift(self):
+        MovieRating.objects.create(user=self.user, movie=self.heat, rating=3)
+        MovieRating.objects.create(user=self.other, movie=self.heat, rating=4)
+        Movie.objects.filter(pk=self.ronin.pk).update(rating_sum=10, rating_count=2)
+
+        call_command('rebuild_movie_ratings', '--batch-size', '1', stdout=StringIO())
+
+        self.heat.refresh_from_db()
+        self.ronin.refresh_from_db()
+        self.assertEqual((self.heat.rating_sum, self.heat.rating_count), (7, 2))
+        self.assertEqual((self.ronin.rating_sum, self.ronin.rating_count), (0, 0))
+
+    def test_list_sorts_and_filters_by_user_rating_without_loading_ratings(self):
+        Movie.objects.filter(pk=self.heat.pk).update(rating_sum=9, rating_count=3)
+        Movie.objects.filter(pk=self.ronin.pk).update(rating_sum=5, rating_count=1)
+        unrated = Movie.objects.create(title='Thief', description='Safecracker', release_date=date(1981, 3, 27))
+
+        # ETag aggregate, page count, page rows, genres; no per-movie rating queries
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/movies/?ordering=-user_rating')
+        self.assertEqual([movie['id'] for movie in response.data['results']], [self.ronin.id, self.heat.id, unrated.id])
+        self.assertEqual(response.data['results'][1]['average_user_rating'], 3)
+
+        response = self.client.get('/api/movies/?min_user_rating=4')
+        self.assertEqual([movie['id'] for movie in response.data['results']], [self.ronin.id])
+        self.assertEqual(self.client.get('/api/movies/?min_user_rating=x').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RatingStatsTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'critic{i}', password='testpass123') for i in range(4)]
+        self.heat = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+        self.ronin = Movie.objects.create(title='Ronin', description='Heist', release_date=date(1998, 9, 25))
+        for user, rating, review in zip(self.users, (5, 5, 4, 1), ('Great', '', 'Good', 'Bad')):
+            MovieRating.objects.create(user=user, movie=self.heat, rating=rating, review=review)
+        MovieRating.objects.filter(review='Bad').update(created_at=timezone.now() - timedelta(days=60))
+
+    def stats(self, movie):
+        return self.client.get(f'/api/movies/{movie.pk}/rating-stats/')
+
+    def test_histogram_count_mean_and_recent_reviews(self):
+        response = self.stats(self.heat)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'movie_id': self.heat.pk, 'count': 4, 'mean': 3.75,
+            'histogram': {'1': 1, '2': 0, '3': 0, '4': 1, '5': 2}, 'recent_reviews': 2,
+        })
+        self.assertEqual(self.stats(self.ronin).data['count'], 0)
+        self.assertIsNone(self.stats(self.ronin).data['mean'])
+        self.assertEqual(self.client.get('/api/movies/999999/rating-stats/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_is_one_aggregate_and_then_cached(self):
+        url = f'/api/movies/rating-stats/?ids={self.heat.pk},{self.ronin.pk},999999'
+        with self.assertNumQueries(2):  # the grouped aggregate and the existence check of unrated ids
+            response = self.client.get(url)
+        self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(response.data['results'][str(self.heat.pk)]['count'], 4)
+        self.assertEqual(response.data['results'][str(self.ronin.pk)]['count'], 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data, response.data)
+        self.assertEqual(self.client.get('/api/movies/rating-stats/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rating_writes_invalidate_cached_stats(self):
+        self.assertEqual(self.stats(self.ronin).data['count'], 0)
+        self.client.force_authenticate(User.objects.create_user(username='newcomer', password='testpass123'))
+
+        rating_id = self.client.post('/api/movies/ratings/', {'movie': self.ronin.pk, 'rating': 3}).data['id']
+        self.assertEqual(self.stats(self.ronin).data['histogram']['3'], 1)
+
+        self.stats(self.heat)
+        self.client.patch(f'/api/movies/ratings/{rating_id}/', {'movie': self.heat.pk})
+        self.assertEqual(self.stats(self.ronin).data['count'], 0)
+        self.assertEqual(self.stats(self.heat).data['count'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/movies/ratings/{rating_id}/')
+        self.assertEqual(self.stats(self.heat).data['count'], 4)
+
+
+class MovieQueryCountTest(TestCase):
+    """List and detail pages issue a fixed number of queries however many ratings exist"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', description='Plot', release_date=date(2000 + i, 1, 1))
+            for i in range(3)
+        ]
+
+    def rate(self, movie, count):
+        for i in range(count):
+            user = User.objects.create(username=f'{movie.id}-{i}-{User.objects.count()}')
+            MovieRating.objects.create(user=user, movie=movie, rating=1 + i % 5)
+
+    def assert_constant_queries(self, url, queries):
+        with self.assertNumQueries(queries):
+            self.client.get(url)
+        for movie in self.movies:
+            self.rate(movie, 4)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        return response
+
+    def test_list_page(self):
+        # Aggregate for the ETag, page count, page rows, genres
+        response = self.assert_constant_queries('/api/movies/', 4)
+        self.assertEqual(response.data['results'][0]['average_user_rating'], 2.5)
+        # Page keys for the ETag, page rows, genres once the count is turned off
+        self.assert_constant_queries('/api/movies/?count=false', 3)
+
+    def test_search(self):
+        # Page count, page rows, genres
+        self.assert_constant_queries('/api/movies/search/?q=movie', 3)
+
+    def test_detail_page(self):
+        # Movie row, newest rater profile for the ETag, its genres, then its ratings joined with users and profiles
+        response = self.assert_constant_queries(f'/api/movies/{self.movies[0].id}/', 4)
+        self.assertEqual(response.data['ratings_count'], 4)
+        self.assertEqual(len(response.data['ratings']), 4)
+        self.assertIn('bio', response.data['ratings'][0]['user']['profile'])
+
+    def test_ratings_list(self):
+        # Page count, then page rows with users and profiles joined
+        self.rate(self.movies[0], 1)
+        self.assert_constant_queries(f'/api/movies/ratings/?movie={self.movies[0].id}', 2)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='critic', password='testpass123')
+        self.movie = Movie.objects.create(title='Heat', description='LA crime', release_date=date(1995, 12, 15))
+
+    def test_unchanged_list_is_answered_304_with_one_query(self):
+        etag = self.client.get('/api/movies/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/movies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_on_insert_delete_and_other_page(self):
+        etag = self.client.get('/api/movies/')['ETag']
+        other = Movie.objects.create(title='Ronin', description='Heist', release_date=date(1998, 9, 25))
+        after_insert = self.client.get('/api/movies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_insert.status_code, status.HTTP_200_OK)
+        other.delete()
+        after_delete = self.client.get('/api/movies/', HTTP_IF_NONE_MATCH=after_insert['ETag'])
+        self.assertEqual(after_delete.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(self.client.get('/api/movies/?page=1')['ETag'], after_delete['ETag'])
+
+    def test_rating_invalidates_movie_detail(self):
+        first = self.client.get(f'/api/movies/{self.movie.id}/')
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(
+            self.client.get(f'/api/movies/{self.movie.id}/', HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/movies/ratings/', {'movie': self.movie.id, 'rating': 4})
+        response = self.client.get(f'/api/movies/{self.movie.id}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ratings_count'], 1)
+
+    def test_rater_profile_change_invalidates_movie_detail(self):
+        MovieRating.objects.create(user=self.user, movie=self.movie, rating=4)
+        etag = self.client.get(f'/api/movies/{self.movie.id}/')['ETag']
+        self.user.username = 'renamed'
+        self.user.save()
+        response = self.client.get(f'/api/movies/{self.movie.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ratings'][0]['user']['username'], 'renamed')
+
+    def test_if_modified_since_on_detail(self):
+        last_modified = self.client.get(f'/api/movies/{self.movie.id}/')['Last-Modified']
+        response = self.client.get(f'/api/movies/{self.movie.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Shared release dates, so the id tiebreaker matters
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', description='Plot', release_date=date(2000 + i // 3, 1, 1))
+            for i in range(7)
+        ]
+        self.expected = [movie.id for movie in sorted(self.movies, key=lambda m: (m.release_date, m.id), reverse=True)]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_walks_every_row_once_forwards_and_backwards(self):
+        pages = [self.get('/api/movies/', page_size=3)]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        self.assertEqual([movie['id'] for page in pages for movie in page['results']], self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertEqual({page['count'] for page in pages}, {7})
+
+        back = self.get(pages[-1]['previous'])
+        self.assertEqual([movie['id'] for movie in back['results']], self.expected[3:6])
+        first = self.get(back['previous'])
+        self.assertEqual([movie['id'] for movie in first['results']], self.expected[:3])
+        self.assertIsNone(first['previous'])
+
+    def test_deep_pages_use_the_key_instead_of_offset_and_count(self):
+        second = self.get('/api/movies/', page_size=3, count='false')['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.get(second)
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_count_by_default_and_page_numbers_still_work(self):
+        self.assertEqual(self.get('/api/movies/')['count'], 7)
+        self.assertNotIn('count', self.get('/api/movies/', count='false'))
+        page = self.get('/api/movies/', page=1)
+        self.assertEqual(page['count'], 7)
+        self.assertEqual([movie['id'] for movie in page['results']], self.expected)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/api/movies/', {'cursor': 'garbage'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_etag_follows_its_rows(self):
+        etag = self.client.get('/api/movies/', {'page_size': 3})['ETag']
+        self.assertEqual(
+            self.client.get('/api/movies/', {'page_size': 3}, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        Movie.objects.get(pk=self.expected[1]).save()
+        self.assertEqual(
+            self.client.get('/api/movies/', {'page_size': 3}, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_200_OK,
+        )
+
+
+@override_settings(TMDB_API_KEY='key')
+class TMDBCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches['tmdb'].clear()
+        tmdb_cache.reset_stats()
+        self.upstream = mock.Mock()
+        self.upstream.get.return_value = {
+            'page': 1,
+            'results': [
+                {'id': 1, 'title': 'Dune', 'overview': 'Desert planet'},
+                {'id': 2, 'title': 'Adult Film', 'overview': ''},
+            ],
+        }
+        patcher = mock.patch('movies.cache.get_client', return_value=self.upstream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_popular_movies_served_from_cache_on_repeat(self):
+        first = self.client.get('/api/movies/tmdb/popular/')
+        second = self.client.get('/api/movies/tmdb/popular/', {'page': 1})
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual([movie['id'] for movie in second.data['results']], [1])
+        self.assertEqual(self.upstream.get.call_count, 1)
+        self.assertEqual(tmdb_cache.stats()['popular']['hits'], 1)
+        self.assertEqual(tmdb_cache.stats()['popular']['misses'], 1)
+
+    def test_popular_movies_revalidate_with_the_cached_body_hash(self):
+        first = self.client.get('/api/movies/tmdb/popular/')
+        second = self.client.get('/api/movies/tmdb/popular/', HTTP_IF_NONE_MATCH=first['ETag'])
+        other_page = self.client.get('/api/movies/tmdb/popular/?page=2', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+        # Same filtered body on another page, so the same validator
+        self.assertEqual(other_page.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.upstream.get.return_value = {'page': 1, 'results': [{'id': 3, 'title': 'Up', 'overview': ''}]}
+        caches['tmdb'].clear()
+        changed = self.client.get('/api/movies/tmdb/popular/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+    def test_keys_are_normalized_and_separate_per_endpoint(self):
+        self.assertEqual(
+            tmdb_cache.make_key('search', 'search/movie', {'query': ' Dune ', 'page': 1, 'api_key': 'a'}),
+            tmdb_cache.make_key('search', 'search/movie', {'page': '1', 'query': 'dune'}),
+        )
+        self.assertNotEqual(
+            tmdb_cache.make_key('movie', 'movie/1', {}),
+            tmdb_cache.make_key('reviews', 'movie/1', {}),
+        )
+
+    def test_upstream_errors_are_not_cached(self):
+        self.upstream.get.side_effect = [requests.ConnectionError('down'), {'id': 7}]
+
+        failed = self.client.get('/api/movies/tmdb/7/')
+        recovered = self.client.get('/api/movies/tmdb/7/')
+
+        self.assertEqual(failed.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(recovered.data, {'id': 7})
+
+    def test_expired_entry_is_served_stale_and_refreshed_in_background(self):
+        self.client.get('/api/movies/tmdb/7/')
+        key = tmdb_cache.make_key('movie', 'movie/7', {'language': 'en-US', 'append_to_response': 'credits'})
+        entry = caches['tmdb'].get(key)
+        entry['fresh_until'] = 0
+        caches['tmdb'].set(key, entry)
+        self.upstream.get.return_value = {'id': 7, 'title': 'Refreshed'}
+
+        stale = self.client.get('/api/movies/tmdb/7/')
+        tmdb_cache.wait_for_refreshes(timeout=5)
+        fresh = self.client.get('/api/movies/tmdb/7/')
+
+        self.assertNotIn('title', stale.data)
+        self.assertEqual(fresh.data['title'], 'Refreshed')
+        self.assertEqual(self.upstream.get.call_count, 2)
+        self.assertEqual(tmdb_cache.stats()['movie']['refreshes'], 1)
+
+    def test_concurrent_misses_share_one_upstream_fetch(self):
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            release.wait(5)
+            return {'id': 9}
+
+        self.upstream.get.side_effect = slow_get
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(tmdb_cache.fetch, 'movie', 'movie/9') for _ in range(8)]
+            while tmdb_cache.stats().get('movie', {}).get('coalesced', 0) < 7:
+                time.sleep(0.01)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, [{'id': 9}] * 8)
+        self.assertEqual(self.upstream.get.call_count, 1)
+
+
+@override_settings(TMDB_API_KEY='key')
+class AsyncTMDBViewTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches['tmdb'].clear()
+        self.upstream = mock.Mock()
+        self.upstream.get = mock.AsyncMock(return_value={
+            'results': [
+                {'id': 1, 'title': 'Up', 'overview': 'Balloons'},
+                {'id': 2, 'title': 'Erotic Tales', 'overview': ''},
+            ],
+        })
+        patcher = mock.patch('movies.cache.get_async_client', return_value=self.upstream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_popular_movies_filtered_and_cached(self):
+        first = await async_views.get_popular_movies(self.factory.get('/api/movies/tmdb/popular/'))
+        second = await async_views.get_popular_movies(self.factory.get('/api/movies/tmdb/popular/'))
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual([movie['id'] for movie in json.loads(second.content)['results']], [1])
+        self.upstream.get.assert_awaited_once()
+
+    async def test_etag_match_returns_304(self):
+        first = await async_views.get_popular_movies(self.factory.get('/api/movies/tmdb/popular/'))
+        second = await async_views.get_popular_movies(
+            self.factory.get('/api/movies/tmdb/popular/', HTTP_IF_NONE_MATCH=first['ETag']))
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_search_requires_query(self):
+        response = await async_views.search_tmdb_movies(self.factory.get('/api/movies/tmdb/search/'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_open_breaker_returns_503(self):
+        self.upstream.get.side_effect = AsyncTMDBUnavailable('TMDB is unavailable (circuit breaker open)')
+        response = await async_views.get_movie_reviews(self.factory.get('/api/movies/tmdb/5/reviews/'), 5)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def test_upstream_error_returns_500(self):
+        self.upstream.get.side_effect = httpx.ConnectError('down')
+        response = await async_views.get_movie_reviews(self.factory.get('/api/movies/tmdb/5/reviews/'), 5)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ContentFilterTest(TestCase):
+    def setUp(self):
+        self.content_filter = ContentFilter(['erotic', 'sex', 'adult', 'pornographic'])
+
+    def test_filters_adult_flag_and_keywords_in_title_or_overview(self):
+        results = [
+            {'id': 1, 'title': 'Toy Story', 'overview': 'Toys come alive'},
+            {'id': 2, 'title': 'Hidden', 'overview': 'An EROTIC thriller'},
+            {'id': 3, 'title': 'Sex Drive', 'overview': ''},
+            {'id': 4, 'title': 'Clean', 'overview': 'Fine', 'adult': True},
+            {'id': 5, 'title': None, 'overview': None},
+        ]
+        self.assertEqual([movie['id'] for movie in self.content_filter.filter_results(results)], [1, 5])
+
+    def test_offsets_survive_titles_that_grow_when_lowercased(self):
+        # 'İ'.lower() is two code points, which used to shift hits into the wrong result
+        titles = ['İİİİİİİİ', 'Sex']
+        kept = self.content_filter.filter_results([{'title': title} for title in titles])
+        self.assertEqual([movie['title'] for movie in kept], ['İİİİİİİİ'])
+
+        titles = ['İİİİİİİİİİ', 'Sex', 'Up', 'Cars']
+        kept = self.content_filter.filter_results([{'title': title} for title in titles])
+        self.assertEqual([movie['title'] for movie in kept], ['İİİİİİİİİİ', 'Up', 'Cars'])
+
+    def test_filter_queryset_applies_to_local_search(self):
+        Movie.objects.create(title='Space Adventure', description='Stars', release_date=date(2024, 1, 1))
+        Movie.objects.create(title='Space Erotica', description='', release_date=date(2024, 1, 1))
+        Movie.objects.create(title='Space Oddity', description='Adult themes', release_date=date(2024, 1, 1))
+
+        response = APIClient().get('/api/movies/search/', {'q': 'space'})
+
+        self.assertEqual([movie['title'] for movie in response.data['results']], ['Space Adventure'])
+
+
+class MovieSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for title, description, popularity in [
+            ('Dune', 'A desert planet', 10.0),
+            ('Dune: Part Two', 'Paul unites with the Fremen', 90.0),
+            ('Lawrence of Arabia', 'Epic set in the dune seas of the desert', 50.0),
+            ('Beyond the Dunes', 'A road trip', None),
+            ('Arrival', 'Linguist meets aliens', 80.0),
+        ]:
+            Movie.objects.create(title=title, description=description, release_date=date(2020, 1, 1),
+                                 popularity=popularity)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/movies/search/', dict(params, q=query))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie['title'] for movie in response.data['results']]
+
+    def test_requires_query(self):
+        response = self.client.get('/api/movies/search/', {'q': '  '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ranks_title_matches_above_description_matches(self):
+        titles = self.search('dune')
+        self.assertEqual(titles[:2], ['Dune', 'Dune: Part Two'])
+        self.assertEqual(set(titles[2:]), {'Lawrence of Arabia', 'Beyond the Dunes'})
+        self.assertNotIn('Arrival', titles)
+
+    def test_matches_every_word_across_title_and_description(self):
+        self.assertEqual(self.search('desert arabia'), ['Lawrence of Arabia'])
+        self.assertEqual(self.search('aliens linguist'), ['Arrival'])
+
+    def test_paginated(self):
+        with mock.patch.object(PageNumberPagination, 'page_size', 2):
+            response = self.client.get('/api/movies/search/', {'q': 'dune', 'page': 2})
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text and trigram search need PostgreSQL')
+    def test_postgres_stemming_and_typos(self):
+        self.assertIn('Arrival', self.search('alien'))
+        self.assertEqual(self.search('arrivl')[0], 'Arrival')
+        self.assertEqual(self.search('lawrense')[0], 'Lawrence of Arabia')
+
+
+class TypeaheadTest(TestCase):
+    def setUp(self):
+        title_index.clear()
+        self.addCleanup(title_index.clear)
+        self.client = APIClient()
+        self.dune = self.movie('Dune', 10.0)
+        self.part_two = self.movie('Dune: Part Two', 90.0)
+        self.movie('Dunkirk', 50.0)
+        self.movie('Amélie', 20.0)
+        self.movie('Sex Drive', 99.0)
+
+    def movie(self, title, popularity, description='Plot'):
+        return Movie.objects.create(title=title, description=description, release_date=date(2020, 1, 1),
+                                    popularity=popularity)
+
+    def complete(self, prefix, **params):
+        response = self.client.get('/api/movies/typeahead/', dict(params, q=prefix))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie['title'] for movie in response.data['results']]
+
+    def test_completes_any_title_word_by_popularity(self):
+        self.assertEqual(self.complete('dun'), ['Dune: Part Two', 'Dunkirk', 'Dune'])
+        self.assertEqual(self.complete('DUNE'), ['Dune: Part Two', 'Dune'])
+        self.assertEqual(self.complete('part tw'), ['Dune: Part Two'])
+        self.assertEqual(self.complete('two'), ['Dune: Part Two'])
+        self.assertEqual(self.complete('dun', limit=1), ['Dune: Part Two'])
+        self.assertEqual(self.complete('ame'), ['Amélie'])
+        self.assertEqual(self.complete('zzz'), [])
+        self.assertEqual(self.complete(''), [])
+
+    def test_blocked_titles_are_not_indexed(self):
+        self.assertEqual(self.complete('sex'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie('Sexy Beast', 1.0)
+        self.assertEqual(self.complete('se'), [])
+
+    def test_loads_once_and_follows_saves_and_deletes(self):
+        self.assertEqual(self.complete('dun'), ['Dune: Part Two', 'Dunkirk', 'Dune'])
+        with self.assertNumQueries(0):
+            self.complete('dune')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dune.title = 'Arrival'
+            self.dune.save()
+            self.part_two.delete()
+            self.movie('Dune Messiah', 5.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('dun'), ['Dunkirk', 'Dune Messiah'])
+            self.assertEqual(self.complete('arr'), ['Arrival'])
+
+    def test_memoized_prefix_is_invalidated_by_changes(self):
+        with mock.patch('movies.typeahead.SCAN_LIMIT', 1):
+            self.assertEqual(self.complete('d'), ['Dune: Part Two', 'Dunkirk', 'Dune'])
+            self.assertEqual(title_index.stats()['memoized_prefixes'], 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.movie('Drive', 70.0)
+            self.assertEqual(title_index.stats()['memoized_prefixes'], 0)
+            self.assertEqual(self.complete('d', limit=2), ['Dune: Part Two', 'Drive'])
+
+    @override_settings(MOVIE_TYPEAHEAD_MAX_AGE=0)
+    def test_rebuilds_in_background_when_stale(self):
+        self.complete('dun')
+        Movie.objects.filter(pk=self.dune.pk).update(title='Arrival')  # no signal
+        with mock.patch('movies.typeahead.threading.Thread') as thread:
+            self.complete('dun')
+            self.complete('dun')
+            thread.return_value.start.assert_called_once()
+            self.assertEqual(self.complete('arr'), [])
+            title_index.rebuild()
+            self.assertEqual(self.complete('arr'), ['Arrival'])
+
+    def test_rejects_bad_limit(self):
+        for limit in ('0', '21', 'ten'):
+            response = self.client.get('/api/movies/typeahead/', {'q': 'dun', 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def tmdb_movie(tmdb_id, title='Dune', **extra):
+    return dict({
+        'id': tmdb_id, 'title': title, 'overview': f'{title} overview', 'release_date': '2021-10-22',
+        'poster_path': '/p.jpg', 'backdrop_path': '/b.jpg', 'genres': [{'id': 878, 'name': 'Science Fiction'}],
+        'runtime': 155, 'vote_average': 7.84, 'popularity': 50.0, 'adult': False, 'original_language': 'en',
+    }, **extra)
+
+
+@override_settings(TMDB_API_KEY='key')
+class TMDBMirrorTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches['tmdb'].clear()
+        self.upstream = mock.Mock()
+        self.upstream.get.side_effect = lambda path, params=None, endpoint=None: tmdb_movie(int(path.split('/')[1]))
+        for target in ('movies.cache.get_client', 'movies.mirror.get_client'):
+            patcher = mock.patch(target, return_value=self.upstream)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_upsert_inserts_then_refreshes_by_tmdb_id(self):
+        mirror.upsert_movies([tmdb_movie(438631)])
+        mirror.upsert_movies([tmdb_movie(438631, title='Dune: Part One')])
+
+        movie = Movie.objects.get(tmdb_id=438631)
+        self.assertEqual(Movie.objects.count(), 1)
+        self.assertEqual(movie.title, 'Dune: Part One')
+        self.assertEqual(movie.genre, 'Science Fiction')
+        self.assertEqual(movie.duration, 155)
+        self.assertEqual(str(movie.rating), '7.8')
+        self.assertEqual(movie.poster_url, 'https://image.tmdb.org/t/p/w500/p.jpg')
+
+    def test_detail_is_served_from_mirror_once_ingested(self):
+        first = self.client.get('/api/movies/tmdb/438631/')
+        caches['tmdb'].clear()
+        second = self.client.get('/api/movies/tmdb/438631/')
+
+        self.assertEqual(first.data['title'], 'Dune')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.upstream.get.call_count, 1)
+
+    @override_settings(TMDB_MIRROR_MAX_AGE=0)
+    def test_stale_mirror_falls_back_to_tmdb(self):
+        mirror.upsert_movies([tmdb_movie(438631)])
+        self.client.get('/api/movies/tmdb/438631/')
+        self.assertEqual(self.upstream.get.call_count, 1)
+
+    def test_cache_hits_do_not_restamp_the_mirror(self):
+        self.client.get('/api/movies/tmdb/438631/')
+        long_ago = timezone.now() - timedelta(days=30)
+        Movie.objects.filter(tmdb_id=438631).update(tmdb_synced_at=long_ago)
+
+        # The mirror copy is stale, so this is answered from the TMDB cache, which must not count as a sync
+        self.client.get('/api/movies/tmdb/438631/')
+        self.client.get('/api/movies/tmdb/batch/', {'ids': '438631'})
+
+        self.assertEqual(self.upstream.get.call_count, 1)
+        self.assertEqual(Movie.objects.get(tmdb_id=438631).tmdb_synced_at, long_ago)
+
+    @override_settings(TMDB_MIRROR_SEARCH_MIN_RESULTS=2)
+    def test_search_uses_mirror_only_when_it_fills_a_page(self):
+        mirror.upsert_movies([tmdb_movie(1, 'Star Wars'), tmdb_movie(2, 'Star Trek', popularity=90.0)])
+        self.assertIsNone(mirror.search_fresh('wars'))
+
+        page = mirror.search_fresh('star')
+        self.assertEqual([movie['title'] for movie in page['results']], ['Star Trek', 'Star Wars'])
+        self.assertEqual(page['results'][0]['genre_ids'], [878])
+
+    @override_settings(TMDB_MIRROR_SEARCH_MIN_RESULTS=2)
+    def test_search_leaves_out_what_the_proxy_filters(self):
+        mirror.upsert_movies([
+            tmdb_movie(1, 'Star Wars'), tmdb_movie(2, 'Star Trek'),
+            tmdb_movie(3, 'Star Heist', original_language='fr'), tmdb_movie(4, 'Star Nights', adult=True),
+        ])
+        page = mirror.search_fresh('star')
+        self.assertEqual(sorted(movie['title'] for movie in page['results']), ['Star Trek', 'Star Wars'])
+
+        Movie.objects.filter(tmdb_id=2).update(tmdb_payload=tmdb_movie(2, 'Star Trek', original_language='ja'))
+        self.assertIsNone(mirror.search_fresh('star'))
+
+    def test_upsert_leaves_locally_created_movies_alone(self):
+        local = Movie.objects.create(title='Dune (club cut)', description='Our notes', release_date=date(2021, 10, 22),
+                                     tmdb_id=438631)
+        mirror.upsert_movies([tmdb_movie(438631), tmdb_movie(1, 'Arrival')])
+
+        local.refresh_from_db()
+        self.assertEqual((local.title, local.description, local.tmdb_synced_at), ('Dune (club cut)', 'Our notes', None))
+        self.assertIsNone(local.tmdb_payload)
+        self.assertEqual(Movie.objects.get(tmdb_id=1).title, 'Arrival')
+        self.assertEqual(mirror.ingest_movie(438631).pk, local.pk)
+
+    def test_sync_command_mirrors_popular_pages(self):
+        self.upstream.get.side_effect = lambda path, params=None, endpoint=None: (
+            {'results': [{'id': 1}, {'id': 2}]} if path == 'movie/popular' else tmdb_movie(int(path.split('/')[1]))
+        )
+        call_command('sync_tmdb_movies', pages=1, stdout=StringIO())
+        self.assertEqual(set(Movie.objects.values_list('tmdb_id', flat=True)), {1, 2})
+        # Popular pages are requested with the same filters as the popular proxy
+        self.upstream.get.assert_any_call(
+            'movie/popular', {'language': 'en-US', 'page': 1, 'with_original_language': 'en', 'include_adult': 'false'},
+            endpoint='popular')
+
+    def test_batch_details_merges_mirror_upstream_and_errors(self):
+        mirror.upsert_movies([tmdb_movie(1, 'Mirrored')])
+
+        def upstream_get(path, params=None, endpoint=None):
+            tmdb_id = int(path.split('/')[1])
+            if tmdb_id == 3:
+                raise requests.HTTPError('404 Client Error: Not Found')
+            return tmdb_movie(tmdb_id, 'Fetched')
+
+        self.upstream.get.side_effect = upstream_get
+        response = self.client.get('/api/movies/tmdb/batch/', {'ids': '1,2,3,2'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results']), ['1', '2'])
+        self.assertEqual(response.data['results']['1']['title'], 'Mirrored')
+        self.assertEqual(response.data['results']['2']['title'], 'Fetched')
+        self.assertIn('404', response.data['errors']['3'])
+        self.assertEqual(self.upstream.get.call_count, 2)
+        self.assertTrue(Movie.objects.filter(tmdb_id=2).exists())
+
+    def test_api_writes_cannot_change_the_mirror_fields(self):
+        mirror.upsert_movies([tmdb_movie(438631)])
+        movie = Movie.objects.get(tmdb_id=438631)
+        self.client.force_authenticate(User.objects.create_user(username='mallory', password='testpass123'))
+
+        response = self.client.patch(f'/api/movies/{movie.id}/', {
+            'tmdb_payload': {'id': 438631, 'title': 'HACKED'},
+            'tmdb_synced_at': '2030-01-01T00:00:00Z', 'popularity': 1e6,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('tmdb_payload', response.data)
+
+        unchanged = Movie.objects.get(pk=movie.pk)
+        self.assertEqual(unchanged.tmdb_payload['title'], 'Dune')
+        self.assertEqual((unchanged.tmdb_synced_at, unchanged.popularity), (movie.tmdb_synced_at, movie.popularity))
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/movies/tmdb/438631/').data['title'], 'Dune')
+        self.assertNotIn('tmdb_payload', self.client.get(f'/api/movies/{movie.id}/').data)
+
+    def test_batch_details_validates_ids(self):
+        self.assertEqual(self.client.get('/api/movies/tmdb/batch/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/movies/tmdb/batch/', {'ids': '1,x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        too_many = ','.join(str(i) for i in range(1, 60))
+        self.assertEqual(self.client.get('/api/movies/tmdb/batch/', {'ids': too_many}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class GenreTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='curator')
+
+    def names(self, movie):
+        return sorted(movie.genres.values_list('name', flat=True))
+
+    def list_titles(self, **params):
+        response = self.client.get('/api/movies/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(movie['title'] for movie in response.data['results'])
+
+    def test_mirror_links_tmdb_genres_and_replaces_them_on_refresh(self):
+        mirror.upsert_movies([tmdb_movie(1, genres=[{'id': 18, 'name': 'Drama'}, {'id': 878, 'name': 'Science Fiction'}])])
+        movie = Movie.objects.get(tmdb_id=1)
+        self.assertEqual(self.names(movie), ['Drama', 'Science Fiction'])
+        self.assertEqual(Genre.objects.get(slug='science-fiction').tmdb_id, 878)
+
+        mirror.upsert_movies([tmdb_movie(1, genres=[{'id': 18, 'name': 'Drama'}])])
+        self.assertEqual(self.names(movie), ['Drama'])
+        self.assertEqual(Genre.objects.count(), 2)
+
+    def test_mirror_keeps_genres_tmdb_renamed_on_their_row(self):
+        sci_fi = Genre.objects.create(name='Sci-Fi', slug='sci-fi', tmdb_id=878)
+        mirror.upsert_movies([tmdb_movie(1, genres=[{'id': 18, 'name': 'Drama'}, {'id': 878, 'name': 'Science Fiction'}])])
+
+        movie = Movie.objects.get(tmdb_id=1)
+        self.assertEqual(self.names(movie), ['Drama', 'Sci-Fi'])
+        self.assertTrue(movie.genres.filter(pk=sci_fi.pk).exists())
+        self.assertFalse(Genre.objects.filter(slug='science-fiction').exists())
+
+    def test_api_writes_link_the_genre_string(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/movies/', {
+            'title': 'Heat', 'description': 'LA crime', 'release_date': '1995-12-15', 'genre': 'Crime, Drama, crime',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['genres'], ['Crime', 'Drama'])
+
+        response = self.client.patch(f"/api/movies/{response.data['id']}/", {'genre': 'Thriller'})
+        self.assertEqual(response.data['genres'], ['Thriller'])
+
+    def test_filters_by_genre_slug_or_name(self):
+        for title, genre in [('Heat', 'Crime, Drama'), ('Alien', 'Horror, Science Fiction'), ('Up', 'Animation')]:
+            movie = Movie.objects.create(title=title, description='Plot', release_date=date(2000, 1, 1), genre=genre)
+            set_movie_genres({movie.pk: genres_from_string(genre)})
+
+        self.assertEqual(self.list_titles(genre='drama'), ['Heat'])
+        self.assertEqual(self.list_titles(genre='Science Fiction'), ['Alien'])
+        self.assertEqual(self.list_titles(genre='drama,crime,horror'), ['Alien', 'Heat'])
+        self.assertEqual(self.list_titles(genre='western'), [])
+
+    def test_migration_splits_existing_genre_strings(self):
+        split_genres = import_module('movies.migrations.0005_genres').split_genres
+        heat = Movie.objects.create(title='Heat', description='Plot', release_date=date(1995, 1, 1),
+                                    genre='Crime, Drama')
+        dune = Movie.objects.create(title='Dune', description='Plot', release_date=date(2021, 1, 1),
+                                    genre='Sci-Fi', tmdb_payload=tmdb_movie(438631))
+
+        split_genres(django_apps, None)
+
+        self.assertEqual(self.names(heat), ['Crime', 'Drama'])
+        self.assertEqual(self.names(dune), ['Science Fiction'])
+
+
+
+class SimilarMoviesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', description='Plot', release_date=date(2000, 1, 1))
+            for i in range(5)
+        ]
+        self.users = [User.objects.create(username=f'viewer{i}') for i in range(4)]
+
+    def similar(self, movie, **params):
+        return self.client.get(f'/api/movies/{movie.pk}/similar/', params)
+
+    def like(self, user, *movies):
+        for movie in movies:
+            MovieRating.objects.create(user=user, movie=movie, rating=5)
+
+    def neighbors(self, movie):
+        return list(MovieSimilarity.objects.filter(movie=movie).values_list('similar_id', flat=True))
+
+    def test_returns_stored_neighbors_best_first(self):
+        first, second, third = self.movies[1:4]
+        MovieSimilarity.objects.bulk_create([
+            MovieSimilarity(movie=self.movies[0], similar=second, score=0.4),
+            MovieSimilarity(movie=self.movies[0], similar=first, score=0.9),
+            MovieSimilarity(movie=self.movies[0], similar=third, score=0.123456),
+        ])
+
+        response = self.similar(self.movies[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([movie['id'] for movie in response.data['results']], [first.pk, second.pk, third.pk])
+        self.assertEqual(response.data['results'][2]['similarity'], 0.1235)
+        self.assertEqual(len(self.similar(self.movies[0], limit=2).data['results']), 2)
+
+    def test_movie_without_neighbors_and_bad_requests(self):
+        self.assertEqual(self.similar(self.movies[4]).data, {'results': []})
+        self.assertEqual(self.client.get('/api/movies/999999/similar/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.similar(self.movies[0], limit=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.similar(self.movies[0], limit='x').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(find_spec('numpy') and find_spec('scipy'), 'numpy and scipy are required to build similarities')
+    def test_full_build_pairs_movies_liked_by_the_same_users(self):
+        from .recommendations import rebuild_similarities
+        a, b, c, d, _ = self.movies
+        for user in self.users[:3]:
+            self.like(user, a, b)
+        self.like(self.users[3], c, d)
+        MovieRating.objects.create(user=self.users[3], movie=a, rating=2)
+
+        build = rebuild_similarities(full=True, min_support=1)
+
+        self.assertTrue(build.full)
+        self.assertEqual(self.neighbors(a), [b.pk])
+        self.assertEqual(self.neighbors(c), [d.pk])
+        self.assertEqual(build.rows, 4)
+
+    @skipUnless(find_spec('numpy') and find_spec('scipy'), 'numpy and scipy are required to build similarities')
+    def test_incremental_build_merges_new_likes(self):
+        from .recommendations import rebuild_similarities
+        a, b, c, _, _ = self.movies
+        self.like(self.users[0], a, b)
+        rebuild_similarities(full=True, min_support=1)
+        self.like(self.users[0], c)
+
+        build = rebuild_similarities(min_support=1)
+
+        self.assertFalse(build.full)
+        self.assertEqual(build.movies, 1)
+        self.assertCountEqual(self.neighbors(a), [b.pk, c.pk])
+        self.assertCountEqual(self.neighbors(c), [a.pk, b.pk])
+
+
+class FavoriteBulkTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='collector')
+        self.client.force_authenticate(self.user)
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', description='Plot', release_date=date(2000, 1, i + 1))
+            for i in range(4)
+        ]
+        self.ids = [movie.pk for movie in self.movies]
+
+    def favorite_ids(self):
+        return sorted(Favorite.objects.filter(user=self.user).values_list('movie_id', flat=True))
+
+    def test_bulk_add_skips_existing_favorites(self):
+        Favorite.objects.create(user=self.user, movie=self.movies[0])
+
+        response = self.client.post('/api/movies/favorites/bulk/', {'movie_ids': self.ids[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['added'], self.ids[1:3])
+        self.assertEqual(self.favorite_ids(), self.ids[:3])
+
+        response = self.client.post('/api/movies/favorites/bulk/', {'movie_ids': f'{self.ids[0]},{self.ids[1]}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['added'], [])
+
+    def test_bulk_add_rejects_unknown_movies_without_adding_any(self):
+        response = self.client.post('/api/movies/favorites/bulk/', {'movie_ids': [self.ids[0], 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['movie_ids'], [999999])
+        self.assertEqual(self.favorite_ids(), [])
+
+    def test_bulk_remove_and_bad_payloads(self):
+        Favorite.objects.bulk_create([Favorite(user=self.user, movie=movie) for movie in self.movies])
+        other = User.objects.create(username='other')
+        Favorite.objects.create(user=other, movie=self.movies[0])
+
+        with self.assertNumQueries(1):
+            response = self.client.delete('/api/movies/favorites/bulk/', {'movie_ids': self.ids[:2]}, format='json')
+        self.assertEqual(response.data, {'removed': 2})
+        self.assertEqual(self.favorite_ids(), self.ids[2:])
+        self.assertTrue(Favorite.objects.filter(user=other).exists())
+
+        for payload in ({}, {'movie_ids': ['x']}, {'movie_ids': list(range(1, 502))}):
+            response = self.client.post('/api/movies/favorites/bulk/', payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact_list_modes(self):
+        for movie in self.movies[:2]:
+            Favorite.objects.create(user=self.user, movie=movie)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/movies/favorites/', {'view': 'ids'})
+        self.assertEqual(response.data, {'movie_ids': [self.ids[1], self.ids[0]]})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/movies/favorites/', {'view': 'compact'})
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'movie_id', 'tmdb_id', 'title', 'poster_url', 'release_date', 'created_at'},
+        )
+        self.assertEqual(response.data['results'][0]['title'], 'Movie 1')
+        self.assertEqual(self.client.get('/api/movies/favorites/', {'view': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.client.get('/api/movies/favorites/').data['results']), 2)
+
+
+@override_settings(TMDB_API_KEY='key', TMDB_MIRROR_ENABLED=False)
+class UserStateTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches['tmdb'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='badger', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.heat = Movie.objects.create(tmdb_id=949, title='Heat', description='Plot', release_date=date(1995, 12, 15))
+        self.ronin = Movie.objects.create(tmdb_id=8195, title='Ronin', description='Plot', release_date=date(1998, 9, 25))
+        Favorite.objects.create(user=self.user, movie=self.heat)
+        MovieRating.objects.create(user=self.user, movie=self.ronin, rating=4)
+
+    def states(self, response):
+        return {movie['id']: (movie['is_favorited'], movie['my_rating']) for movie in response.data['results']}
+
+    def test_movie_list_badges_come_from_the_cached_membership(self):
+        with self.assertNumQueries(6):  # membership (2), ETag aggregate, page count, page rows, genres
+            response = self.client.get('/api/movies/', {'user_state': 'true'})
+        self.assertEqual(self.states(response), {self.heat.pk: (True, None), self.ronin.pk: (False, 4)})
+        with self.assertNumQueries(4):
+            self.client.get('/api/movies/', {'user_state': 'true'})
+
+        self.assertNotIn('is_favorited', self.client.get('/api/movies/').data['results'][0])
+        detail = self.client.get(f'/api/movies/{self.ronin.pk}/', {'user_state': 'true'}).data
+        self.assertEqual((detail['is_favorited'], detail['my_rating']), (False, 4))
+        anonymous = APIClient().get('/api/movies/', {'user_state': 'true'})
+        self.assertNotIn('is_favorited', anonymous.data['results'][0])
+
+    def test_writes_invalidate_badges_and_etags(self):
+        first = self.client.get('/api/movies/', {'user_state': 'true'})
+
+        self.client.post('/api/movies/favorites/', {'movie_id': self.ronin.pk})
+        second = self.client.get('/api/movies/', {'user_state': 'true'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.states(second)[self.ronin.pk], (True, 4))
+
+        rating = MovieRating.objects.get(user=self.user, movie=self.ronin)
+        self.client.patch(f'/api/movies/ratings/{rating.pk}/', {'rating': 2})
+        self.client.delete('/api/movies/favorites/bulk/', {'movie_ids': [self.heat.pk]}, format='json')
+        self.assertEqual(
+            self.states(self.client.get('/api/movies/', {'user_state': 'true'})),
+            {self.heat.pk: (False, None), self.ronin.pk: (True, 2)},
+        )
+
+    def test_tmdb_proxy_payloads_are_decorated_by_tmdb_id(self):
+        entry = {'etag': '"page"', 'data': {'page': 1, 'results': [{'id': 949}, {'id': 8195}, {'id': 1}]}}
+        with mock.patch.object(tmdb_cache, 'fetch_entry', return_value=entry):
+            response = self.client.get('/api/movies/tmdb/popular/', {'user_state': 'true'})
+            plain = self.client.get('/api/movies/tmdb/popular/')
+
+        self.assertEqual(
+            [(movie['is_favorited'], movie['my_rating']) for movie in response.data['results']],
+            [(True, None), (False, 4), (False, None)],
+        )
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(plain.data, entry['data'])
+
+    async def test_async_proxy_authenticates_the_bearer_token(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        entry = {'etag': '"page"', 'data': {'results': [{'id': 949}]}}
+        request = RequestFactory().get(
+            '/api/movies/tmdb/popular/', {'user_state': 'true'}, HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        with mock.patch.object(tmdb_cache, 'afetch_entry', mock.AsyncMock(return_value=entry)):
+            response = await async_views.get_popular_movies(request)
+
+        self.assertEqual(json.loads(response.content)['results'], [{'id': 949, 'is_favorited': True, 'my_rating': None}])
+
+    async def test_async_proxy_rejects_a_bad_bearer_token_like_drf(self):
+        entry = {'etag': '"page"', 'data': {'results': [{'id': 949}]}}
+        request = RequestFactory().get('/api/movies/tmdb/popular/', HTTP_AUTHORIZATION='Bearer not-a-token')
+        with mock.patch.object(tmdb_cache, 'afetch_entry', mock.AsyncMock(return_value=entry)) as fetch:
+            response = await async_views.get_popular_movies(request)
+            sync_response = await sync_to_async(APIClient().get)(
+                '/api/movies/tmdb/popular/', HTTP_AUTHORIZATION='Bearer not-a-token',
+            )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(sync_response.status_code, 401)
+        self.assertEqual(json.loads(response.content)['code'], sync_response.json()['code'])
+        self.assertEqual(response['WWW-Authenticate'], sync_response['WWW-Authenticate'])
+        fetch.assert_not_called()
+
+
+@override_settings(TMDB_API_KEY='key', TMDB_MIRROR_ENABLED=False)
+class FakeTMDBTest(TestCase):
+    """The proxy views end to end, against the offline fake TMDB"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches['tmdb'].clear()
+        self.breaker = CircuitBreaker(failure_threshold=100)
+
+    def use_fake(self, **options):
+        fake = FakeTMDB(**options)
+        client = AsyncTMDBClient(base_url='http://fake-tmdb/3', api_key='key', max_retries=0,
+                                 rate_limiter=TokenBucket(1000), breaker=self.breaker)
+        client.session = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+        patcher = mock.patch('movies.cache.get_async_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fake
+
+    async def test_every_proxy_endpoint_is_served(self):
+        self.use_fake(results_per_page=7)
+        popular = await async_views.get_popular_movies(self.factory.get('/api/movies/tmdb/popular/'))
+        search = await async_views.search_tmdb_movies(self.factory.get('/api/movies/tmdb/search/', {'q': 'dune'}))
+        details = await async_views.get_tmdb_movie_details(self.factory.get('/api/movies/tmdb/42/'), 42)
+        recommendations = await async_views.get_movie_recommendations(
+            self.factory.get('/api/movies/tmdb/42/recommendations/'), 42)
+        reviews = await async_views.get_movie_reviews(self.factory.get('/api/movies/tmdb/42/reviews/'), 42)
+
+        for response in (popular, search, details, recommendations, reviews):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(popular.content)['results']), 7)
+        self.assertTrue(json.loads(search.content)['results'][0]['title'].startswith('Dune'))
+        self.assertEqual(json.loads(details.content)['id'], 42)
+        self.assertIn('cast', json.loads(details.content)['credits'])
+        self.assertEqual(json.loads(reviews.content)['id'], 42)
+
+    async def test_payloads_are_deterministic(self):
+        fake = FakeTMDB(seed=3)
+        self.assertEqual(fake.generate('movie/popular', {'page': '2'}), FakeTMDB(seed=3).generate('movie/popular', {'page': '2'}))
+        self.assertEqual(fake.generate('movie/0', {})[0], 404)
+
+    async def test_malformed_pages_are_rejected_like_tmdb(self):
+        fake = FakeTMDB()
+        for page in ('abc', '1.5', '0', '-3', '501'):
+            status_code, body = fake.generate('movie/popular', {'page': page})
+            self.assertEqual(status_code, 400, page)
+            self.assertEqual(body['status_code'], 22)
+        self.assertEqual(fake.generate('search/movie', {'query': 'dune', 'page': ''})[1]['page'], 1)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake)) as client:
+            response = await client.get('http://fake-tmdb/3/movie/5/reviews', params={'page': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_default_async_benchmark_only_requests_pages_tmdb_serves(self):
+        spec = spec_from_file_location('bench_tmdb_async', settings.BASE_DIR / 'benchmarks' / 'bench_tmdb_async.py')
+        bench = module_from_spec(spec)
+        spec.loader.exec_module(bench)
+        args = bench.build_parser().parse_args([])
+        fake = self.use_fake(results_per_page=args.results_per_page)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake), base_url='http://fake-tmdb/3') as client:
+            pages = (await client.get('/movie/popular')).json()['total_pages']
+
+        keys = [bench.ENDPOINTS[args.endpoint](i, pages) for i in range(1, args.requests + 1)]
+        distinct = {(path, tuple(params.items())) for path, params in keys}
+        self.assertEqual(len(distinct), pages)
+        for path, params in sorted(distinct):
+            params = dict(params)
+            response = await async_views.get_popular_movies(self.factory.get(path, params))
+            self.assertEqual(response.status_code, status.HTTP_200_OK, params)
+            self.assertTrue(json.loads(response.content)['results'], params)
+
+    async def test_injected_errors_surface_as_upstream_failures(self):
+        fake = self.use_fake(error_rate=1.0)
+        response = await async_views.get_movie_reviews(self.factory.get('/api/movies/tmdb/5/reviews/'), 5)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(fake.errors, 1)
+        self.assertEqual(self.breaker.stats()['failures'], 1)
+
+    async def test_record_then_replay_without_upstream(self):
+        fixtures = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures)
+        upstream = FakeTMDB(seed=7)
+        recorder = FakeTMDB(mode='record', fixtures=fixtures, upstream='http://real-tmdb/3',
+                            upstream_api_key='real', upstream_transport=httpx.ASGITransport(app=upstream))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=recorder)) as client:
+            params = dict(mirror.DETAIL_PARAMS, api_key='bench')
+            recorded = (await client.get('http://fake-tmdb/3/movie/550', params=params)).json()
+
+        # A different seed would synthesize a different movie; strict replay must serve the recording
+        self.use_fake(mode='replay', fixtures=fixtures, strict=True, seed=99)
+        replayed = await async_views.get_tmdb_movie_details(self.factory.get('/api/movies/tmdb/550/'), 550)
+        missing = await async_views.get_movie_reviews(self.factory.get('/api/movies/tmdb/550/reviews/'), 550)
+
+        self.assertEqual(json.loads(replayed.content), recorded)
+        self.assertEqual(missing.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
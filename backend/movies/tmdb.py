@@ -0,0 +1,401 @@
+"""
+Shared client for The Movie Database (TMDB) API.
+
+Every outbound TMDB request goes through one pooled ``requests.Session`` so
+connections are kept alive between proxied requests instead of paying a new
+TCP + TLS handshake each time. Calls are bounded by connect/read timeouts,
+connection errors and 5xx responses are retried with exponential backoff
+(honouring ``Retry-After`` up to ``TMDB_RETRY_MAX_WAIT``), and the latency of
+every call is recorded per endpoint.
+
+``AsyncTMDBClient`` is the non-blocking counterpart used by the async proxy
+views under ASGI; it applies the same timeouts, retry policy and stats.
+
+Both clients share the process-wide rate limiter and circuit breaker from
+``resilience.py``. Every attempt, retries included, takes a token from the
+limiter and reports its outcome to the breaker, so a struggling TMDB is not
+sent more traffic than the budget allows and each 5xx counts towards opening
+the breaker. A 429 is not retried: it counts as a failure and the caller gets
+the error. A call that is rejected by either raises ``TMDBUnavailable`` (or
+``AsyncTMDBUnavailable``) without touching the network.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .resilience import CircuitBreaker, SharedTokenBucket, TokenBucket
+
+
+# 429 is left out on purpose: retrying a throttled call would only spend more of TMDB's quota
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class TMDBUnavailable(requests.RequestException):
+    """TMDB call refused locally: circuit breaker open or rate limit exhausted"""
+
+
+class AsyncTMDBUnavailable(httpx.HTTPError):
+    """Async counterpart of ``TMDBUnavailable``"""
+
+
+def is_upstream_failure(status_code):
+    """Responses that mean TMDB is unhealthy or throttling us, as opposed to a bad request"""
+    return status_code == 429 or status_code >= 500
+
+
+def record_verdict(breaker, status_code):
+    # 5xx and 429 count against TMDB, any other answer (4xx included) shows it is up
+    if is_upstream_failure(status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def retry_delay(backoff_factor, attempt, retry_after=None, max_wait=None):
+    """Seconds to sleep before retrying after ``attempt`` (0 for the first call).
+
+    Exponential backoff, or the server's ``Retry-After`` seconds when it asks
+    for longer, never more than ``max_wait``.
+    """
+    delay = backoff_factor * (2 ** attempt)
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass  # An HTTP date; the backoff will do
+    return delay if max_wait is None else min(delay, max_wait)
+
+
+class LatencyStats:
+    """Call counters and a rolling window of latencies for one endpoint"""
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=window)
+
+    def record(self, elapsed_ms, error=False):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return round(ordered[index], 2)
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.calls, 2) if self.calls else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+        }
+
+
+class ClientStats:
+    """Thread-safe registry of ``LatencyStats`` keyed by endpoint"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms, error):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = LatencyStats()
+            stats.record(elapsed_ms, error)
+
+    def as_dict(self):
+        with self._lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in self._stats.items()}
+
+
+class TMDBClient:
+    """Pooled, retrying HTTP client for the TMDB REST API"""
+
+    def __init__(self, base_url=None, api_key=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None,
+                 pool_maxsize=None, rate_limiter=None, breaker=None, max_retry_wait=None):
+        self.base_url = (base_url or settings.TMDB_BASE_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None else settings.TMDB_API_KEY
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.breaker = breaker if breaker is not None else get_breaker()
+        self.max_retries = max_retries if max_retries is not None else settings.TMDB_MAX_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else settings.TMDB_RETRY_BACKOFF
+        self.max_retry_wait = max_retry_wait if max_retry_wait is not None else settings.TMDB_RETRY_MAX_WAIT
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else settings.TMDB_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.TMDB_READ_TIMEOUT,
+        )
+        # Retries happen in get(), where each attempt can take its own token and breaker verdict
+        pool_maxsize = pool_maxsize or settings.TMDB_POOL_MAXSIZE
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.latency = ClientStats()
+
+    def get(self, path, params=None, endpoint=None):
+        """GET ``path`` (relative to the TMDB base URL) and return the decoded JSON.
+
+        Raises ``requests.RequestException`` on connection errors, timeouts and
+        non-2xx responses that are still failing after retries, and
+        ``TMDBUnavailable`` when the breaker is open or no token is available.
+        A retry the breaker or limiter refuses raises the last attempt's error.
+        """
+        query = {'api_key': self.api_key}
+        if params:
+            query.update(params)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        refused = self._admit()
+        if refused:
+            raise TMDBUnavailable(refused)
+
+        started = time.perf_counter()
+        error = True
+        held = True  # A breaker permission still waiting for TMDB's verdict
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = self.session.get(url, params=query, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    self.breaker.record_failure()
+                    held = False
+                    if attempt >= self.max_retries or self._admit():
+                        raise
+                    held = True
+                    delay = retry_delay(self.backoff_factor, attempt, max_wait=self.max_retry_wait)
+                else:
+                    record_verdict(self.breaker, response.status_code)
+                    held = False
+                    if (response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries
+                            or self._admit()):
+                        response.raise_for_status()
+                        data = response.json()
+                        error = False
+                        return data
+                    held = True
+                    delay = retry_delay(self.backoff_factor, attempt, response.headers.get('Retry-After'),
+                                        self.max_retry_wait)
+                time.sleep(delay)
+                attempt += 1
+        except requests.RequestException:
+            # No response, e.g. a connection dropped while reading the body
+            if held:
+                self.breaker.record_failure()
+                held = False
+            raise
+        finally:
+            if held:
+                # Failed without a verdict on TMDB; give a half-open trial back instead of holding it forever
+                self.breaker.release()
+            self.latency.record(endpoint or path, (time.perf_counter() - started) * 1000, error)
+
+    def _admit(self):
+        """Take a breaker permission and a rate limit token for one attempt; the reason if refused"""
+        if not self.breaker.allow():
+            return 'TMDB is unavailable (circuit breaker open)'
+        if not self.rate_limiter.acquire():
+            self.breaker.release()
+            return 'TMDB rate limit exhausted'
+        return None
+
+    def stats(self):
+        """Latency summary for every endpoint called so far"""
+        return self.latency.as_dict()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncTMDBClient:
+    """Non-blocking TMDB client built on a pooled ``httpx.AsyncClient``"""
+
+    def __init__(self, base_url=None, api_key=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None,
+                 pool_maxsize=None, latency=None, rate_limiter=None, breaker=None, max_retry_wait=None):
+        self.base_url = (base_url or settings.TMDB_BASE_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None else settings.TMDB_API_KEY
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.breaker = breaker if breaker is not None else get_breaker()
+        self.max_retries = max_retries if max_retries is not None else settings.TMDB_MAX_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else settings.TMDB_RETRY_BACKOFF
+        self.max_retry_wait = max_retry_wait if max_retry_wait is not None else settings.TMDB_RETRY_MAX_WAIT
+        timeout = httpx.Timeout(
+            read_timeout if read_timeout is not None else settings.TMDB_READ_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else settings.TMDB_CONNECT_TIMEOUT,
+        )
+        pool_maxsize = pool_maxsize or settings.TMDB_ASYNC_POOL_MAXSIZE
+        limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        self.session = httpx.AsyncClient(timeout=timeout, limits=limits)
+        self.latency = latency if latency is not None else ClientStats()
+
+    async def get(self, path, params=None, endpoint=None):
+        """GET ``path`` and return the decoded JSON.
+
+        Raises ``httpx.HTTPError`` on connection errors, timeouts and non-2xx
+        responses that are still failing after retries, and
+        ``AsyncTMDBUnavailable`` when the breaker is open or no token is available.
+        A retry the breaker or limiter refuses raises the last attempt's error.
+        """
+        query = {'api_key': self.api_key}
+        if params:
+            query.update(params)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        refused = await self._admit()
+        if refused:
+            raise AsyncTMDBUnavailable(refused)
+
+        started = time.perf_counter()
+        error = True
+        held = True  # A breaker permission still waiting for TMDB's verdict
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = await self.session.get(url, params=query)
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    held = False
+                    if attempt >= self.max_retries or await self._admit():
+                        raise
+                    held = True
+                    delay = retry_delay(self.backoff_factor, attempt, max_wait=self.max_retry_wait)
+                else:
+                    record_verdict(self.breaker, response.status_code)
+                    held = False
+                    if (response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries
+                            or await self._admit()):
+                        response.raise_for_status()
+                        data = response.json()
+                        error = False
+                        return data
+                    held = True
+                    delay = retry_delay(self.backoff_factor, attempt, response.headers.get('Retry-After'),
+                                        self.max_retry_wait)
+                await asyncio.sleep(delay)
+                attempt += 1
+        except httpx.HTTPError:
+            if held:
+                self.breaker.record_failure()
+                held = False
+            raise
+        finally:
+            if held:
+                self.breaker.release()
+            self.latency.record(endpoint or path, (time.perf_counter() - started) * 1000, error)
+
+    async def _admit(self):
+        if not self.breaker.allow():
+            return 'TMDB is unavailable (circuit breaker open)'
+        if not await self.rate_limiter.aacquire():
+            self.breaker.release()
+            return 'TMDB rate limit exhausted'
+        return None
+
+    def stats(self):
+        return self.latency.as_dict()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+_client = None
+_client_lock = threading.RLock()  # get_client() builds the limiter and breaker under it
+_rate_limiter = None
+_breaker = None
+_async_clients = weakref.WeakKeyDictionary()
+_async_latency = ClientStats()
+
+
+def get_rate_limiter():
+    """Process-wide limiter on outbound TMDB calls, shared by the sync and async clients"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _client_lock:
+            if _rate_limiter is None:
+                if settings.TMDB_RATE_LIMIT_SHARED:
+                    _rate_limiter = SharedTokenBucket(settings.TMDB_RATE_LIMIT, max_wait=settings.TMDB_RATE_LIMIT_MAX_WAIT)
+                else:
+                    _rate_limiter = TokenBucket(
+                        settings.TMDB_RATE_LIMIT,
+                        capacity=settings.TMDB_RATE_LIMIT_BURST,
+                        max_wait=settings.TMDB_RATE_LIMIT_MAX_WAIT,
+                    )
+    return _rate_limiter
+
+
+def get_breaker():
+    """Process-wide circuit breaker for TMDB"""
+    global _breaker
+    if _breaker is None:
+        with _client_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=settings.TMDB_BREAKER_FAILURE_THRESHOLD,
+                    recovery_timeout=settings.TMDB_BREAKER_RECOVERY_TIMEOUT,
+                )
+    return _breaker
+
+
+def get_client():
+    """Return the process-wide TMDB client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDBClient()
+    return _client
+
+
+def get_async_client():
+    """Return the TMDB async client for the running event loop.
+
+    httpx connection pools are bound to the loop they were created on, so each
+    loop (one per ASGI worker process in production) gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncTMDBClient(latency=_async_latency)
+    return client
+
+
+def async_client_stats():
+    """Latency summary shared by every async client in this process"""
+    return _async_latency.as_dict()
+
+
+def reset_client():
+    """Drop the shared clients, limiter and breaker so the next call picks up current settings"""
+    global _client, _rate_limiter, _breaker
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _async_clients.clear()
+        _rate_limiter = None
+        _breaker = None
@@ -0,0 +1,214 @@
+"""
+In-process prefix index over ``Movie.title`` for search-as-you-type.
+
+Every title is normalized (lowercased, accents and punctuation stripped) and
+indexed once per word, so "part tw" completes "Dune: Part Two" as well as
+"dun" does. The keys live in one sorted list of ``(key, pk)`` tuples: a prefix
+lookup is two binary searches, and the matching slice is ranked by TMDB
+popularity. Slices too long to rank per request (one- or two-letter prefixes
+on a large catalog) are ranked once and memoized until a title under that
+prefix changes.
+
+The index is built on the first lookup and kept current from ``Movie``
+post_save/post_delete signals after the transaction commits. Signals only
+reach the process that made the change, and bulk writes (the TMDB mirror sync)
+send none, so the index is also rebuilt in a background thread once it is
+older than ``MOVIE_TYPEAHEAD_MAX_AGE`` seconds, serving the old copy meanwhile.
+Blocked titles (``TMDB_BLOCKED_KEYWORDS``) are never indexed.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connections
+
+from .filters import get_content_filter
+
+MAX_RESULTS = 20
+# Matching slices longer than this are ranked once and memoized
+SCAN_LIMIT = 256
+# Only the first words of a title are indexed as completion starts
+MAX_WORDS = 8
+_MEMO_MAX_ENTRIES = 10000
+
+_non_alnum = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(_non_alnum.split(text.lower())).strip()
+
+
+def title_keys(title):
+    """The index keys for a title: its normalized form from each word onwards"""
+    words = normalize(title).split()
+    return {' '.join(words[i:]) for i in range(min(len(words), MAX_WORDS))}
+
+
+class TitleIndex:
+    """Sorted-array prefix index of movie titles weighted by popularity"""
+
+    fields = ('pk', 'title', 'popularity', 'release_date', 'poster_url', 'tmdb_id')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._movies = {}
+        # pk -> sort key, so ranking runs without calling back into Python
+        self._weights = {}
+        self._memo = {}
+        self._loaded_at = None
+        # Changes made while a rebuild runs, replayed on top of its result
+        self._pending = None
+        self._stats = {'lookups': 0, 'memo_hits': 0, 'rebuilds': 0, 'rebuild_errors': 0, 'updates': 0}
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def complete(self, prefix, limit=10):
+        """The ``limit`` most popular movies with a title word starting with ``prefix``"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self._ensure_fresh()
+        limit = min(limit, MAX_RESULTS)
+        with self._lock:
+            self._stats['lookups'] += 1
+            ranked = self._memo.get(prefix)
+            if ranked is not None:
+                self._stats['memo_hits'] += 1
+            else:
+                lo = bisect.bisect_left(self._entries, (prefix,))
+                hi = bisect.bisect_left(self._entries, (prefix + '\x7f',), lo)
+                pks = {pk for _key, pk in self._entries[lo:hi]}
+                ranked = self._rank(pks, MAX_RESULTS if hi - lo > SCAN_LIMIT else limit)
+                if hi - lo > SCAN_LIMIT:
+                    if len(self._memo) >= _MEMO_MAX_ENTRIES:
+                        self._memo.clear()
+                    self._memo[prefix] = ranked
+            return [self._movies[pk] for pk in ranked[:limit]]
+
+    def _rank(self, pks, limit):
+        return heapq.nlargest(limit, pks, key=self._weights.__getitem__)
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    self.rebuild()
+        elif time.monotonic() - self._loaded_at > settings.MOVIE_TYPEAHEAD_MAX_AGE:
+            with self._lock:
+                if self._pending is not None:
+                    return
+                self._pending = []
+            threading.Thread(target=self._rebuild_in_background, name='typeahead-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            # Keep serving the old index; the next lookup retries
+            self._stats['rebuild_errors'] += 1
+        finally:
+            connections.close_all()
+
+    def rebuild(self):
+        """Reload every title from the database and swap the new index in"""
+        from .models import Movie
+
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+        try:
+            queryset = get_content_filter().filter_queryset(Movie.objects.all()).order_by()
+            self.load(queryset.values(*self.fields).iterator(chunk_size=5000))
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+    def load(self, rows):
+        """Replace the index with ``rows``, dicts of ``fields`` that already passed the content filter"""
+        entries, movies, weights = [], {}, {}
+        for row in rows:
+            movies[row['pk']] = self._movie(row)
+            weights[row['pk']] = (row['popularity'] or 0, -row['pk'])
+            entries.extend((key, row['pk']) for key in title_keys(row['title']))
+        entries.sort()
+
+        with self._lock:
+            self._entries, self._movies, self._weights, self._memo = entries, movies, weights, {}
+            pending, self._pending = self._pending or [], None
+            for pk, movie in pending:
+                self._apply(pk, movie)
+            self._loaded_at = time.monotonic()
+            self._stats['rebuilds'] += 1
+
+    @staticmethod
+    def _movie(row):
+        return {
+            'id': row['pk'],
+            'title': row['title'],
+            'year': row['release_date'].year if row['release_date'] else None,
+            'popularity': row['popularity'],
+            'poster_url': row['poster_url'],
+            'tmdb_id': row['tmdb_id'],
+        }
+
+    def update(self, movie):
+        """Index a saved movie, replacing its previous title"""
+        blocked = get_content_filter().is_blocked({'title': movie.title, 'overview': movie.description})
+        row = None if blocked else self._movie({field: getattr(movie, field) for field in self.fields})
+        self._change(movie.pk, row)
+
+    def discard(self, pk):
+        self._change(pk, None)
+
+    def _change(self, pk, movie):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((pk, movie))
+            if self._loaded_at is not None:
+                self._apply(pk, movie)
+                self._stats['updates'] += 1
+
+    def _apply(self, pk, movie):
+        old = self._movies.pop(pk, None)
+        self._weights.pop(pk, None)
+        old_keys = title_keys(old['title']) if old is not None else set()
+        new_keys = title_keys(movie['title']) if movie is not None else set()
+        for key in old_keys:
+            index = bisect.bisect_left(self._entries, (key, pk))
+            if index < len(self._entries) and self._entries[index] == (key, pk):
+                del self._entries[index]
+        if movie is not None:
+            self._movies[pk] = movie
+            self._weights[pk] = (movie['popularity'] or 0, -pk)
+            for key in new_keys:
+                bisect.insort(self._entries, (key, pk))
+        keys = old_keys | new_keys
+        # Memoized rankings under a changed key may now be wrong
+        for prefix in [prefix for prefix in self._memo if any(key.startswith(prefix) for key in keys)]:
+            del self._memo[prefix]
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._movies, self._weights, self._memo = [], {}, {}, {}
+            self._loaded_at = None
+            self._pending = None
+
+    def stats(self):
+        with self._lock:
+            age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+            return dict(
+                self._stats, movies=len(self._movies), keys=len(self._entries),
+                memoized_prefixes=len(self._memo), age_seconds=round(age, 1) if age is not None else None,
+            )
+
+
+title_index = TitleIndex()
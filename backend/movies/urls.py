@@ -1,26 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import (
-    MovieViewSet,
-    MovieRatingViewSet,
-    FavoriteViewSet,
-    search_tmdb_movies,
-    get_tmdb_movie_details,
-    get_movie_recommendations,
-    get_movie_reviews,
-    get_popular_movies
-)
+from . import async_views, views
+from .views import MovieViewSet, MovieRatingViewSet, FavoriteViewSet, get_tmdb_stats
+
+# Under ASGI the TMDB proxies are served by coroutine views (see moviemeetup/asgi.py)
+tmdb_views = async_views if settings.TMDB_ASYNC_VIEWS else views
 
 router = DefaultRouter()
-router.register('', MovieViewSet, basename='movie')
 router.register('ratings', MovieRatingViewSet, basename='movie-rating')
 router.register('favorites', FavoriteViewSet, basename='favorite')
+# Registered last: its detail route (^(?P<pk>[^/.]+)/$) would otherwise swallow ratings/ and favorites/
+router.register('', MovieViewSet, basename='movie')
 
 urlpatterns = [
-    path('tmdb/search/', search_tmdb_movies, name='tmdb-search'),
-    path('tmdb/popular/', get_popular_movies, name='tmdb-popular'),
-    path('tmdb/<int:tmdb_id>/', get_tmdb_movie_details, name='tmdb-detail'),
-    path('tmdb/<int:tmdb_id>/recommendations/', get_movie_recommendations, name='tmdb-recommendations'),
-    path('tmdb/<int:tmdb_id>/reviews/', get_movie_reviews, name='tmdb-reviews'),
+    path('tmdb/search/', tmdb_views.search_tmdb_movies, name='tmdb-search'),
+    path('tmdb/popular/', tmdb_views.get_popular_movies, name='tmdb-popular'),
+    path('tmdb/stats/', get_tmdb_stats, name='tmdb-stats'),
+    path('tmdb/batch/', tmdb_views.get_tmdb_movie_details_batch, name='tmdb-detail-batch'),
+    path('tmdb/<int:tmdb_id>/', tmdb_views.get_tmdb_movie_details, name='tmdb-detail'),
+    path('tmdb/<int:tmdb_id>/recommendations/', tmdb_views.get_movie_recommendations, name='tmdb-recommendations'),
+    path('tmdb/<int:tmdb_id>/reviews/', tmdb_views.get_movie_reviews, name='tmdb-reviews'),
     path('', include(router.urls)),
 ]
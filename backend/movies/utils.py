@@ -0,0 +1,16 @@
+def parse_id_list(raw, max_ids, name='ids'):
+    """Parse a comma-separated id list ("1,2,3") into unique ints, keeping order.
+
+    Raises ``ValueError`` with a client-facing message (naming the parameter
+    ``name``) if the list is empty, malformed or longer than ``max_ids``.
+    """
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError(f'{name} must be a comma-separated list of integers')
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError(f'{name} parameter is required')
+    if len(ids) > max_ids:
+        raise ValueError(f'At most {max_ids} {name} are allowed per request')
+    return ids
@@ -1,36 +1,195 @@
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny, IsAdminUser
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.cache import patch_vary_headers
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from .models import Movie, MovieRating, Favorite
+from moviemeetup.conditional import ConditionalGetMixin, body_etag, conditional_response, make_etag
+from moviemeetup.pagination import KeysetPagination
+from . import membership, mirror, rating_stats
+from .cache import tmdb_cache
+from .membership import Membership
+from .filters import TMDB_FILTER_PARAMS, filter_tmdb_page, get_content_filter
+from .tmdb import TMDBUnavailable, async_client_stats, get_breaker, get_client, get_rate_limiter
+from .utils import parse_id_list
+from .models import Movie, MovieRating, MovieSimilarity, Favorite, user_rating_expression
+from .genres import movies_in_genres, parse_genre_filter
+from .search import search_movies
+from .typeahead import MAX_RESULTS as TYPEAHEAD_MAX_RESULTS, title_index
 from .serializers import (
     MovieSerializer, 
     MovieDetailSerializer, 
     MovieRatingSerializer,
     MovieRatingCreateSerializer,
-    FavoriteSerializer
+    FavoriteSerializer,
+    FavoriteCompactSerializer,
 )
 
 
-class MovieViewSet(viewsets.ModelViewSet):
+USER_RATING_ORDERINGS = ('user_rating', '-user_rating')
+# Neighbors kept per movie by rebuild_movie_similarities
+SIMILAR_MAX_RESULTS = 20
+
+
+class MovieViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """CRUD operations for movies"""
     queryset = Movie.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return MovieDetailSerializer
         return MovieSerializer
 
+    def get_conditional_related_fields(self):
+        # Ratings touch their movie, but the detail view also renders each rater's profile
+        if self.action == 'retrieve':
+            return ('movie_ratings__user__profile__updated_at',)
+        return super().get_conditional_related_fields()
+
+    def get_membership(self):
+        """The requesting user's favorites/ratings when ``?user_state=true`` asks for them"""
+        if not hasattr(self, '_membership'):
+            self._membership = membership.for_request(self.request.user, self.request.query_params)
+        return self._membership
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'membership': self.get_membership()}
+
+    def _etag_context(self):
+        state = self.get_membership()
+        return super()._etag_context() + (state.version if state is not None else None,)
+
+    def get_keyset_ordering(self):
+        # The user rating sort and ranked search have no unique key; they fall back to page numbers
+        if self.action == 'list' and self.request.query_params.get('ordering') not in USER_RATING_ORDERINGS:
+            return ('-release_date', '-id')
+        return None
+
+    def get_queryset(self):
+        queryset = Movie.objects.prefetch_related('genres')
+        if self.action == 'retrieve':
+            # Every rating is rendered with its user and profile; fetch them in one extra query
+            queryset = queryset.prefetch_related(
+                Prefetch('movie_ratings', queryset=MovieRating.objects.select_related('user__profile'))
+            )
+
+        # Filter by average user rating (?min_user_rating=4)
+        min_user_rating = self.request.query_params.get('min_user_rating')
+        if min_user_rating:
+            try:
+                queryset = queryset.annotate(user_rating=user_rating_expression()).filter(
+                    user_rating__gte=float(min_user_rating)
+                )
+            except ValueError:
+                raise ValidationError({'min_user_rating': 'Must be a number'})
+
+        # Filter by genre slug or name (?genre=drama or ?genre=drama,comedy for any of them)
+        genre = self.request.query_params.get('genre')
+        if genre:
+            queryset = queryset.filter(pk__in=movies_in_genres(parse_genre_filter(genre)))
+
+        # Sort by average user rating (?ordering=-user_rating), unrated movies last
+        ordering = self.request.query_params.get('ordering')
+        if ordering in USER_RATING_ORDERINGS:
+            rating = user_rating_expression()
+            rating = rating.desc(nulls_last=True) if ordering.startswith('-') else rating.asc(nulls_last=True)
+            queryset = queryset.order_by(rating, '-rating_count', 'pk')
+
+        return queryset
+
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search movies by title"""
-        query = request.query_params.get('q', '')
-        movies = self.queryset.filter(title__icontains=query)
-        serializer = self.get_serializer(movies, many=True)
-        return Response(serializer.data)
+        """Ranked search over titles and descriptions, with the same content filter as TMDB results"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        movies = search_movies(get_content_filter().filter_queryset(self.get_queryset()), query)
+        page = self.paginate_queryset(movies)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='rating-stats')
+    def rating_stats(self, request, pk=None):
+        """Star histogram, count, mean and recent review count of one movie's ratings"""
+        if not str(pk).isdigit():
+            raise NotFound()
+        movie_id = int(pk)
+        stats = rating_stats.get_many([movie_id])[movie_id]
+        if not stats['count'] and not Movie.objects.filter(pk=movie_id).exists():
+            raise NotFound()
+        return Response(stats)
+
+    @action(detail=False, methods=['get'], url_path='rating-stats')
+    def rating_stats_batch(self, request):
+        """Rating breakdowns of up to MOVIE_RATING_STATS_MAX_IDS movies (?ids=1,2,3), keyed by id"""
+        try:
+            movie_ids = parse_id_list(request.query_params.get('ids', ''), settings.MOVIE_RATING_STATS_MAX_IDS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        stats = rating_stats.get_many(movie_ids)
+        unrated = [movie_id for movie_id in movie_ids if not stats[movie_id]['count']]
+        known = set(Movie.objects.filter(pk__in=unrated).values_list('pk', flat=True)) if unrated else set()
+        missing = [movie_id for movie_id in unrated if movie_id not in known]
+        results = {str(movie_id): stats[movie_id] for movie_id in movie_ids if movie_id not in missing}
+        return Response({'results': results, 'missing': missing})
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """People who liked this movie also liked: precomputed neighbors from local ratings and favorites"""
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+        if not 1 <= limit <= SIMILAR_MAX_RESULTS:
+            raise ValidationError({'limit': f'Must be between 1 and {SIMILAR_MAX_RESULTS}'})
+        if not str(pk).isdigit():
+            raise NotFound()
+
+        # One range scan of the (movie, -score) index, joined to the neighbors
+        neighbors = list(
+            MovieSimilarity.objects.filter(movie_id=pk).select_related('similar')
+            .prefetch_related('similar__genres').order_by('-score')[:limit]
+        )
+        if not neighbors and not Movie.objects.filter(pk=pk).exists():
+            raise NotFound()
+        results = MovieSerializer(
+            [neighbor.similar for neighbor in neighbors], many=True, context=self.get_serializer_context()
+        ).data
+        for movie, neighbor in zip(results, neighbors):
+            movie['similarity'] = round(neighbor.score, 4)
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Top title completions for search-as-you-type, from the in-process index"""
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+        if not 1 <= limit <= TYPEAHEAD_MAX_RESULTS:
+            raise ValidationError({'limit': f'Must be between 1 and {TYPEAHEAD_MAX_RESULTS}'})
+        return Response({'results': title_index.complete(request.query_params.get('q', ''), limit)})
+
+
+def tmdb_response(request, etag, data, decorate):
+    """``conditional_response`` for a TMDB payload, with the user's badges under ``?user_state=true``
+
+    ``decorate`` is ``Membership.decorate_tmdb_page`` or ``decorate_tmdb_movie``.
+    """
+    state = membership.for_request(request.user, request.query_params)
+    if state is None:
+        return conditional_response(request, etag, lambda: Response(data))
+    response = conditional_response(request, make_etag(etag, state.version), lambda: Response(decorate(state, data)))
+    patch_vary_headers(response, ['Authorization'])
+    return response
 
 
 @api_view(['GET'])
@@ -42,42 +201,26 @@ def search_tmdb_movies(request):
     if not query:
         return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
     
+    local = mirror.search_fresh(query)
+    if local is not None:
+        return tmdb_response(request, body_etag(local), local, Membership.decorate_tmdb_page)
+    
     api_key = settings.TMDB_API_KEY
     if not api_key:
         return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    url = f"{settings.TMDB_BASE_URL}/search/movie"
     params = {
-        'api_key': api_key,
         'query': query,
         'language': 'en-US',
         'page': 1,
-        'with_original_language': 'en',  # Filter for English-language (Hollywood) movies only
-        'include_adult': 'false'  # Exclude adult content
+        **TMDB_FILTER_PARAMS,
     }
     
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Additional filtering for inappropriate content
-        if 'results' in data:
-            filtered_results = []
-            for movie in data['results']:
-                # Skip if adult flag is set
-                if movie.get('adult', False):
-                    continue
-                # Skip movies with explicit keywords in overview (basic filter)
-                overview = movie.get('overview', '').lower()
-                title = movie.get('title', '').lower()
-                inappropriate_keywords = ['erotic', 'sex', 'adult', 'pornographic']
-                if any(keyword in overview or keyword in title for keyword in inappropriate_keywords):
-                    continue
-                filtered_results.append(movie)
-            data['results'] = filtered_results
-        
-        return Response(data)
+        entry = tmdb_cache.fetch_entry('search', 'search/movie', params, transform=filter_tmdb_page)
+        return tmdb_response(request, entry['etag'], entry['data'], Membership.decorate_tmdb_page)
+    except TMDBUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except requests.RequestException as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -85,25 +228,77 @@ def search_tmdb_movies(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_tmdb_movie_details(request, tmdb_id):
-    """Get movie details from TMDB API"""
+    """Get movie details, from the local mirror when fresh, otherwise from TMDB API"""
+    local = mirror.get_fresh_details(tmdb_id)
+    if local is not None:
+        return tmdb_response(request, body_etag(local), local, Membership.decorate_tmdb_movie)
+    
     api_key = settings.TMDB_API_KEY
     if not api_key:
         return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    url = f"{settings.TMDB_BASE_URL}/movie/{tmdb_id}"
-    # Use append_to_response so frontend gets credits (cast) in same payload
-    params = {
-        'api_key': api_key,
-        'language': 'en-US',
-        'append_to_response': 'credits',
-    }
-    
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return Response(response.json())
+        # DETAIL_PARAMS uses append_to_response so frontend gets credits (cast) in same payload
+        entry = tmdb_cache.fetch_entry('movie', f'movie/{tmdb_id}', mirror.DETAIL_PARAMS)
+    except TMDBUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except requests.RequestException as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    # Only mirror what TMDB just sent: re-stamping a cached (possibly stale) copy would make old data look fresh
+    if entry.get('fetched') and settings.TMDB_MIRROR_ENABLED:
+        mirror.upsert_movies([entry['data']])
+    return tmdb_response(request, entry['etag'], entry['data'], Membership.decorate_tmdb_movie)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_tmdb_movie_details_batch(request):
+    """Get details for many movies (?ids=1,2,3) in one response, with per-id errors.
+
+    Fresh movies come from the local mirror in one query; the rest are fetched
+    concurrently through the TMDB cache, at most TMDB_BATCH_CONCURRENCY at a time.
+    """
+    try:
+        tmdb_ids = parse_id_list(request.query_params.get('ids', ''), settings.TMDB_BATCH_MAX_IDS)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    results = mirror.get_fresh_details_many(tmdb_ids)
+    missing = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in results]
+    errors = {}
+    
+    if missing:
+        if not settings.TMDB_API_KEY:
+            return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        def fetch(tmdb_id):
+            return tmdb_cache.fetch_entry('movie', f'movie/{tmdb_id}', mirror.DETAIL_PARAMS)
+        
+        with ThreadPoolExecutor(max_workers=min(settings.TMDB_BATCH_CONCURRENCY, len(missing))) as pool:
+            futures = {tmdb_id: pool.submit(fetch, tmdb_id) for tmdb_id in missing}
+        
+        fetched = []
+        for tmdb_id, future in futures.items():
+            try:
+                entry = future.result()
+            except requests.RequestException as e:
+                errors[str(tmdb_id)] = str(e)
+                continue
+            results[tmdb_id] = entry['data']
+            if entry.get('fetched'):
+                fetched.append(entry['data'])
+        
+        if fetched and settings.TMDB_MIRROR_ENABLED:
+            mirror.upsert_movies(fetched)
+    
+    state = membership.for_request(request.user, request.query_params)
+    if state is not None:
+        results = {tmdb_id: state.decorate_tmdb_movie(movie) for tmdb_id, movie in results.items()}
+    return Response({
+        'results': {str(tmdb_id): results[tmdb_id] for tmdb_id in tmdb_ids if tmdb_id in results},
+        'errors': errors,
+    })
 
 
 @api_view(['GET'])
@@ -114,34 +309,18 @@ def get_movie_recommendations(request, tmdb_id):
     if not api_key:
         return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    url = f"{settings.TMDB_BASE_URL}/movie/{tmdb_id}/recommendations"
     params = {
-        'api_key': api_key,
         'language': 'en-US',
         'page': request.query_params.get('page', 1),
     }
 
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        # Additional filtering for inappropriate content, similar to popular movies
-        if 'results' in data:
-            filtered_results = []
-            for movie in data['results']:
-                # Skip if adult flag is set
-                if movie.get('adult', False):
-                    continue
-                overview = movie.get('overview', '').lower()
-                title = movie.get('title', '').lower()
-                inappropriate_keywords = ['erotic', 'sex', 'adult', 'pornographic']
-                if any(keyword in overview or keyword in title for keyword in inappropriate_keywords):
-                    continue
-                filtered_results.append(movie)
-            data['results'] = filtered_results
-
-        return Response(data)
+        entry = tmdb_cache.fetch_entry(
+            'recommendations', f'movie/{tmdb_id}/recommendations', params, transform=filter_tmdb_page
+        )
+        return tmdb_response(request, entry['etag'], entry['data'], Membership.decorate_tmdb_page)
+    except TMDBUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except requests.RequestException as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -154,18 +333,16 @@ def get_movie_reviews(request, tmdb_id):
     if not api_key:
         return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    url = f"{settings.TMDB_BASE_URL}/movie/{tmdb_id}/reviews"
     params = {
-        'api_key': api_key,
         'language': 'en-US',
         'page': request.query_params.get('page', 1),
     }
 
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        return Response(data)
+        entry = tmdb_cache.fetch_entry('reviews', f'movie/{tmdb_id}/reviews', params)
+        return conditional_response(request, entry['etag'], lambda: Response(entry['data']))
+    except TMDBUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except requests.RequestException as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -178,56 +355,65 @@ def get_popular_movies(request):
     if not api_key:
         return Response({'error': 'TMDB API key not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    url = f"{settings.TMDB_BASE_URL}/movie/popular"
     params = {
-        'api_key': api_key,
         'language': 'en-US',
         'page': request.query_params.get('page', 1),
-        'with_original_language': 'en',  # Filter for English-language (Hollywood) movies only
-        'include_adult': 'false'  # Exclude adult content
+        **TMDB_FILTER_PARAMS,
     }
     
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Additional filtering for inappropriate content
-        if 'results' in data:
-            filtered_results = []
-            for movie in data['results']:
-                # Skip if adult flag is set or genre includes certain IDs
-                if movie.get('adult', False):
-                    continue
-                # Skip movies with explicit keywords in overview (basic filter)
-                overview = movie.get('overview', '').lower()
-                title = movie.get('title', '').lower()
-                inappropriate_keywords = ['erotic', 'sex', 'adult', 'pornographic']
-                if any(keyword in overview or keyword in title for keyword in inappropriate_keywords):
-                    continue
-                filtered_results.append(movie)
-            data['results'] = filtered_results
-        
-        return Response(data)
+        entry = tmdb_cache.fetch_entry('popular', 'movie/popular', params, transform=filter_tmdb_page)
+        return tmdb_response(request, entry['etag'], entry['data'], Membership.decorate_tmdb_page)
+    except TMDBUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except requests.RequestException as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_tmdb_stats(request):
+    """Latency, cache, rate limiter and circuit breaker stats for TMDB calls in this process"""
+    return Response({
+        'client': get_client().stats(),
+        'async_client': async_client_stats(),
+        'cache': tmdb_cache.stats(),
+        'rate_limiter': get_rate_limiter().stats(),
+        'circuit_breaker': get_breaker().stats(),
+    })
+
+
 class MovieRatingViewSet(viewsets.ModelViewSet):
     """CRUD operations for movie ratings"""
     queryset = MovieRating.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return MovieRatingCreateSerializer
         return MovieRatingSerializer
 
+    # The movie's rating totals, updated_at and stats follow through the MovieRating signals
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        rating = serializer.save(user=self.request.user)
+        membership.invalidate(rating.user_id)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        rating = serializer.save()
+        membership.invalidate(rating.user_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        membership.invalidate(instance.user_id)
 
     def get_queryset(self):
-        queryset = MovieRating.objects.all()
+        queryset = MovieRating.objects.select_related('user__profile', 'movie')
         movie_id = self.request.query_params.get('movie')
         if movie_id:
             queryset = queryset.filter(movie_id=movie_id)
@@ -235,12 +421,36 @@ class MovieRatingViewSet(viewsets.ModelViewSet):
 
 
 class FavoriteViewSet(viewsets.ModelViewSet):
-    """CRUD operations for favorites"""
+    """CRUD operations for favorites
+
+    ``?view=ids`` lists just the favorite movie ids and ``?view=compact`` a few
+    fields per movie, both unpaginated so a client syncs in one request.
+    """
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        queryset = Favorite.objects.filter(user=self.request.user)
+        if self.action == 'list' and self.request.query_params.get('view') == 'compact':
+            return queryset.select_related('movie').only(
+                'movie_id', 'created_at', 'movie__tmdb_id', 'movie__title', 'movie__poster_url', 'movie__release_date',
+            )
+        return queryset.select_related('user__profile', 'movie').prefetch_related('movie__genres')
+
+    def list(self, request, *args, **kwargs):
+        view = request.query_params.get('view')
+        if view == 'ids':
+            movie_ids = Favorite.objects.filter(user=request.user).values_list('movie_id', flat=True)
+            return Response({'movie_ids': list(movie_ids)})
+        if view == 'compact':
+            return Response({'results': FavoriteCompactSerializer(self.get_queryset(), many=True).data})
+        if view:
+            raise ValidationError({'view': "Must be 'ids' or 'compact'"})
+        return super().list(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        membership.invalidate(instance.user_id)
 
     def create(self, request, *args, **kwargs):
         movie_id = request.data.get('movie_id')
@@ -255,6 +465,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         if not created:
             return Response({'message': 'Already in favorites'}, status=status.HTTP_200_OK)
         
+        membership.invalidate(request.user.pk)
         serializer = self.get_serializer(favorite)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -267,6 +478,39 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         try:
             favorite = Favorite.objects.get(user=request.user, movie_id=movie_id)
             favorite.delete()
+            membership.invalidate(request.user.pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Favorite.DoesNotExist:
             return Response({'error': 'Not in favorites'}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=False, methods=['post', 'delete'])
+    def bulk(self, request):
+        """Add (POST) or remove (DELETE) every movie in ``movie_ids`` in one transaction"""
+        movie_ids = request.data.get('movie_ids', '')
+        if isinstance(movie_ids, list):
+            movie_ids = ','.join(str(movie_id) for movie_id in movie_ids)
+        try:
+            movie_ids = parse_id_list(str(movie_ids), settings.FAVORITES_BULK_MAX_IDS, name='movie_ids')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'DELETE':
+            removed, _ = Favorite.objects.filter(user=request.user, movie_id__in=movie_ids).delete()
+            membership.invalidate(request.user.pk)
+            return Response({'removed': removed})
+
+        with transaction.atomic():
+            known = set(Movie.objects.filter(pk__in=movie_ids).values_list('pk', flat=True))
+            unknown = [movie_id for movie_id in movie_ids if movie_id not in known]
+            if unknown:
+                return Response({'error': 'Unknown movies', 'movie_ids': unknown}, status=status.HTTP_400_BAD_REQUEST)
+            existing = set(
+                Favorite.objects.filter(user=request.user, movie_id__in=movie_ids).values_list('movie_id', flat=True)
+            )
+            added = [movie_id for movie_id in movie_ids if movie_id not in existing]
+            # Conflicts only come from a concurrent request adding the same movie
+            Favorite.objects.bulk_create(
+                [Favorite(user=request.user, movie_id=movie_id) for movie_id in added], ignore_conflicts=True,
+            )
+            membership.invalidate(request.user.pk)
+        return Response({'added': added}, status=status.HTTP_201_CREATED if added else status.HTTP_200_OK)
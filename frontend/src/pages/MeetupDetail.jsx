@@ -3,6 +3,12 @@ import { useParams } from 'react-router-dom';
 import { useAuth } from '../utils/AuthContext';
 import { meetupAPI } from '../services/api';
 
+// participants_count covers the organizer and accepted participants; other rows say why they don't count
+const PARTICIPANT_STATUS_LABELS = {
+  pending: 'waitlisted',
+  declined: 'declined',
+};
+
 const MeetupDetail = () => {
   const { id } = useParams();
   const { user, isAuthenticated } = useAuth();
@@ -10,6 +16,7 @@ const MeetupDetail = () => {
   const [loading, setLoading] = useState(true);
   const [message, setMessage] = useState('');
   const [commentText, setCommentText] = useState('');
+  const [loadingMore, setLoadingMore] = useState(null);
 
   useEffect(() => {
     fetchMeetupDetails();
@@ -17,7 +24,7 @@ const MeetupDetail = () => {
 
   const fetchMeetupDetails = async () => {
     try {
-      const response = await meetupAPI.getOne(id);
+      const response = await meetupAPI.getOne(id, { expand: 'participants,comments' });
       setMeetup(response.data);
     } catch (error) {
       console.error('Error fetching meetup:', error);
@@ -26,12 +33,37 @@ const MeetupDetail = () => {
     }
   };
 
+  // Embedded participants/comments hold the first page only; `next` continues the list
+  const loadMore = async (relation) => {
+    const next = meetup?.[relation]?.next;
+    if (!next) return;
+    setLoadingMore(relation);
+    try {
+      const response = await meetupAPI.getPage(next);
+      setMeetup((current) => ({
+        ...current,
+        [relation]: {
+          results: [...current[relation].results, ...response.data.results],
+          next: response.data.next,
+        },
+      }));
+    } catch (error) {
+      alert(`Failed to load more ${relation}`);
+    } finally {
+      setLoadingMore(null);
+    }
+  };
+
   const handleJoin = async () => {
     try {
-      await meetupAPI.join(id, message);
+      const response = await meetupAPI.join(id, message);
       fetchMeetupDetails();
       setMessage('');
-      alert('Successfully joined the meetup!');
+      if (response.status === 202) {
+        alert(`This meetup is full. You are #${response.data.waitlist_position} on the waitlist and will be added automatically when a spot opens.`);
+      } else {
+        alert('Successfully joined the meetup!');
+      }
     } catch (error) {
       alert(error.response?.data?.error || 'Failed to join meetup');
     }
@@ -63,7 +95,7 @@ const MeetupDetail = () => {
   };
 
   const isParticipant = () => {
-    return meetup?.participants?.some(p => p.user.id === user?.id);
+    return Boolean(meetup?.my_status);
   };
 
   const isOrganizer = () => {
@@ -111,18 +143,30 @@ const MeetupDetail = () => {
         )}
 
         <section className="meetup-participants">
-          <h2>Participants ({meetup.participants?.length || 0})</h2>
+          <h2>Participants ({meetup.participants_count || 0}/{meetup.max_participants})</h2>
           <ul>
             <li key={meetup.organizer.id}>
               <strong>{meetup.organizer.username}</strong> (Organizer)
             </li>
-            {meetup.participants?.map(participant => (
+            {meetup.participants?.results.map(participant => (
               <li key={participant.id}>
                 {participant.user.username}
+                {PARTICIPANT_STATUS_LABELS[participant.status] && (
+                  <span className="participant-status"> ({PARTICIPANT_STATUS_LABELS[participant.status]})</span>
+                )}
                 {participant.message && <span className="participant-message"> - {participant.message}</span>}
               </li>
             ))}
           </ul>
+          {meetup.participants?.next && (
+            <button
+              onClick={() => loadMore('participants')}
+              className="btn btn-secondary"
+              disabled={loadingMore === 'participants'}
+            >
+              {loadingMore === 'participants' ? 'Loading...' : 'Show more participants'}
+            </button>
+          )}
         </section>
 
         <section className="meetup-comments">
@@ -139,7 +183,7 @@ const MeetupDetail = () => {
             </form>
           )}
           <div className="comments-list">
-            {meetup.comments?.map(comment => (
+            {meetup.comments?.results.map(comment => (
               <div key={comment.id} className="comment">
                 <strong>{comment.user.username}</strong>
                 <p>{comment.text}</p>
@@ -147,6 +191,15 @@ const MeetupDetail = () => {
               </div>
             ))}
           </div>
+          {meetup.comments?.next && (
+            <button
+              onClick={() => loadMore('comments')}
+              className="btn btn-secondary"
+              disabled={loadingMore === 'comments'}
+            >
+              {loadingMore === 'comments' ? 'Loading...' : 'Show older comments'}
+            </button>
+          )}
         </section>
       </div>
     </div>
@@ -68,6 +68,7 @@ export const movieAPI = {
   searchTMDB: (query) => api.get('/movies/tmdb/search/', { params: { q: query } }),
   getPopular: (page = 1) => api.get('/movies/tmdb/popular/', { params: { page } }),
   getTMDBDetails: (tmdbId) => api.get(`/movies/tmdb/${tmdbId}/`),
+  getTMDBDetailsBatch: (tmdbIds) => api.get('/movies/tmdb/batch/', { params: { ids: tmdbIds.join(',') } }),
   getTMDBRecommendations: (tmdbId, page = 1) =>
     api.get(`/movies/tmdb/${tmdbId}/recommendations/`, { params: { page } }),
   getTMDBReviews: (tmdbId, page = 1) =>
@@ -85,7 +86,7 @@ export const movieAPI = {
 // Meetup APIs
 export const meetupAPI = {
   getAll: (params) => api.get('/meetups/', { params }),
-  getOne: (id) => api.get(`/meetups/${id}/`),
+  getOne: (id, params) => api.get(`/meetups/${id}/`, { params }),
   create: (data) => api.post('/meetups/', data),
   update: (id, data) => api.patch(`/meetups/${id}/`, data),
   delete: (id) => api.delete(`/meetups/${id}/`),
@@ -94,4 +95,6 @@ export const meetupAPI = {
   getParticipants: (id) => api.get(`/meetups/${id}/participants/`),
   addComment: (id, text) => api.post(`/meetups/${id}/comment/`, { text }),
   getComments: (id) => api.get(`/meetups/${id}/comments/`),
+  // Follows the `next` link of an embedded participants/comments page
+  getPage: (url) => api.get(url),
 };